@@ -0,0 +1,116 @@
+"""
+Проверка и замер синхронизации прокси с провайдером
+
+Поднимает заглушку API провайдера (fake_proxy_provider.py) и временную SQLite
+базу, затем прогоняет ProviderSync: первичную загрузку, повтор без изменений
+(ожидается 304 или совпадение хеша), изменения списка (добавление, удаление,
+смена паролей) и принудительный повтор. Расхождение счетчиков с ожидаемыми
+завершает скрипт с кодом 1.
+
+    python benchmarks/bench_proxy_sync.py --proxies 20000 --page-size 500
+    python benchmarks/bench_proxy_sync.py --no-validators   # провайдер без ETag
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_proxy_provider import FakeProxyProviderServer
+
+def prepare_environment(db_path: str, api_url: str, page_size: int, concurrency: int):
+    """Переменные окружения до импорта config"""
+    from cryptography.fernet import Fernet
+
+    os.environ['TELEGRAM_TOKEN'] = '123456:BENCHMARK-TOKEN'
+    os.environ['DATABASE_PATH'] = f"sqlite:///{db_path}"
+    os.environ.setdefault('ENCRYPTION_KEY', Fernet.generate_key().decode())
+    os.environ['PROXY_922_API_URL'] = api_url
+    os.environ['PROVIDER_SYNC_PAGE_SIZE'] = str(page_size)
+    os.environ['PROVIDER_SYNC_CONCURRENCY'] = str(concurrency)
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+def count_proxies():
+    from database.connection import Session
+    from database.models import ProxyServer
+
+    session = Session()
+    try:
+        active = session.query(ProxyServer).filter_by(is_active=True).count()
+        return active, session.query(ProxyServer).count()
+    finally:
+        session.close()
+
+async def run(args, server: FakeProxyProviderServer) -> list:
+    from database.connection import init_database
+    from services.proxy_922 import Proxy922Manager
+    from services.proxy_sync import ProviderSync
+
+    init_database()
+    client = Proxy922Manager(api_key='bench')
+    sync = ProviderSync()
+    failures = []
+
+    async def step(name: str, expected: dict, force: bool = False):
+        requests_before = server.state.stats['page_requests']
+        started = time.perf_counter()
+        result = await sync.sync(client, force=force)
+        elapsed = time.perf_counter() - started
+        pages = server.state.stats['page_requests'] - requests_before
+
+        active, total = count_proxies()
+        print(
+            f"{name:<28} {result['status']:<10} +{result.get('added', 0):<6} ~{result.get('updated', 0):<6} "
+            f"-{result.get('removed', 0):<6} страниц {pages:<4} {elapsed:7.2f} с   активных {active}/{total}"
+        )
+        for key, value in expected.items():
+            if result.get(key) != value:
+                failures.append(f"{name}: {key}={result.get(key)}, ожидалось {value}")
+
+    print(f"Провайдер: {args.proxies} прокси, страница {args.page_size}, "
+          f"{'ETag/Last-Modified' if not args.no_validators else 'без валидаторов'}\n")
+
+    await step("Первичная загрузка", {'status': 'synced', 'added': args.proxies, 'removed': 0})
+    await step("Без изменений", {'status': 'unchanged'})
+
+    changes = server.state.mutate(add=args.changes, remove=args.changes, rotate=args.changes)
+    await step("Добавление/удаление/пароли", {
+        'status': 'synced', 'added': changes['added'], 'removed': changes['removed'], 'updated': changes['rotated']
+    })
+    await step("Без изменений после правок", {'status': 'unchanged'})
+    await step("Принудительная", {'status': 'synced', 'added': 0, 'updated': 0, 'removed': 0}, force=True)
+
+    active, _ = count_proxies()
+    if active != len(server.state.proxies):
+        failures.append(f"активных прокси {active}, у провайдера {len(server.state.proxies)}")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Синхронизация прокси с заглушкой провайдера")
+    parser.add_argument('--proxies', type=int, default=20000)
+    parser.add_argument('--page-size', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--changes', type=int, default=200, help="Сколько прокси добавить, убрать и перевыпустить")
+    parser.add_argument('--latency', type=int, default=0, help="Задержка страницы у заглушки, мс")
+    parser.add_argument('--no-validators', action='store_true', help="Провайдер без ETag/Last-Modified")
+    args = parser.parse_args()
+
+    with FakeProxyProviderServer(proxies=args.proxies, validators=not args.no_validators,
+                                 latency_ms=args.latency) as server:
+        db_dir = tempfile.mkdtemp(prefix='bench_sync_')
+        prepare_environment(os.path.join(db_dir, 'bench.db'), server.api_url, args.page_size, args.concurrency)
+        failures = asyncio.run(run(args, server))
+
+    if failures:
+        print("\nОшибки:\n" + "\n".join(failures))
+        sys.exit(1)
+    print("\nOK")
+
+if __name__ == '__main__':
+    main()
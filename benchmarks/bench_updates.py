@@ -0,0 +1,516 @@
+"""
+Сквозной бенчмарк обработки апдейтов
+
+Собирает Application из bot.py против локальной заглушки Bot API,
+наполняет временную SQLite базу и прогоняет синтетические апдейты
+(нажатия кнопок, SMS коды, команды, создание сценария) через
+application.process_update. Замеряет апдейты/сек, p50/p99 задержку
+обработчиков и число запросов к БД на апдейт, а также время фоновых задач.
+
+    python benchmarks/bench_updates.py --updates 2000 --concurrency 8 \\
+        --output benchmarks/results/latest.json \\
+        --baseline benchmarks/results/baseline.json
+
+С --baseline скрипт завершается с кодом 1 при регрессии сверх --tolerance.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_telegram import FakeTelegramServer
+
+BENCH_TOKEN = '123456:BENCHMARK-TOKEN'
+ADMIN_ID = 900000001
+USER_ID_BASE = 910000000
+
+# Кнопки, обработка которых не уходит в сеть (Instagram, проверка прокси)
+CALLBACKS = [
+    'back', 'scenarios_menu', 'my_scenarios', 'help', 'noop',
+    'admin_panel', 'manage_proxies', 'list_proxies', 'proxy_stats',
+    'auth_settings', 'auth_statistics', 'import_menu', 'bulk_operations',
+    'export_proxies', 'status_scenarios', 'all_scenarios', 'manage_users', 'manage_admins'
+]
+SCENARIO_CALLBACKS = ['manage_{id}', 'schedule_check_{id}', 'pause_{id}', 'resume_{id}']
+AUTH_CALLBACKS = ['retry_now_{id}', 'switch_proxy_{id}', 'safe_mode_{id}', 'challenge_confirmed_{id}']
+
+WORKLOAD_WEIGHTS = {
+    'button': 60,
+    'scenario_button': 15,
+    'auth_button': 5,
+    'sms_code': 8,
+    'command': 7,
+    'scenario_flow': 5
+}
+
+
+def prepare_environment(db_path: str):
+    """Переменные окружения до импорта config"""
+    from cryptography.fernet import Fernet
+
+    os.environ['TELEGRAM_TOKEN'] = BENCH_TOKEN
+    os.environ['DATABASE_PATH'] = f"sqlite:///{db_path}"
+    os.environ.setdefault('ENCRYPTION_KEY', Fernet.generate_key().decode())
+    os.environ['ADMIN_TELEGRAM_ID'] = str(ADMIN_ID)
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+
+def install_query_counter():
+    """Подсчет запросов к БД тем же слушателем движка, что и в боте (services.metrics)"""
+    from database.connection import engine
+    from services.metrics import instrument_engine
+
+    instrument_engine(engine)
+
+
+def seed_database(users: int, scenarios_per_user: int, proxies: int) -> Dict:
+    """Наполнение базы: админ, пользователи, прокси, сценарии, логи авторизации"""
+    from database.connection import Session, init_database
+    from database.models import (
+        Admin, User, ProxyServer, Scenario, PendingMessage, AuthenticationLog, ProxyPerformance
+    )
+    from services.encryption import EncryptionService
+
+    init_database()
+    session = Session()
+    try:
+        session.add(Admin(telegram_id=ADMIN_ID))
+        session.add(User(telegram_id=ADMIN_ID))
+
+        proxy_rows = []
+        for i in range(proxies):
+            proxy = ProxyServer(
+                name=f"bench-proxy-{i}", proxy_type=random.choice(['http', 'socks5']),
+                host=f"10.0.{i // 250}.{i % 250 + 1}", port=8000 + i,
+                username='user', password_encrypted=EncryptionService.encrypt_password('pass'),
+                is_working=i % 7 != 0, last_check=datetime.now()
+            )
+            session.add(proxy)
+            proxy_rows.append(proxy)
+        session.flush()
+        for proxy in proxy_rows:
+            session.add(ProxyPerformance(proxy_id=proxy.id, auth_attempts=10, auth_successes=7))
+
+        password = EncryptionService.encrypt_password('secret')
+        scenario_ids = []
+        user_ids = []
+        for u in range(users):
+            telegram_id = USER_ID_BASE + u
+            user = User(telegram_id=telegram_id)
+            session.add(user)
+            session.flush()
+            user_ids.append(telegram_id)
+
+            for s in range(scenarios_per_user):
+                scenario = Scenario(
+                    user_id=user.id,
+                    proxy_id=random.choice(proxy_rows).id if proxy_rows else None,
+                    ig_username=f"bench_ig_{u}_{s}", ig_password_encrypted=password,
+                    post_link=f"https://www.instagram.com/p/BENCH{u}{s}/",
+                    trigger_word='хочу', dm_message='Спасибо за комментарий!',
+                    active_until=datetime.now() + timedelta(days=7),
+                    status=random.choice(['running', 'paused']),
+                    auth_status=random.choice(['success', 'waiting', 'failed']),
+                    comments_processed=random.randint(0, 500)
+                )
+                session.add(scenario)
+                session.flush()
+                scenario_ids.append((telegram_id, scenario.id))
+
+                for _ in range(random.randint(0, 5)):
+                    session.add(PendingMessage(scenario_id=scenario.id, ig_user_id=str(random.randint(1, 10 ** 9)),
+                                               message_text='Спасибо за комментарий!'))
+                for attempt in range(random.randint(1, 3)):
+                    session.add(AuthenticationLog(
+                        scenario_id=scenario.id, attempt_number=attempt + 1, auth_method='fast',
+                        proxy_used=random.choice(proxy_rows).name if proxy_rows else None,
+                        success=random.random() > 0.3, duration_seconds=random.randint(5, 60)
+                    ))
+
+        session.commit()
+        return {'user_ids': user_ids, 'scenarios': scenario_ids}
+    finally:
+        session.close()
+
+
+# === СИНТЕТИЧЕСКИЕ АПДЕЙТЫ ===
+
+class UpdateFactory:
+    """Генератор JSON апдейтов в формате Bot API"""
+
+    def __init__(self):
+        self._update_id = 0
+        self._message_id = 0
+
+    def _ids(self):
+        self._update_id += 1
+        self._message_id += 1
+        return self._update_id, self._message_id
+
+    @staticmethod
+    def _user(user_id: int) -> Dict:
+        return {'id': user_id, 'is_bot': False, 'first_name': f"User{user_id}", 'language_code': 'ru'}
+
+    def message(self, user_id: int, text: str) -> Dict:
+        update_id, message_id = self._ids()
+        message = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': self._user(user_id),
+            'text': text
+        }
+        if text.startswith('/'):
+            command = text.split()[0]
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+        return {'update_id': update_id, 'message': message}
+
+    def callback(self, user_id: int, data: str) -> Dict:
+        update_id, message_id = self._ids()
+        return {
+            'update_id': update_id,
+            'callback_query': {
+                'id': str(update_id),
+                'from': self._user(user_id),
+                'chat_instance': str(user_id),
+                'data': data,
+                'message': {
+                    'message_id': message_id,
+                    'date': int(time.time()),
+                    'chat': {'id': user_id, 'type': 'private'},
+                    'from': {'id': 100000001, 'is_bot': True, 'first_name': 'Bench'},
+                    'text': 'menu'
+                }
+            }
+        }
+
+
+def build_workload(count: int, seed: Dict, factory: UpdateFactory) -> List[List[tuple]]:
+    """Список «сессий»: каждая сессия - последовательность (вид, маршрут, апдейт) одного пользователя"""
+    kinds = list(WORKLOAD_WEIGHTS)
+    weights = [WORKLOAD_WEIGHTS[k] for k in kinds]
+    sessions = []
+    produced = 0
+
+    while produced < count:
+        kind = random.choices(kinds, weights)[0]
+        if kind == 'button':
+            user_id = random.choice([ADMIN_ID] + seed['user_ids'])
+            data = random.choice(CALLBACKS)
+            sessions.append([(kind, data, factory.callback(user_id, data))])
+        elif kind in ('scenario_button', 'auth_button') and seed['scenarios']:
+            user_id, scenario_id = random.choice(seed['scenarios'])
+            template = random.choice(SCENARIO_CALLBACKS if kind == 'scenario_button' else AUTH_CALLBACKS)
+            data = template.format(id=scenario_id)
+            sessions.append([(kind, template.replace('_{id}', ''), factory.callback(user_id, data))])
+        elif kind == 'sms_code':
+            user_id = random.choice(seed['user_ids'])
+            sessions.append([(kind, 'sms_code', factory.message(user_id, str(random.randint(100000, 999999))))])
+        elif kind == 'command':
+            user_id = random.choice([ADMIN_ID] + seed['user_ids'])
+            command = random.choice(['/start', '/help'])
+            sessions.append([(kind, command, factory.message(user_id, command))])
+        elif kind == 'scenario_flow':
+            user_id = random.choice(seed['user_ids'])
+            suffix = random.randint(1000, 9999)
+            steps = [
+                ('callback', 'add_scenario'),
+                ('text', f"bench_new_{suffix}"),
+                ('text', 'Secret_pass_123'),
+                ('text', f"https://www.instagram.com/p/NEW{suffix}/"),
+                ('text', 'хочу'),
+                ('text', 'Привет! Вот ваша ссылка'),
+                ('callback', '7d')
+            ]
+            session_updates = []
+            for step_type, value in steps:
+                update = factory.callback(user_id, value) if step_type == 'callback' else factory.message(user_id, value)
+                route = value if step_type == 'callback' else 'flow_text'
+                session_updates.append((kind, route, update))
+            sessions.append(session_updates)
+        else:
+            continue
+        produced += len(sessions[-1])
+
+    return sessions
+
+
+# === ПРОГОН ===
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+def summarize(samples: List[Dict], elapsed: Optional[float] = None) -> Dict:
+    latencies = [s['latency_ms'] for s in samples]
+    queries = [s['queries'] for s in samples]
+    summary = {
+        'count': len(samples),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'max_ms': round(max(latencies), 3) if latencies else 0.0,
+        'mean_ms': round(statistics.fmean(latencies), 3) if latencies else 0.0,
+        'queries_per_update': round(statistics.fmean(queries), 2) if queries else 0.0,
+        'errors': sum(1 for s in samples if s['error'])
+    }
+    if elapsed:
+        summary['updates_per_sec'] = round(len(samples) / elapsed, 1)
+    return summary
+
+
+async def run_updates(application, sessions: List[List[tuple]], concurrency: int, errors: list) -> List[Dict]:
+    from services.metrics import query_counter
+
+    from telegram import Update
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for session_updates in sessions:
+        queue.put_nowait(session_updates)
+
+    samples = []
+
+    async def worker():
+        while True:
+            try:
+                session_updates = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            # Апдейты одного пользователя идут последовательно, как и в реальном чате
+            for kind, route, payload in session_updates:
+                counter = [0]
+                token = query_counter.set(counter)
+                errors_before = len(errors)
+                started = time.perf_counter()
+                try:
+                    update = Update.de_json(payload, application.bot)
+                    await application.process_update(update)
+                except Exception as e:
+                    errors.append(repr(e))
+                finally:
+                    latency = (time.perf_counter() - started) * 1000
+                    query_counter.reset(token)
+
+                samples.append({
+                    'kind': kind,
+                    'route': route,
+                    'latency_ms': latency,
+                    'queries': counter[0],
+                    'error': len(errors) > errors_before
+                })
+
+    await asyncio.gather(*(asyncio.create_task(worker()) for _ in range(concurrency)))
+    return samples
+
+
+async def run_jobs(application, iterations: int) -> Dict:
+    """Время фоновых задач job_queue, не обращающихся к сети"""
+    import bot
+    from handlers import scheduler
+    from services.metrics import query_counter
+
+    jobs = {
+        'cleanup_old_data': scheduler.cleanup_old_data,
+        'monitor_scenarios_health': getattr(scheduler, 'monitor_scenarios_health', None),
+        'monitor_auth_performance': bot.monitor_auth_performance,
+        'cleanup_auth_sessions': bot.cleanup_auth_sessions,
+        'notify_auth_issues': bot.notify_auth_issues
+    }
+    context = SimpleNamespace(bot=application.bot, application=application,
+                              job_queue=application.job_queue, job=None)
+
+    results = {}
+    for name, callback in jobs.items():
+        if callback is None:
+            continue
+        samples = []
+        for _ in range(iterations):
+            counter = [0]
+            token = query_counter.set(counter)
+            started = time.perf_counter()
+            error = False
+            try:
+                await callback(context)
+            except Exception:
+                error = True
+            finally:
+                query_counter.reset(token)
+            samples.append({'latency_ms': (time.perf_counter() - started) * 1000,
+                            'queries': counter[0], 'error': error})
+        results[name] = summarize(samples)
+    return results
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+async def run_benchmark(args) -> Dict:
+    random.seed(args.seed)
+
+    with FakeTelegramServer(latency_ms=(args.api_latency, args.api_latency)) as telegram_api:
+        install_query_counter()
+        seed = seed_database(args.users, args.scenarios_per_user, args.proxies)
+
+        import bot
+        application = bot.build_application(BENCH_TOKEN, base_url=telegram_api.url, with_jobs=False)
+
+        errors: list = []
+
+        async def on_error(update, context):
+            errors.append(repr(context.error))
+
+        application.add_error_handler(on_error)
+        await application.initialize()
+
+        try:
+            factory = UpdateFactory()
+            if args.warmup:
+                await run_updates(application, build_workload(args.warmup, seed, factory), args.concurrency, [])
+                telegram_api.state.reset()
+
+            sessions = build_workload(args.updates, seed, factory)
+            started = time.perf_counter()
+            samples = await run_updates(application, sessions, args.concurrency, errors)
+            elapsed = time.perf_counter() - started
+
+            jobs = await run_jobs(application, args.job_iterations)
+        finally:
+            await application.shutdown()
+
+        by_kind = defaultdict(list)
+        by_route = defaultdict(list)
+        for sample in samples:
+            by_kind[sample['kind']].append(sample)
+            by_route[re.sub(r'_\d+$', '', sample['route'])].append(sample)
+
+        return {
+            'meta': {
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'revision': git_revision(),
+                'python': platform.python_version(),
+                'updates': len(samples),
+                'concurrency': args.concurrency,
+                'users': args.users,
+                'scenarios_per_user': args.scenarios_per_user,
+                'proxies': args.proxies,
+                'api_latency_ms': args.api_latency,
+                'seed': args.seed
+            },
+            'overall': summarize(samples, elapsed),
+            'by_kind': {kind: summarize(items) for kind, items in sorted(by_kind.items())},
+            'by_route': {route: summarize(items) for route, items in sorted(by_route.items())},
+            'jobs': jobs,
+            'telegram_api': telegram_api.state.snapshot(),
+            'error_samples': sorted(set(errors))[:20]
+        }
+
+
+# === СРАВНЕНИЕ С БАЗОВОЙ ЛИНИЕЙ ===
+
+def compare(result: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Регрессии относительно базовой линии"""
+    regressions = []
+
+    def check(section: str, name: str, current: Dict, base: Dict):
+        label = f"{section}:{name}" if name else section
+        for metric in ('p50_ms', 'p99_ms'):
+            if base.get(metric) and current.get(metric, 0) > base[metric] * (1 + tolerance):
+                regressions.append(f"{label} {metric}: {base[metric]} -> {current[metric]}")
+        if 'updates_per_sec' in base and current.get('updates_per_sec', 0) < base['updates_per_sec'] * (1 - tolerance):
+            regressions.append(f"{label} updates_per_sec: {base['updates_per_sec']} -> {current.get('updates_per_sec')}")
+        # Число запросов детерминировано, поэтому допуск абсолютный
+        if current.get('queries_per_update', 0) > base.get('queries_per_update', 0) + 0.5:
+            regressions.append(f"{label} queries_per_update: {base.get('queries_per_update')} -> {current['queries_per_update']}")
+
+    check('overall', '', result['overall'], baseline.get('overall', {}))
+    for section in ('by_kind', 'jobs'):
+        for name, current in result.get(section, {}).items():
+            if name in baseline.get(section, {}):
+                check(section, name, current, baseline[section][name])
+    return regressions
+
+
+def print_report(result: Dict):
+    overall = result['overall']
+    print(f"\nАпдейтов: {overall['count']}, {overall.get('updates_per_sec', 0)} апд/с, "
+          f"p50 {overall['p50_ms']} мс, p99 {overall['p99_ms']} мс, "
+          f"запросов к БД на апдейт: {overall['queries_per_update']}, ошибок: {overall['errors']}")
+
+    print(f"\n{'маршрут':<28}{'кол-во':>8}{'p50 мс':>10}{'p99 мс':>10}{'БД/апд':>9}{'ошибки':>8}")
+    for route, stats in sorted(result['by_route'].items(), key=lambda item: -item[1]['p99_ms']):
+        print(f"{route:<28}{stats['count']:>8}{stats['p50_ms']:>10}{stats['p99_ms']:>10}"
+              f"{stats['queries_per_update']:>9}{stats['errors']:>8}")
+
+    print(f"\n{'задача':<28}{'p50 мс':>10}{'p99 мс':>10}{'БД/вызов':>10}")
+    for name, stats in result['jobs'].items():
+        print(f"{name:<28}{stats['p50_ms']:>10}{stats['p99_ms']:>10}{stats['queries_per_update']:>10}")
+
+    print(f"\nBot API: {result['telegram_api']['total_calls']} вызовов {result['telegram_api']['calls']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк обработки апдейтов бота")
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--warmup', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--scenarios-per-user', type=int, default=2)
+    parser.add_argument('--proxies', type=int, default=30)
+    parser.add_argument('--job-iterations', type=int, default=5)
+    parser.add_argument('--api-latency', type=int, default=0, help="Задержка заглушки Bot API, мс")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="Куда сохранить JSON с результатами")
+    parser.add_argument('--baseline', help="JSON предыдущего прогона для сравнения")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Допустимое ухудшение (доля)")
+    args = parser.parse_args()
+
+    db_dir = tempfile.mkdtemp(prefix='bench_bot_')
+    prepare_environment(os.path.join(db_dir, 'bench.db'))
+
+    result = asyncio.run(run_benchmark(args))
+    print_report(result)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\nРезультаты сохранены: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print("\n❌ Регрессии относительно базовой линии:")
+            for line in regressions:
+                print(f"  • {line}")
+            sys.exit(1)
+        print("\n✅ Регрессий относительно базовой линии нет")
+
+if __name__ == '__main__':
+    main()
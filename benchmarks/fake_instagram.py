@@ -0,0 +1,717 @@
+"""
+Локальная заглушка Instagram private API для нагрузочных и регрессионных прогонов
+
+Эмулирует вход (accounts/login/), challenge_required, 2FA, лимиты запросов,
+постраничную выдачу комментариев и отправку DM с настраиваемой задержкой
+и долей ошибок. instagrapi направляется на заглушку через attach_client()
+или patch_instagrapi(), сетевые запросы к Instagram не выполняются.
+
+Запуск отдельным процессом:
+    python benchmarks/fake_instagram.py --port 8765 --script scenario.json
+
+Пример сценария (все поля необязательны):
+    {
+        "latency_ms": [20, 120],
+        "error_rate": 0.02,
+        "rate_limit_per_minute": 60,
+        "auto_accounts": true,
+        "accounts": {
+            "shop_1": {"password": "secret", "mode": "challenge", "code": "123456"},
+            "shop_2": {"password": "secret", "mode": "2fa", "code": "654321"}
+        },
+        "media": {"3141592653": {"comments": 250}},
+        "page_size": 20,
+        "blocked_proxies": ["10.0.0.5"]
+    }
+
+Режимы аккаунта: ok, challenge, 2fa, bad_password, feedback.
+Управление во время прогона (HTTP):
+    GET  /__fake__/stats                    - счетчики запросов, DM, входов
+    POST /__fake__/script                   - заменить сценарий целиком
+    POST /__fake__/media/<pk>/comments      - {"count": N} добавить комментарии
+    POST /__fake__/reset                    - сбросить счетчики и состояние
+"""
+
+import argparse
+import base64
+import json
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+logger = logging.getLogger(__name__)
+
+INSTAGRAM_HOSTS = ('i.instagram.com', 'b.i.instagram.com', 'www.instagram.com', 'instagram.com')
+PASSWORD_KEY_ID = 41
+
+DEFAULT_SCRIPT = {
+    'latency_ms': [0, 0],
+    'error_rate': 0.0,
+    'rate_limit_per_minute': 0,   # 0 - без ограничения
+    'auto_accounts': True,        # Неизвестные аккаунты создаются в режиме ok с любым паролем
+    'accounts': {},
+    'media': {},
+    'default_comments': 50,
+    'page_size': 20,
+    'blocked_proxies': []
+}
+
+class FakeInstagramState:
+    """Состояние заглушки: аккаунты, комментарии, счетчики"""
+
+    def __init__(self, script: Optional[Dict] = None):
+        self.lock = threading.Lock()
+        self._private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        public_pem = self._private_key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+        self.public_key_b64 = base64.b64encode(public_pem).decode()
+        self.load_script(script or {})
+
+    def load_script(self, script: Dict):
+        """Применение сценария и сброс состояния"""
+        with self.lock:
+            self.script = dict(DEFAULT_SCRIPT, **script)
+            self.accounts: Dict[str, Dict] = {}
+            for username, account in self.script['accounts'].items():
+                self._add_account(username, **account)
+
+            self.comments: Dict[str, list] = {}
+            for media_pk, media in self.script['media'].items():
+                self._add_comments(str(media_pk), int(media.get('comments', 0)))
+
+            self.sessions: Dict[str, str] = {}       # sessionid -> username
+            self.challenges: Dict[str, Dict] = {}    # nonce -> {username, step}
+            self.two_factor: Dict[str, str] = {}     # identifier -> username
+            self.requests_log = defaultdict(deque)   # ключ лимита -> время запросов
+            self.requests = defaultdict(int)         # эндпоинт -> число запросов
+            self.stats = defaultdict(int)            # события: входы, challenge, ошибки
+            self.sent_messages = []
+
+    def _add_account(self, username: str, password: Optional[str] = None,
+                     mode: str = 'ok', code: str = '123456', pk: Optional[int] = None):
+        self.accounts[username] = {
+            'username': username,
+            'password': password,
+            'mode': mode,
+            'code': str(code),
+            'pk': pk or random.randint(10 ** 9, 10 ** 10)
+        }
+        return self.accounts[username]
+
+    def get_account(self, username: str) -> Optional[Dict]:
+        account = self.accounts.get(username)
+        if not account and self.script['auto_accounts']:
+            account = self._add_account(username)
+        return account
+
+    def _add_comments(self, media_pk: str, count: int):
+        comments = self.comments.setdefault(media_pk, [])
+        now = int(time.time())
+        for _ in range(count):
+            index = len(comments) + 1
+            user_pk = random.randint(10 ** 9, 10 ** 10)
+            comments.append({
+                'pk': str(int(media_pk) * 1000 + index if media_pk.isdigit() else index),
+                'text': f"Комментарий {index} под {media_pk}",
+                'user': {
+                    'pk': str(user_pk),
+                    'username': f"commenter_{user_pk}",
+                    'full_name': f"Commenter {index}",
+                    'profile_pic_url': None
+                },
+                'created_at_utc': now,
+                'content_type': 'comment',
+                'status': 'Active',
+                'has_liked_comment': False,
+                'comment_like_count': 0
+            })
+        return comments
+
+    def add_comments(self, media_pk: str, count: int):
+        with self.lock:
+            self._add_comments(str(media_pk), count)
+
+    def media_comments(self, media_pk: str):
+        with self.lock:
+            if media_pk not in self.comments:
+                self._add_comments(media_pk, self.script['default_comments'])
+            return list(self.comments[media_pk])
+
+    def decrypt_password(self, enc_password: str) -> Optional[str]:
+        """Расшифровка #PWD_INSTAGRAM:4 так же, как это делает сервер Instagram"""
+        try:
+            _, version, timestamp, payload = enc_password.split(':', 3)
+            if version == '0':
+                return payload
+
+            raw = base64.b64decode(payload)
+            iv = raw[2:14]
+            size = int.from_bytes(raw[14:16], byteorder='little')
+            rsa_encrypted = raw[16:16 + size]
+            tag = raw[16 + size:32 + size]
+            aes_encrypted = raw[32 + size:]
+
+            session_key = self._private_key.decrypt(rsa_encrypted, padding.PKCS1v15())
+            return AESGCM(session_key).decrypt(iv, aes_encrypted + tag, timestamp.encode()).decode()
+        except Exception as e:
+            logger.debug(f"Не удалось расшифровать пароль: {e}")
+            return None
+
+    def check_rate_limit(self, key: str) -> bool:
+        """Скользящее окно в минуту на пользователя/прокси"""
+        limit = self.script['rate_limit_per_minute']
+        if not limit:
+            return True
+
+        now = time.time()
+        with self.lock:
+            window = self.requests_log[key]
+            while window and window[0] < now - 60:
+                window.popleft()
+            if len(window) >= limit:
+                return False
+            window.append(now)
+            return True
+
+    def snapshot_stats(self) -> Dict:
+        with self.lock:
+            return {
+                'requests': dict(self.requests),
+                'events': dict(self.stats),
+                'sessions': len(self.sessions),
+                'sent_messages': len(self.sent_messages),
+                'pending_challenges': len(self.challenges),
+                'media': {pk: len(comments) for pk, comments in self.comments.items()}
+            }
+
+
+def _endpoint_key(endpoint: str) -> str:
+    """Эндпоинт без идентификаторов для статистики"""
+    if endpoint.startswith('challenge/'):
+        return 'challenge/'
+    return '/'.join('{id}' if re.fullmatch(r'[\d_]+', part) else part for part in endpoint.split('/'))
+
+
+class FakeInstagramHandler(BaseHTTPRequestHandler):
+    """Обработчик запросов private API"""
+
+    server_version = 'FakeInstagram/1.0'
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    @property
+    def state(self) -> FakeInstagramState:
+        return self.server.state
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    # === РАЗБОР ЗАПРОСА ===
+
+    def _read_form(self) -> Dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode() if length else ''
+        if not body:
+            return {}
+        if body.lstrip().startswith('{'):
+            return json.loads(body)
+
+        form = {key: values[-1] for key, values in parse_qs(body).items()}
+        signed_body = form.pop('signed_body', None)
+        if signed_body and signed_body.startswith('SIGNATURE.'):
+            form.update(json.loads(signed_body[len('SIGNATURE.'):]))
+        return form
+
+    def _current_user(self) -> Optional[str]:
+        authorization = self.headers.get('Authorization', '')
+        if ':' not in authorization:
+            return None
+        try:
+            data = json.loads(base64.b64decode(authorization.rsplit(':', 1)[-1]))
+        except Exception:
+            return None
+        with self.state.lock:
+            return self.state.sessions.get(data.get('sessionid'))
+
+    # === ОТВЕТЫ ===
+
+    def _send_json(self, status: int, payload: Dict, headers: Optional[Dict] = None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _fail(self, status: int, message: str, **extra):
+        self._send_json(status, dict({'message': message, 'status': 'fail'}, **extra))
+
+    def _logged_in(self, account: Dict, **extra):
+        """Успешный вход: выдаем сессию в формате ig-set-authorization"""
+        sessionid = f"{account['pk']}%3A{uuid.uuid4().hex[:16]}%3A1"
+        with self.state.lock:
+            self.state.sessions[sessionid] = account['username']
+            self.state.stats['logins_ok'] += 1
+
+        token = base64.b64encode(json.dumps({
+            'ds_user_id': str(account['pk']),
+            'sessionid': sessionid,
+            'should_use_header_over_cookies': True
+        }).encode()).decode()
+
+        self._send_json(200, dict({
+            'logged_in_user': {
+                'pk': account['pk'],
+                'pk_id': str(account['pk']),
+                'username': account['username'],
+                'full_name': account['username'],
+                'is_private': False,
+                'profile_pic_url': 'https://example.invalid/pic.jpg'
+            },
+            'status': 'ok'
+        }, **extra), headers={
+            'ig-set-authorization': f"Bearer IGT:2:{token}",
+            'ig-set-ig-u-ds-user-id': str(account['pk'])
+        })
+
+    # === МАРШРУТИЗАЦИЯ ===
+
+    def _handle(self, method: str):
+        parts = urlsplit(self.path)
+        path = parts.path
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+
+        try:
+            form = self._read_form() if method == 'POST' else {}
+        except ValueError:
+            self._fail(400, 'Invalid parameters')
+            return
+
+        if path.startswith('/__fake__/'):
+            self._control(method, path, form)
+            return
+
+        endpoint = re.sub(r'^/api/v1/', '', path)
+        with self.state.lock:
+            self.state.requests[_endpoint_key(endpoint)] += 1
+            script = self.state.script
+
+        latency_min, latency_max = script['latency_ms']
+        if latency_max:
+            time.sleep(random.uniform(latency_min, latency_max) / 1000)
+
+        proxy = self.headers.get('X-Fake-Proxy', '')
+        if proxy and any(blocked in proxy for blocked in script['blocked_proxies']):
+            self._fail(400, "The username you entered doesn't appear to belong to an account.",
+                       error_type='invalid_user')
+            return
+
+        if script['error_rate'] and random.random() < script['error_rate']:
+            with self.state.lock:
+                self.state.stats['injected_errors'] += 1
+            self._fail(500, 'Oops, an error occurred.')
+            return
+
+        user = self._current_user()
+        if not self.state.check_rate_limit(user or proxy or self.client_address[0]):
+            with self.state.lock:
+                self.state.stats['rate_limited'] += 1
+            self._fail(429, 'Please wait a few minutes before you try again.')
+            return
+
+        if endpoint == 'qe/sync/':
+            self._send_json(200, {'status': 'ok'}, headers={
+                'ig-set-password-encryption-key-id': str(PASSWORD_KEY_ID),
+                'ig-set-password-encryption-pub-key': self.state.public_key_b64
+            })
+        elif endpoint == 'accounts/login/':
+            self._login(form)
+        elif endpoint == 'accounts/two_factor_login/':
+            self._two_factor_login(form)
+        elif endpoint.startswith('challenge/'):
+            self._challenge(method, endpoint, form)
+        elif re.match(r'^media/[^/]+/info/$', endpoint):
+            self._require_login(user) and self._media_info(endpoint.split('/')[1])
+        elif re.match(r'^media/[^/]+/comments/$', endpoint):
+            self._require_login(user) and self._comments(endpoint.split('/')[1], dict(query, **form))
+        elif endpoint.startswith('direct_v2/threads/broadcast/'):
+            self._require_login(user) and self._direct_send(user, form)
+        elif re.match(r'^users/[^/]+/usernameinfo/$', endpoint):
+            self._user_info(endpoint.split('/')[1])
+        elif endpoint == 'users/web_profile_info/':
+            self._user_info(query.get('username', ''), web=True)
+        else:
+            # Служебные запросы pre_login_flow/login_flow (launcher, feed, reels_tray...)
+            self._send_json(200, {'status': 'ok'})
+
+    def _require_login(self, user: Optional[str]) -> bool:
+        if user:
+            return True
+        self._fail(403, 'login_required', error_type='login_required')
+        return False
+
+    # === АВТОРИЗАЦИЯ ===
+
+    def _login(self, form: Dict):
+        username = form.get('username', '')
+        with self.state.lock:
+            account = self.state.get_account(username)
+
+        if not account:
+            self._fail(400, "The username you entered doesn't appear to belong to an account.",
+                       error_type='invalid_user')
+            return
+
+        password = self.state.decrypt_password(form.get('enc_password', ''))
+        if account['mode'] == 'bad_password' or (
+            account['password'] is not None and password != account['password']
+        ):
+            with self.state.lock:
+                self.state.stats['logins_bad_password'] += 1
+            self._fail(400, 'The password you entered is incorrect.', error_type='bad_password')
+            return
+
+        if account['mode'] == 'challenge' and not account.get('verified'):
+            nonce = uuid.uuid4().hex[:10]
+            with self.state.lock:
+                self.state.challenges[nonce] = {'username': username, 'step': 'select_verify_method'}
+                self.state.stats['challenges_issued'] += 1
+            api_path = f"/challenge/{account['pk']}/{nonce}/"
+            self._fail(400, 'challenge_required', error_type='checkpoint_challenge_required', challenge={
+                'url': f"https://i.instagram.com{api_path}",
+                'api_path': api_path,
+                'hide_webview_header': True,
+                'lock': True,
+                'logout': False,
+                'native_flow': True
+            })
+            return
+
+        if account['mode'] == '2fa':
+            identifier = uuid.uuid4().hex
+            with self.state.lock:
+                self.state.two_factor[identifier] = username
+                self.state.stats['two_factor_issued'] += 1
+            self._fail(400, 'Two-factor authentication required', error_type='two_factor_required',
+                       two_factor_required=True, two_factor_info={
+                           'username': username,
+                           'two_factor_identifier': identifier,
+                           'sms_two_factor_on': True,
+                           'totp_two_factor_on': False,
+                           'obfuscated_phone_number': '**00'
+                       })
+            return
+
+        if account['mode'] == 'feedback':
+            self._fail(400, 'feedback_required', feedback_message='Action blocked')
+            return
+
+        self._logged_in(account)
+
+    def _two_factor_login(self, form: Dict):
+        with self.state.lock:
+            username = self.state.two_factor.get(form.get('two_factor_identifier', ''))
+            account = self.state.accounts.get(username) if username else None
+
+        if not account:
+            self._fail(400, 'Invalid parameters')
+            return
+        if form.get('verification_code') != account['code']:
+            self._fail(400, 'Please check the security code and try again.', error_type='sms_code_validation_code_invalid')
+            return
+
+        with self.state.lock:
+            self.state.two_factor.pop(form.get('two_factor_identifier'), None)
+        self._logged_in(account)
+
+    def _challenge(self, method: str, endpoint: str, form: Dict):
+        """challenge/<user_id>/<nonce>/: выбор способа -> ввод кода -> закрытие"""
+        parts = endpoint.strip('/').split('/')
+        nonce = parts[2] if len(parts) > 2 else ''
+        with self.state.lock:
+            challenge = self.state.challenges.get(nonce)
+            account = self.state.accounts.get(challenge['username']) if challenge else None
+
+        if not challenge or not account:
+            self._fail(404, 'Challenge not found')
+            return
+
+        if method == 'GET':
+            self._send_json(200, {
+                'step_name': challenge['step'],
+                'step_data': {'choice': '1', 'phone_number': '+1 ***-***-**00', 'email': 'a***@example.invalid'},
+                'user_id': account['pk'],
+                'nonce_code': nonce,
+                'status': 'ok'
+            })
+            return
+
+        if 'security_code' in form:
+            if str(form['security_code']) != account['code']:
+                self._fail(400, 'Please check the code we sent you and try again.')
+                return
+            with self.state.lock:
+                self.state.challenges.pop(nonce, None)
+                self.state.stats['challenges_passed'] += 1
+                # Как и настоящий Instagram, после подтверждения повторный вход проходит без проверки
+                account['verified'] = True
+            self._logged_in(account, action='close')
+            return
+
+        with self.state.lock:
+            challenge['step'] = 'verify_code'
+        self._send_json(200, {
+            'step_name': 'verify_code',
+            'step_data': {'security_code': 'None', 'resend_delay': 60, 'contact_point': '+1 ***-***-**00'},
+            'user_id': account['pk'],
+            'nonce_code': nonce,
+            'status': 'ok'
+        })
+
+    # === ДАННЫЕ ===
+
+    def _comments(self, media_id: str, params: Dict):
+        """Постраничная выдача: страница по page_size, курсор next_max_id (в query или теле)"""
+        media_pk = media_id.split('_')[0]
+        comments = self.state.media_comments(media_pk)
+        page_size = self.state.script['page_size']
+
+        offset = int(params.get('max_id') or 0)
+        page = comments[offset:offset + page_size]
+        has_more = offset + page_size < len(comments)
+
+        payload = {
+            'comments': page,
+            'comment_count': len(comments),
+            'has_more_comments': has_more,
+            'status': 'ok'
+        }
+        if has_more:
+            payload['next_max_id'] = str(offset + page_size)
+        self._send_json(200, payload)
+
+    def _media_info(self, media_id: str):
+        media_pk = media_id.split('_')[0]
+        owner_pk = int(media_pk) % (10 ** 9) + 10 ** 9 if media_pk.isdigit() else 10 ** 9
+        self._send_json(200, {
+            'items': [{
+                'pk': media_pk,
+                'id': f"{media_pk}_{owner_pk}",
+                'code': f"fake{media_pk}",
+                'taken_at': int(time.time()) - 3600,
+                'media_type': 1,
+                'product_type': 'feed',
+                'user': {'pk': str(owner_pk), 'username': f"owner_{owner_pk}", 'full_name': '', 'profile_pic_url': None},
+                'like_count': 0,
+                'comment_count': len(self.state.media_comments(media_pk)),
+                'caption': {'text': ''}
+            }],
+            'num_results': 1,
+            'status': 'ok'
+        })
+
+    def _direct_send(self, user: str, form: Dict):
+        item_id = str(random.randint(10 ** 28, 10 ** 29))
+        thread_id = random.randint(10 ** 38, 10 ** 39)
+        with self.state.lock:
+            account = self.state.accounts.get(user, {})
+            self.state.sent_messages.append({
+                'from': user,
+                'recipients': form.get('recipient_users') or form.get('thread_ids'),
+                'text': form.get('text') or form.get('link_text'),
+                'sent_at': time.time()
+            })
+
+        self._send_json(200, {
+            'action': 'item_ack',
+            'status_code': '200',
+            'payload': {
+                'client_context': form.get('client_context'),
+                'item_id': item_id,
+                'thread_id': str(thread_id),
+                'timestamp': str(int(time.time() * 1_000_000)),
+                'user_id': str(account.get('pk', ''))
+            },
+            'status': 'ok'
+        })
+
+    def _user_info(self, username: str, web: bool = False):
+        with self.state.lock:
+            account = self.state.get_account(username)
+        if not account:
+            self._fail(404, 'User not found')
+            return
+
+        user = {
+            'pk': str(account['pk']),
+            'id': str(account['pk']),
+            'username': username,
+            'full_name': username,
+            'is_private': False,
+            'profile_pic_url': 'https://example.invalid/pic.jpg',
+            'is_verified': False,
+            'media_count': 0,
+            'follower_count': 0,
+            'following_count': 0,
+            'biography': '',
+            'external_url': None,
+            'is_business': False
+        }
+        if web:
+            self._send_json(200, {'data': {'user': user}, 'status': 'ok'})
+        else:
+            self._send_json(200, {'user': user, 'status': 'ok'})
+
+    # === УПРАВЛЕНИЕ ===
+
+    def _control(self, method: str, path: str, form: Dict):
+        if path == '/__fake__/stats':
+            self._send_json(200, self.state.snapshot_stats())
+        elif path == '/__fake__/script' and method == 'POST':
+            self.state.load_script(form)
+            self._send_json(200, {'status': 'ok'})
+        elif path == '/__fake__/reset' and method == 'POST':
+            self.state.load_script(self.state.script)
+            self._send_json(200, {'status': 'ok'})
+        elif re.match(r'^/__fake__/media/[^/]+/comments$', path) and method == 'POST':
+            media_pk = path.split('/')[3]
+            self.state.add_comments(media_pk, int(form.get('count', 1)))
+            self._send_json(200, {'status': 'ok'})
+        else:
+            self._fail(404, 'Unknown control endpoint')
+
+
+class FakeInstagramServer:
+    """Заглушка Instagram в фоновом потоке"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, script: Optional[Dict] = None):
+        self.state = FakeInstagramState(script)
+        self.httpd = ThreadingHTTPServer((host, port), FakeInstagramHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = self.state
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Заглушка Instagram запущена на {self.url}")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# === ПОДКЛЮЧЕНИЕ INSTAGRAPI ===
+
+def _make_adapter(base_url: str):
+    from requests.adapters import HTTPAdapter
+
+    class FakeInstagramAdapter(HTTPAdapter):
+        """Переписывает запросы к *.instagram.com на адрес заглушки"""
+
+        def send(self, request, **kwargs):
+            parts = urlsplit(request.url)
+            request.url = base_url.rstrip('/') + parts.path + (f"?{parts.query}" if parts.query else '')
+
+            # Прокси клиента не используется, но передается заглушке для лимитов и блокировок
+            proxies = kwargs.pop('proxies', None) or {}
+            proxy = proxies.get('https') or proxies.get('http')
+            if proxy:
+                request.headers['X-Fake-Proxy'] = proxy
+
+            kwargs['verify'] = False
+            return super().send(request, proxies={}, **kwargs)
+
+    return FakeInstagramAdapter()
+
+def attach_client(client, base_url: str):
+    """Направить существующий instagrapi.Client на заглушку"""
+    adapter = _make_adapter(base_url)
+    for session in (client.private, client.public):
+        for host in INSTAGRAM_HOSTS:
+            session.mount(f"https://{host}/", adapter)
+    return client
+
+def patch_instagrapi(base_url: str):
+    """Все новые instagrapi.Client (в т.ч. внутри InstagramService) работают через заглушку"""
+    from instagrapi import Client
+
+    original_init = Client.__init__
+    if getattr(original_init, '_fake_instagram', False):
+        return
+
+    def patched_init(self, *args, **kwargs):
+        original_init(self, *args, **kwargs)
+        attach_client(self, base_url)
+        # Паузы между запросами instagrapi только замедляют прогон
+        self.delay_range = None
+
+    patched_init._fake_instagram = True
+    Client.__init__ = patched_init
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная заглушка Instagram private API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--script', help="JSON файл сценария")
+    parser.add_argument('--latency', help="Задержка ответа в мс, например 20-120")
+    parser.add_argument('--error-rate', type=float, help="Доля ответов 500")
+    parser.add_argument('--rate-limit', type=int, help="Запросов в минуту на аккаунт/прокси")
+    args = parser.parse_args()
+
+    script = {}
+    if args.script:
+        with open(args.script, 'r', encoding='utf-8') as f:
+            script = json.load(f)
+    if args.latency:
+        low, _, high = args.latency.partition('-')
+        script['latency_ms'] = [int(low), int(high or low)]
+    if args.error_rate is not None:
+        script['error_rate'] = args.error_rate
+    if args.rate_limit is not None:
+        script['rate_limit_per_minute'] = args.rate_limit
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    server = FakeInstagramServer(args.host, args.port, script)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""
+Локальная заглушка API списка прокси (в формате, который ждет Proxy922Manager.fetch_proxy_page)
+
+Отдает список постранично с ETag и Last-Modified, на совпавший If-None-Match
+или неизмененный If-Modified-Since отвечает 304. Список можно менять во время
+прогона, чтобы проверять синхронизацию добавлений, удалений и смены паролей.
+
+Запуск отдельным процессом:
+    python benchmarks/fake_proxy_provider.py --port 8766 --proxies 20000
+После этого бот направляется на заглушку через PROXY_922_API_URL=http://127.0.0.1:8766/api
+
+Управление во время прогона (HTTP):
+    GET  /__fake__/stats     - число запросов страниц и ответов 304
+    POST /__fake__/proxies   - {"add": N, "remove": N, "rotate": N} изменить список
+    POST /__fake__/reset     - {"proxies": N} пересоздать список и сбросить счетчики
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+class FakeProviderState:
+    """Список прокси провайдера и счетчики запросов"""
+
+    def __init__(self, proxies: int = 1000, validators: bool = True, latency_ms: int = 0, seed: int = 42):
+        self.lock = threading.Lock()
+        self.validators = validators  # False - провайдер без ETag/Last-Modified, работает только хеш
+        self.latency_ms = latency_ms
+        self.random = random.Random(seed)
+        self.reset(proxies)
+
+    def reset(self, proxies: int):
+        with self.lock:
+            self.proxies: Dict[str, Dict] = {}
+            self._next = 0
+            self.stats = defaultdict(int)
+            self._add(proxies)
+            self._touch()
+
+    def _add(self, count: int):
+        for _ in range(count):
+            index = self._next
+            self._next += 1
+            host = f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}"
+            self.proxies[f"{host}:1080"] = {
+                'host': host, 'port': 1080, 'username': f"user{index}",
+                'password': f"pw{self.random.randrange(10 ** 8)}", 'type': 'socks5'
+            }
+
+    def _touch(self):
+        """Новая версия списка: ETag и Last-Modified"""
+        body = json.dumps(sorted(self.proxies.items()), sort_keys=True).encode()
+        self.etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        self.modified_at = time.time()
+        self.order = sorted(self.proxies)
+
+    def mutate(self, add: int = 0, remove: int = 0, rotate: int = 0) -> Dict:
+        """Изменение списка: добавить новые, убрать и сменить пароль у случайных прокси"""
+        with self.lock:
+            keys = list(self.proxies)
+            removed = self.random.sample(keys, min(remove, len(keys)))
+            for key in removed:
+                del self.proxies[key]
+            rotated = self.random.sample(list(self.proxies), min(rotate, len(self.proxies)))
+            for key in rotated:
+                self.proxies[key] = dict(self.proxies[key], password=f"pw{self.random.randrange(10 ** 8)}")
+            self._add(add)
+            self._touch()
+            return {'added': add, 'removed': len(removed), 'rotated': len(rotated), 'total': len(self.proxies)}
+
+    def page(self, page: int, per_page: int) -> Dict:
+        with self.lock:
+            pages = max(1, -(-len(self.order) // per_page))
+            keys = self.order[(page - 1) * per_page:page * per_page]
+            return {
+                'proxies': [self.proxies[key] for key in keys],
+                'page': page,
+                'pages': pages,
+                'total': len(self.order)
+            }
+
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+    """Обработчик API провайдера"""
+
+    server_version = 'FakeProxyProvider/1.0'
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    @property
+    def state(self) -> FakeProviderState:
+        return self.server.state
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        if parts.path == '/__fake__/stats':
+            with self.state.lock:
+                self._send(200, dict(self.state.stats, total=len(self.state.proxies)))
+        elif parts.path.rstrip('/').endswith('/proxies'):
+            self._list(parse_qs(parts.query))
+        else:
+            self._send(404, {'error': 'not found'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        payload = json.loads(self.rfile.read(length) or b'{}') if length else {}
+        path = urlsplit(self.path).path
+        if path == '/__fake__/proxies':
+            self._send(200, self.state.mutate(
+                int(payload.get('add', 0)), int(payload.get('remove', 0)), int(payload.get('rotate', 0))
+            ))
+        elif path == '/__fake__/reset':
+            self.state.reset(int(payload.get('proxies', len(self.state.proxies))))
+            self._send(200, {'ok': True})
+        else:
+            self._send(404, {'error': 'Unknown control endpoint'})
+
+    def _list(self, query: Dict[str, List[str]]):
+        if self.state.latency_ms:
+            time.sleep(self.state.latency_ms / 1000)
+
+        page = max(1, int(query.get('page', ['1'])[0]))
+        per_page = max(1, int(query.get('per_page', ['500'])[0]))
+        with self.state.lock:
+            self.state.stats['page_requests'] += 1
+            etag, modified_at = self.state.etag, self.state.modified_at
+
+        headers = {}
+        if self.state.validators:
+            headers = {'ETag': etag, 'Last-Modified': formatdate(modified_at, usegmt=True)}
+            if self._not_modified(etag, modified_at):
+                with self.state.lock:
+                    self.state.stats['not_modified'] += 1
+                self._send(304, None, headers)
+                return
+
+        self._send(200, self.state.page(page, per_page), headers)
+
+    def _not_modified(self, etag: str, modified_at: float) -> bool:
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match:
+            return if_none_match == etag
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                return int(modified_at) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _send(self, status: int, payload: Optional[Dict], headers: Optional[Dict] = None):
+        body = json.dumps(payload).encode() if payload is not None else b''
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if payload is not None:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeProxyProviderServer:
+    """Заглушка провайдера в фоновом потоке"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, proxies: int = 1000,
+                 validators: bool = True, latency_ms: int = 0):
+        self.state = FakeProviderState(proxies, validators, latency_ms)
+        self.httpd = ThreadingHTTPServer((host, port), FakeProviderHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = self.state
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self) -> str:
+        return f"{self.url}/api"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Заглушка провайдера прокси запущена на {self.api_url}")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная заглушка API списка прокси")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--proxies', type=int, default=1000)
+    parser.add_argument('--latency', type=int, default=0, help="Задержка ответа страницы, мс")
+    parser.add_argument('--no-validators', action='store_true', help="Не отдавать ETag и Last-Modified")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    server = FakeProxyProviderServer(args.host, args.port, args.proxies, not args.no_validators, args.latency)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+if __name__ == '__main__':
+    main()
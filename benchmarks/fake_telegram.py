@@ -0,0 +1,244 @@
+"""
+Локальная заглушка Telegram Bot API для бенчмарков
+
+Отвечает на методы, которые вызывает бот (sendMessage, editMessageText,
+answerCallbackQuery, sendDocument и т.д.), считает вызовы по методам и
+может добавлять задержку и ответы 429 (flood control).
+
+Используется из bench_updates.py, можно запустить и отдельно:
+    python benchmarks/fake_telegram.py --port 8081 --latency 5-20
+После этого Application собирается через build_application(base_url="http://127.0.0.1:8081").
+"""
+
+import argparse
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+BOT_USER = {
+    'id': 100000001,
+    'is_bot': True,
+    'first_name': 'Bench',
+    'username': 'bench_bot',
+    'can_join_groups': False,
+    'can_read_all_group_messages': False,
+    'supports_inline_queries': False
+}
+
+# Методы, отвечающие объектом Message
+MESSAGE_METHODS = {
+    'sendMessage', 'editMessageText', 'editMessageReplyMarkup', 'editMessageCaption',
+    'sendDocument', 'sendPhoto', 'forwardMessage'
+}
+
+class FakeTelegramState:
+    """Счетчики и параметры заглушки"""
+
+    def __init__(self, latency_ms=(0, 0), flood_rate: float = 0.0, retry_after: int = 1):
+        self.lock = threading.Lock()
+        self.latency_ms = tuple(latency_ms)
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.calls = defaultdict(int)
+            self.flood_responses = 0
+            self.chats = defaultdict(int)
+            self._message_id = 1000
+
+    def next_message_id(self) -> int:
+        with self.lock:
+            self._message_id += 1
+            return self._message_id
+
+    def record(self, method: str, chat_id: Optional[str]):
+        with self.lock:
+            self.calls[method] += 1
+            if chat_id:
+                self.chats[chat_id] += 1
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            return {
+                'calls': dict(self.calls),
+                'total_calls': sum(self.calls.values()),
+                'flood_responses': self.flood_responses,
+                'chats': len(self.chats)
+            }
+
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    """Обработчик /bot<token>/<method>"""
+
+    server_version = 'FakeTelegram/1.0'
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    @property
+    def state(self) -> FakeTelegramState:
+        return self.server.state
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def _read_params(self) -> Dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        content_type = self.headers.get('Content-Type', '')
+
+        if not raw:
+            return {}
+        if content_type.startswith('application/json'):
+            return json.loads(raw)
+        if content_type.startswith('multipart/form-data'):
+            # Файлы не нужны, достаточно простых полей
+            text = raw.decode('utf-8', errors='ignore')
+            return dict(re.findall(r'name="([^"]+)"\r\n(?:[^\r\n]+\r\n)*\r\n([^\r\n]*)\r\n', text))
+
+        params = {key: values[-1] for key, values in parse_qs(raw.decode()).items()}
+        for key, value in params.items():
+            # PTB передает сложные поля как JSON-строки
+            if value[:1] in ('{', '['):
+                try:
+                    params[key] = json.loads(value)
+                except ValueError:
+                    pass
+        return params
+
+    def _send_json(self, status: int, payload: Dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self):
+        path = urlsplit(self.path).path
+        match = re.match(r'^/bot[^/]+/(\w+)$', path)
+        params = self._read_params()
+
+        if path == '/__fake__/stats':
+            self._send_json(200, self.state.snapshot())
+            return
+        if path == '/__fake__/reset':
+            self.state.reset()
+            self._send_json(200, {'ok': True})
+            return
+        if not match:
+            self._send_json(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+            return
+
+        method = match.group(1)
+        chat_id = str(params.get('chat_id', '')) or None
+        self.state.record(method, chat_id)
+
+        low, high = self.state.latency_ms
+        if high:
+            time.sleep(random.uniform(low, high) / 1000)
+
+        if self.state.flood_rate and method != 'getMe' and random.random() < self.state.flood_rate:
+            with self.state.lock:
+                self.state.flood_responses += 1
+            self._send_json(429, {
+                'ok': False,
+                'error_code': 429,
+                'description': f"Too Many Requests: retry after {self.state.retry_after}",
+                'parameters': {'retry_after': self.state.retry_after}
+            })
+            return
+
+        self._send_json(200, {'ok': True, 'result': self._result(method, params)})
+
+    def _result(self, method: str, params: Dict):
+        if method == 'getMe':
+            return BOT_USER
+        if method == 'getUpdates':
+            # Бенчмарк подает апдейты напрямую, поллинг всегда пуст
+            time.sleep(min(float(params.get('timeout') or 0), 1.0))
+            return []
+        if method in MESSAGE_METHODS:
+            if 'inline_message_id' in params:
+                return True
+            chat_id = int(params.get('chat_id') or 0)
+            message_id = params.get('message_id')
+            return {
+                'message_id': int(message_id) if message_id else self.state.next_message_id(),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private' if chat_id > 0 else 'supergroup'},
+                'from': BOT_USER,
+                'text': params.get('text') or params.get('caption') or ''
+            }
+        return True
+
+
+class FakeTelegramServer:
+    """Заглушка Bot API в фоновом потоке"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, **state_kwargs):
+        self.state = FakeTelegramState(**state_kwargs)
+        self.httpd = ThreadingHTTPServer((host, port), FakeTelegramHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = self.state
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная заглушка Telegram Bot API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', default='0-0', help="Задержка ответа в мс, например 5-20")
+    parser.add_argument('--flood-rate', type=float, default=0.0, help="Доля ответов 429")
+    args = parser.parse_args()
+
+    low, _, high = args.latency.partition('-')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    server = FakeTelegramServer(args.host, args.port, latency_ms=(int(low), int(high or low)),
+                                flood_rate=args.flood_rate)
+    logger.info(f"Заглушка Bot API запущена на {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Бюджет времени импорта bot.py
+
+Запускает `python -X importtime -c "import bot"` в отдельном процессе с
+тестовым окружением, суммирует время импорта по пакетам верхнего уровня и
+проверяет, что тяжелые зависимости (instagrapi, requests) не загружаются
+при старте, а общее время не превышает бюджет.
+
+    python benchmarks/import_time.py --budget-ms 800 --top 15
+
+Завершается с кодом 1 при превышении бюджета или загрузке запрещенного модуля.
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Модули, которые должны импортироваться лениво (при первом использовании)
+FORBIDDEN_AT_STARTUP = ('instagrapi', 'requests')
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def run_importtime(module: str) -> Tuple[List[Tuple[int, int, int, str]], str]:
+    """Импорт модуля в чистом процессе, возвращает (self_us, cumulative_us, depth, name)"""
+    from cryptography.fernet import Fernet
+
+    env = dict(os.environ)
+    env.setdefault('TELEGRAM_TOKEN', '123456:IMPORT-TIME')
+    env.setdefault('ENCRYPTION_KEY', Fernet.generate_key().decode())
+    env.setdefault('ADMIN_TELEGRAM_ID', '1')
+    env['DATABASE_PATH'] = f"sqlite:///{os.path.join(tempfile.gettempdir(), 'import_time.db')}"
+
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT_DIR, env=env, capture_output=True, text=True
+    )
+
+    entries = []
+    errors = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((int(self_us), int(cumulative_us), len(indent) // 2, name))
+        elif not line.startswith('import time:'):
+            errors.append(line)
+
+    if result.returncode != 0:
+        raise RuntimeError(f"Импорт {module} завершился ошибкой:\n" + '\n'.join(errors[-20:]))
+    return entries, '\n'.join(errors)
+
+
+def summarize(entries: List[Tuple[int, int, int, str]]) -> Dict:
+    """Суммарное время и время по пакетам верхнего уровня"""
+    by_package: Dict[str, int] = defaultdict(int)
+    for self_us, _, _, name in entries:
+        by_package[name.split('.')[0]] += self_us
+
+    loaded = {name for _, _, _, name in entries}
+    return {
+        'total_ms': sum(self_us for self_us, _, _, _ in entries) / 1000,
+        'by_package': dict(sorted(by_package.items(), key=lambda item: item[1], reverse=True)),
+        'forbidden': sorted(
+            module for module in FORBIDDEN_AT_STARTUP
+            if module in loaded
+        )
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бюджет времени импорта бота")
+    parser.add_argument('--module', default='bot', help="Проверяемый модуль")
+    parser.add_argument('--budget-ms', type=float, default=800, help="Допустимое суммарное время импорта")
+    parser.add_argument('--top', type=int, default=15, help="Сколько пакетов показать")
+    args = parser.parse_args()
+
+    try:
+        entries, _ = run_importtime(args.module)
+    except RuntimeError as e:
+        print(e)
+        sys.exit(2)
+
+    summary = summarize(entries)
+
+    print(f"Импорт {args.module}: {summary['total_ms']:.0f} мс (бюджет {args.budget_ms:.0f} мс)")
+    for package, self_us in list(summary['by_package'].items())[:args.top]:
+        print(f"  {package:<30} {self_us / 1000:8.1f} мс")
+
+    failed = False
+    if summary['forbidden']:
+        print(f"❌ При старте загружаются тяжелые модули: {', '.join(summary['forbidden'])}")
+        failed = True
+    if summary['total_ms'] > args.budget_ms:
+        print(f"❌ Превышен бюджет импорта на {summary['total_ms'] - args.budget_ms:.0f} мс")
+        failed = True
+
+    if failed:
+        sys.exit(1)
+    print("✅ Бюджет соблюден")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,22 +5,38 @@ Instagram Automation Bot v2.0
 ОБНОВЛЕННЫЙ ФАЙЛ bot.py
 """
 
+import time
+
+# Отсчет времени запуска до импорта тяжелых модулей
+_PROCESS_STARTED = time.perf_counter()
+
 import asyncio
 import logging
 import os
+from datetime import datetime
+from typing import Optional
 from dotenv import load_dotenv
+
+# Загрузка переменных окружения до чтения config
+load_dotenv()
+
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters
 from telegram import Update
 
 from config import *
 from database.connection import init_database
-from handlers.commands import start, help_command, add_user, delete_user, add_admin
+from handlers.commands import (
+    start, help_command, add_user, delete_user, add_admin, backup_command, restore_command
+)
 from handlers.callbacks import button_handler
 from handlers.scenarios import handle_text_input
-from services.scheduler import check_scheduled_tasks, cleanup_old_data
+from handlers.scheduler import check_scheduled_tasks, cleanup_old_data, restore_running_scenarios, sync_proxy_providers
+from services.metrics import instrument_handler
 
-# Загрузка переменных окружения
-load_dotenv()
+# Модули, которые не нужны для ответа на первые апдейты и прогреваются после старта
+WARMUP_MODULES = ('instagrapi', 'services.proxy_manager', 'services.proxy_922', 'services.backup')
+
+logger = logging.getLogger(__name__)
 
 def setup_logging():
     """Настройка логирования"""
@@ -47,9 +63,16 @@ def setup_logging():
 # === НОВЫЕ ОБРАБОТЧИКИ ДЛЯ УЛУЧШЕННОЙ АВТОРИЗАЦИИ ===
 
 async def handle_sms_code_input(update: Update, context):
-    """Обработчик ввода SMS кодов"""
-    from services.enhanced_auth import handle_sms_code_input as process_sms
-    await process_sms(update, context)
+    """Обработчик ввода SMS кодов
+
+    Цифры - это SMS код, только если сценарий пользователя ждет проверку и не
+    идет поиск прокси (адрес или порт). Иначе это обычный текстовый ввод.
+    """
+    if not context.user_data.get('awaiting_proxy_search'):
+        from services.enhanced_auth import handle_sms_code_input as process_sms
+        if await process_sms(update, context):
+            return
+    await handle_enhanced_text_input(update, context)
 
 async def handle_enhanced_text_input(update: Update, context):
     """Расширенный обработчик текстового ввода"""
@@ -61,11 +84,14 @@ async def handle_enhanced_text_input(update: Update, context):
         await update.message.reply_text("🚫 У вас нет доступа.")
         return
 
-    # === ОБРАБОТКА SMS КОДОВ ===
-    if text.isdigit() and len(text) in [4, 5, 6, 8]:
-        await handle_sms_code_input(update, context)
+    # === ПОИСК В СПИСКЕ ПРОКСИ ===
+    if context.user_data.get('awaiting_proxy_search'):
+        from handlers.proxy import handle_proxy_search_input
+        await handle_proxy_search_input(update, context)
         return
-    
+
+    # SMS коды перехватывает handle_sms_code_input до этого обработчика
+
     # === ОБРАБОТКА КОМАНД АВТОРИЗАЦИИ ===
     auth_commands = {
         'retry': 'retry_now_',
@@ -220,8 +246,9 @@ async def cleanup_auth_sessions(context):
 async def notify_auth_issues(context):
     """Уведомление о проблемах с авторизацией"""
     try:
-        from database.models import Scenario, Admin
+        from database.models import Scenario
         from database.connection import Session
+        from services.broadcast import admin_broadcast
         
         session = Session()
         
@@ -235,8 +262,6 @@ async def notify_auth_issues(context):
             
             # Если много неудачных авторизаций
             if success_rate < 70:
-                admins = session.query(Admin).all()
-                
                 alert_text = (
                     f"⚠️ <b>Проблемы с авторизацией</b>\n\n"
                     f"📊 Успешность: {success_rate:.1f}%\n"
@@ -246,76 +271,147 @@ async def notify_auth_issues(context):
                 )
                 
                 # Отправляем уведомление админам
-                bot = context.bot
-                
-                for admin in admins:
-                    try:
-                        await bot.send_message(
-                            chat_id=admin.telegram_id,
-                            text=alert_text,
-                            parse_mode='HTML'
-                        )
-                    except Exception as e:
-                        logger.error(f"Ошибка отправки уведомления админу {admin.telegram_id}: {e}")
+                await admin_broadcast.alert(context.bot, alert_text)
         
         session.close()
                 
     except Exception as e:
         logger.error(f"Ошибка проверки статистики авторизации: {e}")
 
-def main():
-    """Основная функция запуска бота"""
-    logger = setup_logging()
-    
-    if not TELEGRAM_TOKEN:
-        logger.error("TELEGRAM_TOKEN не установлен!")
-        return
-        
-    # Инициализация базы данных
-    try:
-        init_database()
-        logger.info("База данных инициализирована успешно")
-    except Exception as e:
-        logger.error(f"Ошибка инициализации базы данных: {e}")
-        return
-        
-    logger.info("🚀 Запуск Instagram Automation Bot v2.0 с улучшенной авторизацией")
-    logger.info(f"📊 Лимиты: {MAX_REQUESTS_PER_HOUR} запросов/час, {MAX_ACTIVE_SCENARIOS} сценариев/пользователь")
-    logger.info(f"⚡ Улучшенная авторизация: {MAX_FAST_ATTEMPTS} быстрых попыток × {FAST_RETRY_DELAY//60} мин")
+def build_application(token: str = TELEGRAM_TOKEN, base_url: Optional[str] = None,
+                      with_jobs: bool = True) -> Application:
+    """Сборка приложения с обработчиками и фоновыми задачами
+
+    base_url позволяет направить бота на локальную заглушку Bot API (benchmarks/)
+    """
+    from services.telegram_client import build_request
     
-    # Создание приложения
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+    builder = (
+        Application.builder().token(token)
+        .request(build_request())
+        .get_updates_request(build_request(pool_size=1, read_timeout=30))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if base_url:
+        builder = builder.base_url(f"{base_url}/bot").base_file_url(f"{base_url}/file/bot")
+    application = builder.build()
     
     # Добавление обработчиков команд
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(CommandHandler("adduser", add_user))
-    application.add_handler(CommandHandler("deleteuser", delete_user))
-    application.add_handler(CommandHandler("addadmin", add_admin))
+    application.add_handler(CommandHandler("start", instrument_handler(start)))
+    application.add_handler(CommandHandler("help", instrument_handler(help_command)))
+    application.add_handler(CommandHandler("adduser", instrument_handler(add_user)))
+    application.add_handler(CommandHandler("deleteuser", instrument_handler(delete_user)))
+    application.add_handler(CommandHandler("addadmin", instrument_handler(add_admin)))
+    application.add_handler(CommandHandler("backup", instrument_handler(backup_command)))
+    application.add_handler(CommandHandler("restore", instrument_handler(restore_command)))
     
     # Обработчики кнопок
-    application.add_handler(CallbackQueryHandler(button_handler))
+    application.add_handler(CallbackQueryHandler(instrument_handler(button_handler)))
     
     # === НОВЫЕ ОБРАБОТЧИКИ ДЛЯ УЛУЧШЕННОЙ АВТОРИЗАЦИИ ===
     
     # Обработчик SMS кодов (приоритет выше)
     application.add_handler(MessageHandler(
-        filters.TEXT & ~filters.COMMAND & filters.Regex(r'^\d{4,8}),
-        handle_sms_code_input
+        filters.TEXT & ~filters.COMMAND & filters.Regex(r'^\d{4,8}$'),
+        instrument_handler(handle_sms_code_input)
     ))
     
     # Обработчик текстовых сообщений (расширенный)
     application.add_handler(MessageHandler(
         filters.TEXT & ~filters.COMMAND, 
-        handle_enhanced_text_input
+        instrument_handler(handle_enhanced_text_input)
     ))
     
-    # Фоновые задачи
+    if with_jobs:
+        setup_jobs(application)
+    
+    # Профилирование оборачивает уже зарегистрированные обработчики и задачи
+    if PROFILING_ENABLED:
+        try:
+            from services.profiling import instrument_application
+            instrument_application(application)
+        except Exception as e:
+            logger.error(f"Не удалось включить профилирование: {e}")
+    
+    return application
+
+async def post_init(application: Application):
+    """Запуск вспомогательных сервисов после инициализации приложения"""
+    # Бот приложения используется сценариями вместо собственных экземпляров
+    from services.telegram_client import telegram_clients
+    telegram_clients.register(application.bot)
+    
+    async def start_metrics():
+        try:
+            from services.metrics import start_metrics_server
+            application.bot_data['metrics_server'] = await start_metrics_server()
+        except Exception as e:
+            logger.error(f"Не удалось запустить эндпоинт метрик: {e}")
+    
+    async def start_echo():
+        try:
+            from services.echo_server import start_echo_server
+            application.bot_data['echo_server'] = await start_echo_server()
+        except Exception as e:
+            logger.error(f"Не удалось запустить эндпоинт проверки прокси: {e}")
+    
+    # Схема БД создается в потоке параллельно с остальной инициализацией, до начала поллинга
+    tasks_to_run = [asyncio.to_thread(init_database)]
+    if METRICS_ENABLED:
+        tasks_to_run.append(start_metrics())
+    if ECHO_SERVER_ENABLED:
+        tasks_to_run.append(start_echo())
+    await asyncio.gather(*tasks_to_run)
+    
+    logger.info(f"Инициализация завершена за {(time.perf_counter() - _PROCESS_STARTED) * 1000:.0f} мс от старта процесса")
+
+async def post_shutdown(application: Application):
+    """Закрытие общих HTTP соединений с прокси"""
+    from services.http_pool import http_pool
+    await asyncio.to_thread(http_pool.close_all)
+
+async def warm_up(context):
+    """Прогрев после начала поллинга: тяжелые импорты и соединения с БД параллельно"""
+    import importlib
+    from database.connection import engine
+    
+    def warm_database():
+        with engine.connect() as connection:
+            connection.exec_driver_sql("SELECT 1")
+    
+    started = time.perf_counter()
+    jobs = [asyncio.to_thread(importlib.import_module, name) for name in WARMUP_MODULES]
+    jobs.append(asyncio.to_thread(warm_database))
+    
+    results = await asyncio.gather(*jobs, return_exceptions=True)
+    for name, result in zip(WARMUP_MODULES + ('database',), results):
+        if isinstance(result, Exception):
+            logger.warning(f"Прогрев {name} не удался: {result}")
+    
+    logger.info(
+        f"Бот отвечает через {(started - _PROCESS_STARTED) * 1000:.0f} мс после старта, "
+        f"прогрев занял {(time.perf_counter() - started) * 1000:.0f} мс"
+    )
+
+def setup_jobs(application: Application):
+    """Регистрация фоновых задач"""
     job_queue = application.job_queue
     
     # Существующие задачи
-    job_queue.run_repeating(check_scheduled_tasks, interval=60, first=0)
+    job_queue.run_once(warm_up, when=0)
+    job_queue.run_once(check_scheduled_tasks, when=0)  # Планировщик проверок по next_check_time
+    if RECOVERY_ENABLED:
+        # После планировщика: восстановленные сценарии сразу попадают в его очередь
+        job_queue.run_once(restore_running_scenarios, when=RECOVERY_START_DELAY)
     job_queue.run_repeating(cleanup_old_data, interval=3600, first=3600)
+    if PROVIDER_SYNC_INTERVAL > 0:
+        job_queue.run_repeating(
+            sync_proxy_providers,
+            interval=PROVIDER_SYNC_INTERVAL,
+            first=60,
+            name="sync_proxy_providers"
+        )
     
     # === НОВЫЕ ФОНОВЫЕ ЗАДАЧИ ДЛЯ УЛУЧШЕННОЙ АВТОРИЗАЦИИ ===
     
@@ -342,6 +438,22 @@ def main():
         first=7200,
         name="auth_issues_notifications"
     )
+
+def main():
+    """Основная функция запуска бота"""
+    logger = setup_logging()
+    
+    if not TELEGRAM_TOKEN:
+        logger.error("TELEGRAM_TOKEN не установлен!")
+        return
+        
+    # База данных инициализируется в post_init параллельно с остальными сервисами
+    logger.info("🚀 Запуск Instagram Automation Bot v2.0 с улучшенной авторизацией")
+    logger.info(f"📊 Лимиты: {MAX_REQUESTS_PER_HOUR} запросов/час, {MAX_ACTIVE_SCENARIOS} сценариев/пользователь")
+    logger.info(f"⚡ Улучшенная авторизация: {MAX_FAST_ATTEMPTS} быстрых попыток × {FAST_RETRY_DELAY//60} мин")
+    
+    # Создание приложения
+    application = build_application()
     
     # Запуск бота
     logger.info("✅ Бот запущен с улучшенной авторизацией и готов к работе!")
@@ -358,4 +470,4 @@ def main():
     )
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
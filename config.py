@@ -30,10 +30,96 @@ MAX_ACTIVE_SCENARIOS = int(os.getenv("MAX_ACTIVE_SCENARIOS", 2))
 MIN_ACTION_DELAY = int(os.getenv("MIN_ACTION_DELAY", 15))
 MAX_ACTION_DELAY = int(os.getenv("MAX_ACTION_DELAY", 30))
 
+# === ПЛАНИРОВЩИК ПРОВЕРОК ===
+CHECK_CONCURRENCY = int(os.getenv("CHECK_CONCURRENCY", 5))  # Одновременных проверок комментариев
+
+# Адаптивный интервал проверки по скорости появления комментариев
+ADAPTIVE_POLLING_ENABLED = os.getenv("ADAPTIVE_POLLING_ENABLED", "true").lower() == "true"
+POLL_MIN_INTERVAL = int(os.getenv("POLL_MIN_INTERVAL", 60))          # Самый частый опрос (сек)
+POLL_MAX_INTERVAL = int(os.getenv("POLL_MAX_INTERVAL", 1800))        # Самый редкий опрос (сек)
+POLL_DEFAULT_INTERVAL = int(os.getenv("POLL_DEFAULT_INTERVAL", 300)) # Пока нет статистики (сек)
+POLL_EWMA_WINDOW = int(os.getenv("POLL_EWMA_WINDOW", 1800))          # Окно сглаживания скорости (сек)
+POLL_TARGET_COMMENTS = float(os.getenv("POLL_TARGET_COMMENTS", 1))   # Ожидаемых новых комментариев на опрос
+POLL_BUDGET_SHARE = float(os.getenv("POLL_BUDGET_SHARE", 0.5))       # Доля MAX_REQUESTS_PER_HOUR на опросы
+POLL_REQUESTS_PER_CHECK = int(os.getenv("POLL_REQUESTS_PER_CHECK", 2))  # Запросов к Instagram за одну проверку
+
+# === ВОССТАНОВЛЕНИЕ ПОСЛЕ ПЕРЕЗАПУСКА ===
+RECOVERY_ENABLED = os.getenv("RECOVERY_ENABLED", "true").lower() == "true"
+RECOVERY_START_DELAY = float(os.getenv("RECOVERY_START_DELAY", 5))      # Пауза после старта поллинга (сек)
+RECOVERY_WAVE_SIZE = int(os.getenv("RECOVERY_WAVE_SIZE", 5))            # Сценариев в одной волне
+RECOVERY_WAVE_INTERVAL = float(os.getenv("RECOVERY_WAVE_INTERVAL", 30)) # Пауза между волнами (сек)
+RECOVERY_CONCURRENCY = int(os.getenv("RECOVERY_CONCURRENCY", 3))        # Одновременных восстановлений
+RECOVERY_PER_PROXY = int(os.getenv("RECOVERY_PER_PROXY", 1))            # Сценариев одного прокси в волне
+RECOVERY_JITTER = float(os.getenv("RECOVERY_JITTER", 10))               # Случайная задержка внутри волны (сек)
+SESSIONS_DIR = os.getenv("SESSIONS_DIR")  # По умолчанию папка sessions рядом с файлом БД
+
+# === РЕЗЕРВНОЕ КОПИРОВАНИЕ ===
+BACKUP_DIR = os.getenv("BACKUP_DIR")  # По умолчанию папка backups рядом с файлом БД
+BACKUP_COMPRESSION = os.getenv("BACKUP_COMPRESSION", "gzip").lower()  # gzip, zstd, none
+BACKUP_RETENTION = int(os.getenv("BACKUP_RETENTION", 7))  # Сколько последних копий хранить
+BACKUP_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", 1024))  # Страниц SQLite за один шаг
+
+# === МЕТРИКИ ===
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")  # 0.0.0.0 для сбора из Docker сети
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9100))
+
+# === TELEGRAM BOT API ===
+TELEGRAM_POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", 64))  # Общий пул соединений для всех сценариев
+TELEGRAM_POOL_TIMEOUT = float(os.getenv("TELEGRAM_POOL_TIMEOUT", 10))  # Ожидание свободного соединения
+TELEGRAM_CONNECT_TIMEOUT = float(os.getenv("TELEGRAM_CONNECT_TIMEOUT", 10))
+TELEGRAM_READ_TIMEOUT = float(os.getenv("TELEGRAM_READ_TIMEOUT", 15))
+TELEGRAM_KEEPALIVE_EXPIRY = float(os.getenv("TELEGRAM_KEEPALIVE_EXPIRY", 60))  # Жизнь простаивающего соединения
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", 25))  # Сообщений в секунду на всего бота
+TELEGRAM_CHAT_INTERVAL = float(os.getenv("TELEGRAM_CHAT_INTERVAL", 1.0))  # Секунд между сообщениями в один чат
+TELEGRAM_SEND_RETRIES = int(os.getenv("TELEGRAM_SEND_RETRIES", 5))
+BROADCAST_DEDUPE_WINDOW = int(os.getenv("BROADCAST_DEDUPE_WINDOW", 3600))  # Секунд без повтора одинаковых уведомлений
+BROADCAST_DIGEST_DELAY = float(os.getenv("BROADCAST_DIGEST_DELAY", 30))  # Сбор уведомлений в одну сводку
+
+# === ПРОФИЛИРОВАНИЕ ===
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILING_SLOW_THRESHOLD_MS = int(os.getenv("PROFILING_SLOW_THRESHOLD_MS", 1000))  # Медленный обработчик/задача
+PROFILING_BLOCK_THRESHOLD_MS = int(os.getenv("PROFILING_BLOCK_THRESHOLD_MS", 100))  # Непрерывная блокировка event loop
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", 0))  # Доля вызовов под профилировщиком (0 - выключено)
+PROFILING_PROFILER = os.getenv("PROFILING_PROFILER", "cprofile")  # cprofile или pyinstrument
+PROFILING_DIR = os.getenv("PROFILING_DIR", "profiles")
+
 # === КОНСТАНТЫ ПРОКСИ ===
-PROXY_CHECK_TIMEOUT = 10  # Таймаут проверки прокси в секундах
-PROXY_CHECK_URL = "http://httpbin.org/ip"  # URL для проверки прокси
-PROXY_RECHECK_INTERVAL = 30  # Интервал перепроверки прокси в минутах
+PROXY_CHECK_TIMEOUT = int(os.getenv("PROXY_CHECK_TIMEOUT", 10))  # Таймаут проверки прокси в секундах
+PROXY_CHECK_URL = os.getenv("PROXY_CHECK_URL", "http://httpbin.org/ip")  # URL для проверки прокси, ответ с ключом origin
+PROXY_RECHECK_INTERVAL = int(os.getenv("PROXY_RECHECK_INTERVAL", 30))  # Интервал перепроверки прокси в минутах
+PROXY_CHECK_FRESH_CONNECTION = os.getenv("PROXY_CHECK_FRESH_CONNECTION", "false").lower() == "true"  # Проверка по новому соединению вместо keep-alive (холодная задержка)
+ECHO_SERVER_ENABLED = os.getenv("ECHO_SERVER_ENABLED", "false").lower() == "true"  # Своя цель проверки внутри бота
+ECHO_SERVER_HOST = os.getenv("ECHO_SERVER_HOST", "0.0.0.0")
+ECHO_SERVER_PORT = int(os.getenv("ECHO_SERVER_PORT", 9180))
+ECHO_TRUST_FORWARDED = os.getenv("ECHO_TRUST_FORWARDED", "false").lower() == "true"  # За reverse proxy
+PROXY_MAX_SCENARIOS = int(os.getenv("PROXY_MAX_SCENARIOS", 3))  # Запущенных сценариев на один прокси
+REBALANCE_MAX_MOVES = int(os.getenv("REBALANCE_MAX_MOVES", 5))  # Переносов аккаунтов за один проход
+REBALANCE_STICKY_DAYS = int(os.getenv("REBALANCE_STICKY_DAYS", 7))  # Аккаунт с недавним challenge не переносится
+PROXY_STICKY_ACCOUNTS = {
+    username.strip().lower() for username in os.getenv("PROXY_STICKY_ACCOUNTS", "").split(",") if username.strip()
+}  # Аккаунты, закрепленные за своим прокси
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 3))  # Сетевых ошибок подряд до отключения прокси
+BREAKER_BASE_COOLDOWN = float(os.getenv("BREAKER_BASE_COOLDOWN", 30))  # Первое отключение (сек), далее вдвое дольше
+BREAKER_MAX_COOLDOWN = float(os.getenv("BREAKER_MAX_COOLDOWN", 1800))  # Максимальное отключение (сек)
+EXIT_IP_GROUPING = os.getenv("EXIT_IP_GROUPING", "ip").lower()  # ip, subnet или none - что считать одним прокси при распределении
+PROXY_PROBE_TIMEOUT = float(os.getenv("PROXY_PROBE_TIMEOUT", 0.8))  # Быстрая проверка: TCP + рукопожатие (сек)
+PROXY_PROBE_TARGET = os.getenv("PROXY_PROBE_TARGET", "i.instagram.com:443")  # Куда прокси должен открыть туннель
+PROXY_PROBE_CONCURRENCY = int(os.getenv("PROXY_PROBE_CONCURRENCY", 200))  # Одновременных быстрых проверок
+PROXY_HTTP_CONCURRENCY = int(os.getenv("PROXY_HTTP_CONCURRENCY", 20))  # Одновременных полных HTTP проверок
+PROXY_DNS_TTL = int(os.getenv("PROXY_DNS_TTL", 300))  # Кэш DNS адресов прокси (сек)
+INSTAGRAM_PROBE_TIMEOUT = float(os.getenv("INSTAGRAM_PROBE_TIMEOUT", 8))  # Проверка доступности Instagram через прокси (сек)
+INSTAGRAM_PROBE_MAX_BYTES = int(os.getenv("INSTAGRAM_PROBE_MAX_BYTES", 4096))  # Сколько тела ответа читать, если заголовков мало
+INSTAGRAM_PROBE_CONCURRENCY = int(os.getenv("INSTAGRAM_PROBE_CONCURRENCY", 20))  # Одновременных проверок Instagram
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))  # Прокси в одной пачке при экспорте в файл
+HTTP_POOL_MAX_SESSIONS = int(os.getenv("HTTP_POOL_MAX_SESSIONS", 500))  # HTTP сессий с keep-alive (по одной на прокси)
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 4))  # Соединений в одной сессии
+HTTP_POOL_IDLE_TIMEOUT = float(os.getenv("HTTP_POOL_IDLE_TIMEOUT", 600))  # Простаивающая сессия закрывается (сек)
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))  # Подключение к прокси или API (сек)
+PROXY_922_API_URL = os.getenv("PROXY_922_API_URL", "https://www.922s5.com/api")  # API списка прокси 922Proxy
+PROVIDER_SYNC_INTERVAL = int(os.getenv("PROVIDER_SYNC_INTERVAL", 0))  # Синхронизация со списком провайдера (сек), 0 - выключена
+PROVIDER_SYNC_PAGE_SIZE = int(os.getenv("PROVIDER_SYNC_PAGE_SIZE", 500))  # Прокси на странице API провайдера
+PROVIDER_SYNC_CONCURRENCY = int(os.getenv("PROVIDER_SYNC_CONCURRENCY", 4))  # Страниц, загружаемых одновременно
 
 # === КОНСТАНТЫ УЛУЧШЕННОЙ АВТОРИЗАЦИИ ===
 # Быстрые попытки авторизации
@@ -46,6 +132,11 @@ CHALLENGE_TIMEOUT = int(os.getenv("CHALLENGE_TIMEOUT", 1800))  # 30 минут
 SMS_CODE_TIMEOUT = int(os.getenv("SMS_CODE_TIMEOUT", 300))     # 5 минут
 EMAIL_TIMEOUT = int(os.getenv("EMAIL_TIMEOUT", 600))           # 10 минут
 
+# Очередь входов
+LOGIN_MAX_CONCURRENT = int(os.getenv("LOGIN_MAX_CONCURRENT", 4))  # Одновременных входов на весь бот
+LOGIN_PER_EXIT_IP = int(os.getenv("LOGIN_PER_EXIT_IP", 1))  # Одновременных входов через один выходной IP
+LOGIN_MIN_SPACING = int(os.getenv("LOGIN_MIN_SPACING", 60))  # Минимум секунд между входами с одного IP
+
 # Интерактивные возможности
 ENABLE_SMS_INPUT = os.getenv("ENABLE_SMS_INPUT", "true").lower() == "true"
 ENABLE_QUICK_RETRY = os.getenv("ENABLE_QUICK_RETRY", "true").lower() == "true"
@@ -60,6 +151,15 @@ CHALLENGE_DETECTION = {
     'photo_keywords': ['photo', 'selfie', 'фото', 'селфи', 'снимок']
 }
 
+# Классификатор проверок по истории входов
+CHALLENGE_MODEL_DAYS = int(os.getenv("CHALLENGE_MODEL_DAYS", 30))  # Глубина истории для обучения (дней)
+CHALLENGE_MODEL_TTL = int(os.getenv("CHALLENGE_MODEL_TTL", 600))  # Переобучение не чаще (сек)
+CHALLENGE_MIN_SAMPLES = int(os.getenv("CHALLENGE_MIN_SAMPLES", 20))  # Попыток, без которых признак не учитывается в рекомендациях
+CHALLENGE_PRIOR_WEIGHT = float(os.getenv("CHALLENGE_PRIOR_WEIGHT", 5))  # Сглаживание долей к общей статистике
+CHALLENGE_SWITCH_MARGIN = float(os.getenv("CHALLENGE_SWITCH_MARGIN", 0.15))  # Насколько прогноз альтернативы должен быть лучше
+CHALLENGE_MAX_WAIT = int(os.getenv("CHALLENGE_MAX_WAIT", 7200))  # Максимальное ожидание удачного часа (сек)
+CHALLENGE_EXPLORATION = float(os.getenv("CHALLENGE_EXPLORATION", 0.1))  # Доля входов со случайным профилем устройства
+
 # Антидетект улучшения
 RANDOM_DELAYS = {
     'before_login': (3, 8),      # Задержка перед входом
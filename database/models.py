@@ -54,6 +54,10 @@ class ProxyServer(Base):
     # Связи
     scenarios = relationship("Scenario", back_populates="proxy_server")
     performance = relationship("ProxyPerformance", back_populates="proxy_server", uselist=False)
+    exit_ips = relationship("ProxyExitIP", back_populates="proxy_server", cascade="all, delete-orphan")
+    provider_link = relationship(
+        "ProviderProxy", back_populates="proxy_server", uselist=False, cascade="all, delete-orphan"
+    )
 
     @property
     def connection_string(self):
@@ -167,6 +171,8 @@ class AuthenticationLog(Base):
     
     # Связи
     scenario = relationship("Scenario", back_populates="auth_logs")
+    context = relationship("AuthAttemptContext", back_populates="auth_log", uselist=False,
+                           cascade="all, delete-orphan")
 
     def __repr__(self):
         return f"<AuthenticationLog(id={self.id}, scenario_id={self.scenario_id}, success={self.success})>"
@@ -190,6 +196,23 @@ class ChallengeSession(Base):
     def __repr__(self):
         return f"<ChallengeSession(id={self.id}, scenario_id={self.scenario_id}, status='{self.status}')>"
 
+class AuthAttemptContext(Base):
+    """Модель условий попытки входа: по ним классификатор проверок ищет удачные сочетания"""
+    __tablename__ = 'auth_attempt_contexts'
+    
+    id = Column(Integer, primary_key=True)
+    auth_log_id = Column(Integer, ForeignKey('authentication_logs.id'), unique=True, nullable=False)
+    proxy_id = Column(Integer, nullable=True, index=True)  # None - прямое подключение
+    device_model = Column(String(100), nullable=True)
+    user_agent = Column(String(200), nullable=True)
+    hour = Column(Integer, nullable=True)  # Час попытки по времени сервера
+    
+    # Связи
+    auth_log = relationship("AuthenticationLog", back_populates="context")
+    
+    def __repr__(self):
+        return f"<AuthAttemptContext(auth_log_id={self.auth_log_id}, proxy_id={self.proxy_id})>"
+
 class ProxyPerformance(Base):
     """Модель производительности прокси"""
     __tablename__ = 'proxy_performance'
@@ -215,4 +238,55 @@ class ProxyPerformance(Base):
         return (self.auth_successes / self.auth_attempts) * 100
 
     def __repr__(self):
-        return f"<ProxyPerformance(id={self.id}, proxy_id={self.proxy_id}, success_rate={self.success_rate:.1f}%)>"
\ No newline at end of file
+        return f"<ProxyPerformance(id={self.id}, proxy_id={self.proxy_id}, success_rate={self.success_rate:.1f}%)>"
+
+class ProxyExitIP(Base):
+    """Модель истории выходных IP прокси"""
+    __tablename__ = 'proxy_exit_ips'
+    
+    id = Column(Integer, primary_key=True)
+    proxy_id = Column(Integer, ForeignKey('proxy_servers.id'), nullable=False, index=True)
+    ip = Column(String(45), nullable=False, index=True)
+    subnet = Column(String(50), nullable=False, index=True)  # /24 для IPv4, /48 для IPv6
+    first_seen = Column(DateTime, default=datetime.now)
+    last_seen = Column(DateTime, default=datetime.now)
+    seen_count = Column(Integer, default=1)
+    
+    # Связи
+    proxy_server = relationship("ProxyServer", back_populates="exit_ips")
+
+    def __repr__(self):
+        return f"<ProxyExitIP(id={self.id}, proxy_id={self.proxy_id}, ip='{self.ip}')>"
+
+class ProviderSyncState(Base):
+    """Модель состояния синхронизации со списком прокси провайдера"""
+    __tablename__ = 'provider_sync_states'
+    
+    id = Column(Integer, primary_key=True)
+    provider = Column(String(50), unique=True, nullable=False)
+    etag = Column(String(255), nullable=True)
+    last_modified = Column(String(100), nullable=True)
+    content_hash = Column(String(64), nullable=True)  # sha256 нормализованного списка
+    last_sync = Column(DateTime, nullable=True)
+    last_change = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    total = Column(Integer, default=0)
+    
+    def __repr__(self):
+        return f"<ProviderSyncState(provider='{self.provider}', total={self.total})>"
+
+class ProviderProxy(Base):
+    """Модель привязки прокси к провайдеру, из списка которого он получен"""
+    __tablename__ = 'provider_proxies'
+    
+    id = Column(Integer, primary_key=True)
+    provider = Column(String(50), nullable=False, index=True)
+    proxy_id = Column(Integer, ForeignKey('proxy_servers.id'), unique=True, nullable=False)
+    fingerprint = Column(String(64), nullable=False)  # sha256 типа и учетных данных - без расшифровки паролей
+    synced_at = Column(DateTime, default=datetime.now)
+    
+    # Связи
+    proxy_server = relationship("ProxyServer", back_populates="provider_link")
+    
+    def __repr__(self):
+        return f"<ProviderProxy(provider='{self.provider}', proxy_id={self.proxy_id})>"
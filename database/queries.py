@@ -0,0 +1,123 @@
+"""
+Запросы чтения для списков сценариев
+Сводка по сценариям с прокси и очередью сообщений одним запросом вместо N+1
+"""
+
+import logging
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+
+from .models import User, Scenario, ProxyServer, PendingMessage
+from .connection import Session
+
+logger = logging.getLogger(__name__)
+
+class ScenarioQueries:
+    """Read-модель сценариев для экранов бота"""
+
+    @staticmethod
+    def _summary_query(session):
+        """Сценарий + владелец + прокси + размер очереди в одном SELECT"""
+        pending = session.query(
+            PendingMessage.scenario_id.label('scenario_id'),
+            func.count(PendingMessage.id).label('pending_count')
+        ).group_by(PendingMessage.scenario_id).subquery()
+
+        return session.query(
+            Scenario.id,
+            Scenario.ig_username,
+            Scenario.trigger_word,
+            Scenario.status,
+            Scenario.auth_status,
+            Scenario.comments_processed,
+            Scenario.active_until,
+            User.telegram_id.label('owner_telegram_id'),
+            ProxyServer.id.label('proxy_id'),
+            ProxyServer.name.label('proxy_name'),
+            ProxyServer.is_working.label('proxy_is_working'),
+            func.coalesce(pending.c.pending_count, 0).label('pending_count')
+        ).join(
+            User, Scenario.user_id == User.id
+        ).outerjoin(
+            ProxyServer, Scenario.proxy_id == ProxyServer.id
+        ).outerjoin(
+            pending, pending.c.scenario_id == Scenario.id
+        )
+
+    @staticmethod
+    def get_scenario_summaries(telegram_id: Optional[int] = None, status: Optional[str] = None,
+                               limit: int = 10, after_id: Optional[int] = None,
+                               before_id: Optional[int] = None) -> Dict:
+        """Страница сводок сценариев (новые первыми), keyset пагинация по id
+
+        telegram_id ограничивает выборку сценариями одного пользователя.
+        """
+        session = Session()
+        try:
+            query = ScenarioQueries._summary_query(session)
+
+            if telegram_id is not None:
+                query = query.filter(User.telegram_id == telegram_id)
+            if status:
+                query = query.filter(Scenario.status == status)
+
+            if before_id is not None:
+                rows = query.filter(Scenario.id > before_id).order_by(Scenario.id.asc()).limit(limit + 1).all()
+                has_prev = len(rows) > limit
+                rows = list(reversed(rows[:limit]))
+                has_next = True
+            else:
+                if after_id is not None:
+                    query = query.filter(Scenario.id < after_id)
+                rows = query.order_by(Scenario.id.desc()).limit(limit + 1).all()
+                has_next = len(rows) > limit
+                rows = rows[:limit]
+                has_prev = after_id is not None
+
+            items = [dict(row._mapping) for row in rows]
+            return {
+                'items': items,
+                'has_prev': has_prev and bool(items),
+                'has_next': has_next and bool(items),
+                'first_id': items[0]['id'] if items else None,
+                'last_id': items[-1]['id'] if items else None
+            }
+        except Exception as e:
+            logger.error(f"Ошибка получения списка сценариев: {e}")
+            return {'items': [], 'has_prev': False, 'has_next': False, 'first_id': None, 'last_id': None}
+        finally:
+            session.close()
+
+    @staticmethod
+    def get_status_overview() -> Dict:
+        """Агрегированная статистика сценариев для админ-панели"""
+        session = Session()
+        try:
+            by_status = dict(
+                session.query(Scenario.status, func.count(Scenario.id)).group_by(Scenario.status).all()
+            )
+            by_auth = dict(
+                session.query(Scenario.auth_status, func.count(Scenario.id)).group_by(Scenario.auth_status).all()
+            )
+            totals = session.query(
+                func.count(func.distinct(Scenario.user_id)),
+                func.count(func.distinct(Scenario.proxy_id)),
+                func.coalesce(func.sum(Scenario.comments_processed), 0)
+            ).one()
+            pending_total = session.query(func.count(PendingMessage.id)).scalar() or 0
+
+            return {
+                'total': sum(by_status.values()),
+                'by_status': by_status,
+                'by_auth_status': by_auth,
+                'users': totals[0],
+                'proxies_in_use': totals[1],
+                'comments_processed': totals[2],
+                'pending_messages': pending_total
+            }
+        except Exception as e:
+            logger.error(f"Ошибка получения статистики сценариев: {e}")
+            return {}
+        finally:
+            session.close()
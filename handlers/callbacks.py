@@ -12,19 +12,21 @@ from ui.menus import main_menu, admin_menu, scenarios_menu
 from handlers.scenarios import (
     start_scenario_creation, show_user_scenarios, handle_proxy_choice,
     show_proxy_selection, select_proxy_for_scenario, handle_duration_selection,
-    confirm_scenario_creation, show_scenario_management
+    confirm_scenario_creation, show_scenario_management,
+    show_all_scenarios, show_scenarios_status
 )
 from handlers.proxy import (
     manage_proxies_menu, start_add_proxy, list_proxies, check_all_proxies,
     show_proxy_stats, handle_proxy_type_selection, create_proxy_server,
-    delete_proxy_server, check_single_proxy, manage_single_proxy
+    delete_proxy_server, check_single_proxy, manage_single_proxy,
+    handle_proxy_browser_callback
 )
 from handlers.proxy_import import (
     show_import_menu, show_providers_menu, start_922proxy_import,
     start_text_import, start_provider_import, bulk_proxy_operations,
     auto_rotate_proxies, bulk_check_proxies, cleanup_failed_proxies,
     confirm_cleanup_proxies, export_proxies, process_proxy_export,
-    test_proxy_with_instagram
+    test_proxy_with_instagram, bulk_check_instagram
 )
 
 logger = logging.getLogger(__name__)
@@ -128,7 +130,9 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         elif data == 'add_proxy':
             await start_add_proxy(query, context)
         elif data == 'list_proxies':
-            await list_proxies(query)
+            await list_proxies(query, context)
+        elif data.startswith('proxies_'):
+            await handle_proxy_browser_callback(query, context, data)
         elif data == 'check_all_proxies':
             await check_all_proxies(query)
         elif data == 'proxy_stats':
@@ -171,6 +175,8 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await auto_rotate_proxies(query)
         elif data == 'bulk_check_proxies':
             await bulk_check_proxies(query)
+        elif data == 'bulk_check_instagram':
+            await bulk_check_instagram(query)
         elif data == 'cleanup_failed_proxies':
             await cleanup_failed_proxies(query)
         elif data == 'confirm_cleanup_proxies':
@@ -187,6 +193,8 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await start_scenario_creation(query, context, user_id)
         elif data == 'my_scenarios':
             await show_user_scenarios(query, user_id)
+        elif data.startswith('my_scenarios_next_') or data.startswith('my_scenarios_prev_'):
+            await show_user_scenarios(query, user_id, data)
         elif data.startswith('manage_'):
             scenario_id = int(data.split("_")[1])
             await show_scenario_management(query, scenario_id, user_id)
@@ -246,9 +254,9 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         elif data == 'status_scenarios':
             if is_admin_user:
                 await show_scenarios_status(query)
-        elif data == 'all_scenarios':
+        elif data == 'all_scenarios' or data.startswith('all_scenarios_next_') or data.startswith('all_scenarios_prev_'):
             if is_admin_user:
-                await show_all_scenarios(query)
+                await show_all_scenarios(query, data)
         
         # === ПОМОЩЬ ===
         elif data == 'help':
@@ -504,7 +512,7 @@ async def restart_scenario_enhanced(query, scenario_id, user_id):
         # Запуск новой задачи с улучшенной авторизацией
         from services.enhanced_auth import run_enhanced_instagram_scenario
         tasks[scenario_id] = asyncio.create_task(
-            run_enhanced_instagram_scenario(scenario_id, query.message.chat_id)
+            run_enhanced_instagram_scenario(scenario_id, query.message.chat_id, query.get_bot())
         )
         
         await query.edit_message_text(
@@ -531,6 +539,6 @@ async def restart_scenario_enhanced(query, scenario_id, user_id):
 from handlers.callbacks import (
     check_scenario_comments, send_pending_messages, show_schedule_menu,
     set_check_timer, pause_scenario, resume_scenario, delete_scenario,
-    show_manage_users_info, show_manage_admins_info, show_scenarios_status,
-    show_all_scenarios, show_help_info, show_scenario_management_menu
+    show_manage_users_info, show_manage_admins_info,
+    show_help_info, show_scenario_management_menu
 )
\ No newline at end of file
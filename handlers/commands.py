@@ -104,6 +104,8 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 • /adduser [ID] - добавить пользователя
 • /deleteuser [ID] - удалить пользователя  
 • /addadmin [ID] - добавить администратора
+• /backup - создать резервную копию БД
+• /restore [файл] - восстановить БД из копии
 • Полное управление прокси серверами
 • Глобальная статистика и мониторинг
 
@@ -243,4 +245,79 @@ async def add_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Ошибка добавления админа: {e}")
         await update.message.reply_text("❌ Произошла ошибка при добавлении администратора.")
     finally:
-        session.close()
\ No newline at end of file
+        session.close()
+
+async def backup_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Создание резервной копии БД по запросу"""
+    user_id = update.effective_user.id
+    if not is_admin(user_id):
+        await update.message.reply_text("🚫 У вас нет прав для этой команды.")
+        return
+
+    try:
+        from services.backup import BackupService
+
+        await update.message.reply_text("⏳ Создание резервной копии...")
+        result = await BackupService.create_backup()
+
+        if not result:
+            await update.message.reply_text("❌ Резервное копирование недоступно для текущей БД.")
+            return
+
+        await update.message.reply_text(
+            f"✅ <b>Резервная копия создана</b>\n\n"
+            f"📄 <code>{result['filename']}</code>\n"
+            f"📦 Размер: {result['size'] / 1024:.1f} КБ\n"
+            f"🔐 SHA-256: <code>{result['sha256'][:16]}…</code>",
+            parse_mode='HTML'
+        )
+        logger.info(f"Админ {user_id} создал резервную копию {result['filename']}")
+
+    except Exception as e:
+        logger.error(f"Ошибка создания резервной копии: {e}")
+        await update.message.reply_text("❌ Произошла ошибка при создании резервной копии.")
+
+async def restore_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Восстановление БД из резервной копии"""
+    user_id = update.effective_user.id
+    if not is_admin(user_id):
+        await update.message.reply_text("🚫 У вас нет прав для этой команды.")
+        return
+
+    from services.backup import BackupService
+
+    if not context.args:
+        backups = BackupService.list_backups()
+        if not backups:
+            await update.message.reply_text("📭 Резервных копий нет.")
+            return
+
+        backups_text = "\n".join(
+            f"• <code>{b['filename']}</code> ({b['size'] / 1024:.1f} КБ)" for b in backups
+        )
+        await update.message.reply_text(
+            "📝 <b>Использование:</b> /restore [имя файла]\n\n"
+            f"<b>Доступные копии:</b>\n{backups_text}",
+            parse_mode='HTML'
+        )
+        return
+
+    try:
+        backup_filename = context.args[0]
+        await update.message.reply_text("⏳ Восстановление базы данных...")
+
+        if await BackupService.restore_backup(backup_filename):
+            await update.message.reply_text(
+                f"✅ База данных восстановлена из <code>{backup_filename}</code>.\n"
+                "Текущее состояние сохранено в отдельную копию.",
+                parse_mode='HTML'
+            )
+            logger.info(f"Админ {user_id} восстановил БД из {backup_filename}")
+        else:
+            await update.message.reply_text(
+                "❌ Копия не найдена или не прошла проверку контрольной суммы."
+            )
+
+    except Exception as e:
+        logger.error(f"Ошибка восстановления БД: {e}")
+        await update.message.reply_text("❌ Произошла ошибка при восстановлении базы данных.")
@@ -16,6 +16,7 @@ from database.models import Scenario, SentMessage, PendingMessage, RequestLog
 from database.connection import Session
 from services.encryption import EncryptionService
 from services.proxy_manager import ProxyManager
+from services.telegram_queue import telegram_outbox
 from config import (
     TELEGRAM_TOKEN, MAX_ATTEMPTS, DELAY_BETWEEN_ATTEMPTS, CAPTCHA_TIMEOUT,
     MIN_ACTION_DELAY, MAX_ACTION_DELAY, INSTAGRAM_USER_AGENTS, DEVICE_SETTINGS,
@@ -68,6 +69,12 @@ class InstagramService:
         ig_bot.set_user_agent(user_agent)
         ig_bot.set_device(device)
         
+        from services.metrics import instrument_instagram_client
+        instrument_instagram_client(ig_bot, scenario.proxy_server is not None)
+        
+        from services.circuit_breaker import circuit_breakers
+        circuit_breakers.bind_client(ig_bot, scenario.proxy_id)
+        
         return ig_bot
 
     @staticmethod
@@ -83,6 +90,7 @@ class InstagramService:
             ig_bot = InstagramService.setup_instagram_client(scenario)
             
             # Попытки авторизации
+            progress_message_id = None
             for attempt in range(1, MAX_ATTEMPTS + 1):
                 try:
                     scenario.auth_attempt = attempt
@@ -90,13 +98,19 @@ class InstagramService:
                     session.commit()
                     
                     proxy_info = f" через {scenario.proxy_server.name}" if scenario.proxy_server else ""
-                    await bot.send_message(
-                        chat_id=chat_id,
-                        text=f"🔄 <b>Авторизация {attempt}/{MAX_ATTEMPTS}</b>\n\n"
-                             f"📱 Сценарий: #{scenario.id}\n"
-                             f"👤 Аккаунт: @{scenario.ig_username}{proxy_info}",
-                        parse_mode='HTML'
+                    progress_text = (
+                        f"🔄 <b>Авторизация {attempt}/{MAX_ATTEMPTS}</b>\n\n"
+                        f"📱 Сценарий: #{scenario.id}\n"
+                        f"👤 Аккаунт: @{scenario.ig_username}{proxy_info}"
                     )
+                    # Одно сообщение о прогрессе на все попытки вместо нового на каждую
+                    if progress_message_id is None:
+                        message = await telegram_outbox.send_message(bot, chat_id, text=progress_text, parse_mode='HTML')
+                        progress_message_id = message.message_id if message else None
+                    else:
+                        await telegram_outbox.edit_message_text(
+                            bot, chat_id, progress_message_id, text=progress_text, parse_mode='HTML'
+                        )
                     
                     logger.info(f"Попытка авторизации {attempt} для сценария {scenario.id}")
                     
@@ -111,10 +125,15 @@ class InstagramService:
                     
                     instabots[scenario.id] = ig_bot
                     
+                    from services.recovery import SessionStore
+                    SessionStore.save(scenario.id, ig_bot)
+                    
                     proxy_status = f"🌐 Прокси: {scenario.proxy_server.name}" if scenario.proxy_server else "🌐 Прямое подключение"
                     
-                    await bot.send_message(
-                        chat_id=chat_id,
+                    await telegram_outbox.send_message(
+                        bot,
+                        chat_id,
+                        wait=False,
                         text=f"✅ <b>Авторизация успешна!</b>\n\n"
                              f"📱 Сценарий: #{scenario.id}\n"
                              f"👤 Аккаунт: @{scenario.ig_username}\n"
@@ -143,8 +162,10 @@ class InstagramService:
                             )
                         ]])
                         
-                        await bot.send_message(
-                            chat_id=chat_id,
+                        await telegram_outbox.send_message(
+                            bot,
+                            chat_id,
+                            wait=False,
                             text=f"🔐 <b>Требуется проверка безопасности</b>\n\n"
                                  f"📱 Сценарий: #{scenario.id} (@{scenario.ig_username})\n\n"
                                  f"<b>Что нужно сделать:</b>\n"
@@ -162,16 +183,20 @@ class InstagramService:
                         while time.time() - start_time < CAPTCHA_TIMEOUT:
                             if captcha_confirmed.get(scenario.id, False):
                                 captcha_confirmed[scenario.id] = False
-                                await bot.send_message(
-                                    chat_id=chat_id,
+                                await telegram_outbox.send_message(
+                                    bot,
+                                    chat_id,
+                                    wait=False,
                                     text=f"✅ Подтверждение получено. Повторная попытка входа..."
                                 )
                                 break
                             await asyncio.sleep(5)
                         
                         if not captcha_confirmed.get(scenario.id, False):
-                            await bot.send_message(
-                                chat_id=chat_id,
+                            await telegram_outbox.send_message(
+                                bot,
+                                chat_id,
+                                wait=False,
                                 text=f"⏰ Время ожидания истекло для сценария #{scenario.id}.\n"
                                      "Сценарий остановлен. Попробуйте перезапустить позже."
                             )
@@ -182,8 +207,10 @@ class InstagramService:
                             return False
                     
                     elif attempt < MAX_ATTEMPTS:
-                        await bot.send_message(
-                            chat_id=chat_id,
+                        await telegram_outbox.send_message(
+                            bot,
+                            chat_id,
+                            wait=False,
                             text=f"❌ Попытка {attempt} неудачна. Ожидание {DELAY_BETWEEN_ATTEMPTS//60} минут..."
                         )
                         await asyncio.sleep(DELAY_BETWEEN_ATTEMPTS)
@@ -195,8 +222,10 @@ class InstagramService:
                     session.merge(scenario)
                     session.commit()
                     
-                    await bot.send_message(
-                        chat_id=chat_id,
+                    await telegram_outbox.send_message(
+                        bot,
+                        chat_id,
+                        wait=False,
                         text=f"❌ <b>Ошибка авторизации</b>\n\n"
                              f"📱 Сценарий: #{scenario.id}\n"
                              f"👤 Аккаунт: @{scenario.ig_username}\n\n"
@@ -213,8 +242,10 @@ class InstagramService:
                     session.commit()
                     
                     if attempt < MAX_ATTEMPTS:
-                        await bot.send_message(
-                            chat_id=chat_id,
+                        await telegram_outbox.send_message(
+                            bot,
+                            chat_id,
+                            wait=False,
                             text=f"❌ <b>Ошибка авторизации</b>\n\n"
                                  f"📱 Сценарий: #{scenario.id}\n"
                                  f"⚠️ Ошибка: {str(e)[:100]}\n\n"
@@ -228,8 +259,10 @@ class InstagramService:
                         session.merge(scenario)
                         session.commit()
                         
-                        await bot.send_message(
-                            chat_id=chat_id,
+                        await telegram_outbox.send_message(
+                            bot,
+                            chat_id,
+                            wait=False,
                             text=f"❌ <b>Авторизация не удалась</b>\n\n"
                                  f"📱 Сценарий: #{scenario.id}\n"
                                  f"👤 Аккаунт: @{scenario.ig_username}\n\n"
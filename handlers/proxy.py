@@ -2,6 +2,7 @@
 Обработчики для управления прокси серверами
 """
 
+import html
 import logging
 from datetime import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
@@ -12,7 +13,7 @@ from database.models import ProxyServer
 from database.connection import Session
 from services.proxy_manager import ProxyManager
 from utils.validators import is_admin
-from ui.menus import proxy_menu
+from ui.menus import proxy_menu, proxy_browser_menu
 
 logger = logging.getLogger(__name__)
 
@@ -64,25 +65,41 @@ async def start_add_proxy(query, context):
         parse_mode='HTML'
     )
 
-async def list_proxies(query):
-    """Показ списка прокси"""
-    if not is_admin(query.from_user.id):
-        await query.edit_message_text("🚫 У вас нет доступа.")
-        return
+PROXY_PAGE_SIZE = 10
+PROXY_STATUS_FILTERS = [None, 'working', 'failed']
+PROXY_TYPE_FILTERS = [None, 'http', 'https', 'socks5']
+
+def _get_proxy_browser_state(context) -> dict:
+    """Фильтры и позиция списка прокси пользователя"""
+    return context.user_data.setdefault('proxy_browser', {'page': 1})
+
+def _cycle(options: list, current):
+    """Следующее значение фильтра по кругу"""
+    index = options.index(current) if current in options else 0
+    return options[(index + 1) % len(options)]
+
+def render_proxy_page(state: dict, after_id: int = None, before_id: int = None):
+    """Текст и клавиатура одной страницы списка прокси"""
+    page = ProxyManager.get_proxy_page(
+        limit=PROXY_PAGE_SIZE,
+        after_id=after_id,
+        before_id=before_id,
+        status=state.get('status'),
+        proxy_type=state.get('type'),
+        name_prefix=state.get('provider'),
+        search=state.get('search')
+    )
+    proxies = page['items']
     
-    proxies = ProxyManager.get_proxy_list()
+    text = "📋 <b>Список прокси серверов:</b>\n"
+    if state.get('search'):
+        text += f"🔎 Хост содержит: <code>{html.escape(state['search'])}</code>\n"
+    text += "\n"
     
     if not proxies:
-        await query.edit_message_text(
-            "📭 Прокси серверы не настроены.",
-            reply_markup=proxy_menu()
-        )
-        return
+        text += "📭 Прокси не найдены."
     
-    text = "📋 <b>Список прокси серверов:</b>\n\n"
-    keyboard = []
-    
-    for proxy in proxies[:10]:  # Показываем только первые 10
+    for proxy in proxies:
         status_emoji = "🟢" if proxy.is_active and proxy.is_working else "🔴"
         last_check = proxy.last_check.strftime('%d.%m %H:%M') if proxy.last_check else "Никогда"
         
@@ -92,24 +109,83 @@ async def list_proxies(query):
             f"   📊 Использований: {proxy.usage_count}\n"
             f"   🕐 Проверка: {last_check}\n\n"
         )
-        
-        # Кнопки управления прокси
-        row = []
-        row.append(InlineKeyboardButton(f"⚙️ {proxy.name[:10]}", callback_data=f'manage_proxy_{proxy.id}'))
-        row.append(InlineKeyboardButton("🔍", callback_data=f'check_proxy_{proxy.id}'))
-        row.append(InlineKeyboardButton("🗑️", callback_data=f'delete_proxy_{proxy.id}'))
-        keyboard.append(row)
     
-    if len(proxies) > 10:
-        text += f"... и еще {len(proxies) - 10} прокси"
+    keyboard = proxy_browser_menu(
+        proxies,
+        state,
+        state.get('page', 1),
+        prev_cursor=page['first_id'] if page['has_prev'] else None,
+        next_cursor=page['last_id'] if page['has_next'] else None
+    )
+    return text, keyboard
+
+async def list_proxies(query, context):
+    """Показ первой страницы списка прокси"""
+    if not is_admin(query.from_user.id):
+        await query.edit_message_text("🚫 У вас нет доступа.")
+        return
     
-    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data='manage_proxies')])
+    state = _get_proxy_browser_state(context)
+    state['page'] = 1
     
-    await query.edit_message_text(
-        text,
-        parse_mode='HTML',
-        reply_markup=InlineKeyboardMarkup(keyboard)
-    )
+    text, keyboard = render_proxy_page(state)
+    await query.edit_message_text(text, parse_mode='HTML', reply_markup=keyboard)
+
+async def handle_proxy_browser_callback(query, context, data: str):
+    """Навигация и фильтры списка прокси (callback proxies_*)"""
+    if not is_admin(query.from_user.id):
+        await query.edit_message_text("🚫 У вас нет доступа.")
+        return
+    
+    state = _get_proxy_browser_state(context)
+    after_id = before_id = None
+    
+    if data.startswith('proxies_next_'):
+        after_id = int(data.split('_')[2])
+        state['page'] = state.get('page', 1) + 1
+    elif data.startswith('proxies_prev_'):
+        before_id = int(data.split('_')[2])
+        state['page'] = max(1, state.get('page', 1) - 1)
+    elif data == 'proxies_search':
+        context.user_data['awaiting_proxy_search'] = True
+        await query.edit_message_text(
+            "🔎 <b>Поиск прокси</b>\n\n"
+            "Введите часть хоста (IP или домена).\n"
+            "Отправьте <code>-</code>, чтобы сбросить поиск.",
+            parse_mode='HTML'
+        )
+        return
+    else:
+        if data == 'proxies_f_status':
+            state['status'] = _cycle(PROXY_STATUS_FILTERS, state.get('status'))
+        elif data == 'proxies_f_type':
+            state['type'] = _cycle(PROXY_TYPE_FILTERS, state.get('type'))
+        elif data == 'proxies_f_provider':
+            from services.proxy_922 import PROXY_PROVIDERS_CONFIG
+            providers = [None] + [config['name'] for config in PROXY_PROVIDERS_CONFIG.values()]
+            state['provider'] = _cycle(providers, state.get('provider'))
+        elif data == 'proxies_reset':
+            state.clear()
+        state['page'] = 1
+    
+    text, keyboard = render_proxy_page(state, after_id=after_id, before_id=before_id)
+    await query.edit_message_text(text, parse_mode='HTML', reply_markup=keyboard)
+
+async def handle_proxy_search_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Ввод строки поиска по хосту"""
+    context.user_data.pop('awaiting_proxy_search', None)
+    
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("🚫 У вас нет доступа.")
+        return
+    
+    text = update.message.text.strip()
+    state = _get_proxy_browser_state(context)
+    state['search'] = None if text == '-' else text[:100]
+    state['page'] = 1
+    
+    page_text, keyboard = render_proxy_page(state)
+    await update.message.reply_text(page_text, parse_mode='HTML', reply_markup=keyboard)
 
 async def check_all_proxies(query):
     """Проверка всех прокси"""
@@ -119,7 +195,9 @@ async def check_all_proxies(query):
     
     await query.edit_message_text("🔍 Проверяю все прокси серверы...")
     
-    results = ProxyManager.check_all_proxies()
+    # Быстрое рукопожатие отсеивает мертвые прокси, полная HTTP проверка только для остальных
+    from services.proxy_probe import proxy_prober
+    results = await proxy_prober.check_proxies()
     
     if results['working'] == 0 and results['failed'] == 0:
         await query.edit_message_text(
@@ -185,6 +263,17 @@ async def show_proxy_stats(query):
             for i, proxy in enumerate(top_proxies, 1):
                 text += f"{i}. {proxy.name} - {proxy.usage_count} исп.\n"
         
+        # Разные прокси с общим выходным IP нагружают один адрес
+        from services.proxy_exit_ip import ExitIPTracker
+        shared = ExitIPTracker.find_shared_exit_ips()
+        if shared:
+            text += (
+                f"\n<b>🔁 Общие выходные IP:</b> {len(shared)} "
+                f"(прокси: {sum(len(ids) for ids in shared.values())})\n"
+            )
+            for ip, proxy_ids in list(shared.items())[:5]:
+                text += f"• <code>{ip}</code> - {len(proxy_ids)} прокси\n"
+        
         await query.edit_message_text(
             text,
             parse_mode='HTML',
@@ -2,6 +2,7 @@
 Обработчики для массового импорта прокси
 """
 
+import html
 import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
@@ -173,13 +174,16 @@ async def handle_import_input(update: Update, context: ContextTypes.DEFAULT_TYPE
 async def process_922_api_import(update, context):
     """Обработка импорта через API 922Proxy"""
     try:
+        from services.proxy_922 import Proxy922ConfigManager
+        from services.proxy_sync import provider_sync
+        
         api_key = context.user_data.get('api_key')
         
-        # Попытка получить прокси через API
+        # Синхронизация со списком провайдера: новые добавляются, пропавшие отключаются
         manager = Proxy922Manager(api_key=api_key)
-        proxies = manager.get_proxy_list_from_api()
+        result = await provider_sync.sync(manager, force=True)
         
-        if not proxies:
+        if result['status'] not in ('synced', 'unchanged'):
             await update.message.reply_text(
                 "❌ Не удалось получить прокси через API.\n"
                 "Проверьте API ключ или используйте ручной импорт.",
@@ -189,15 +193,16 @@ async def process_922_api_import(update, context):
             )
             return
         
-        # Импорт полученных прокси
-        imported_count = Proxy922Manager.import_proxies_to_database(
-            proxies, 'socks5', '922Proxy API'
-        )
+        # Ключ сохраняется для синхронизации по расписанию
+        Proxy922ConfigManager.save_922_config(api_key=api_key)
         
         await update.message.reply_text(
             f"✅ <b>Импорт завершен!</b>\n\n"
-            f"📊 Получено через API: {len(proxies)}\n"
-            f"📥 Импортировано: {imported_count}\n"
+            f"📊 Получено через API: {result['total']}\n"
+            f"📥 Добавлено: {result['added']}\n"
+            f"🔄 Обновлено: {result['updated']}\n"
+            f"🔗 Привязано ранее импортированных: {result['adopted']}\n"
+            f"⛔ Отключено (нет у провайдера): {result['removed']}\n"
             f"🌐 Провайдер: 922Proxy\n"
             f"📡 Тип: SOCKS5",
             parse_mode='HTML',
@@ -287,6 +292,7 @@ async def bulk_proxy_operations(query):
         [InlineKeyboardButton("🔍 Проверить все прокси", callback_data='check_all_proxies')],
         [InlineKeyboardButton("🔄 Автоматическая ротация", callback_data='auto_rotate_proxies')],
         [InlineKeyboardButton("📊 Пакетная проверка", callback_data='bulk_check_proxies')],
+        [InlineKeyboardButton("📱 Проверить Instagram", callback_data='bulk_check_instagram')],
         [InlineKeyboardButton("🗑️ Очистить неработающие", callback_data='cleanup_failed_proxies')],
         [InlineKeyboardButton("🔙 Назад", callback_data='manage_proxies')]
     ]
@@ -502,6 +508,10 @@ async def export_proxies(query):
         [InlineKeyboardButton("🔗 USER:PASS@IP:PORT", callback_data='export_format_2')],
         [InlineKeyboardButton("🌐 Только рабочие", callback_data='export_working_only')],
         [InlineKeyboardButton("📊 Статистика TXT", callback_data='export_stats')],
+        [
+            InlineKeyboardButton("📄 CSV", callback_data='export_csv'),
+            InlineKeyboardButton("🧾 JSON", callback_data='export_json')
+        ],
         [InlineKeyboardButton("🔙 Назад", callback_data='manage_proxies')]
     ]
     
@@ -512,119 +522,58 @@ async def export_proxies(query):
     )
 
 async def process_proxy_export(query, export_type):
-    """Обработка экспорта прокси"""
+    """Обработка экспорта прокси: файл собирается в фоне и отправляется документом"""
     if not is_admin(query.from_user.id):
         await query.edit_message_text("🚫 У вас нет доступа.")
         return
     
-    from database.models import ProxyServer
-    from database.connection import Session
+    import asyncio
+    import os
+    import tempfile
+    from services.proxy_export import ProxyExporter, EXPORT_TYPES
     
-    session = Session()
+    back_markup = InlineKeyboardMarkup([[
+        InlineKeyboardButton("🔙 Назад", callback_data='export_proxies')
+    ]])
+    
+    if export_type not in EXPORT_TYPES:
+        await query.edit_message_text("❌ Неизвестный формат экспорта.", reply_markup=back_markup)
+        return
+    
+    await query.edit_message_text("📤 Формирую файл экспорта...")
+    
+    fd, temp_filename = tempfile.mkstemp(suffix='.export')
+    os.close(fd)
     try:
-        # Получаем прокси в зависимости от типа экспорта
-        if export_type == 'export_working_only':
-            proxies = session.query(ProxyServer).filter_by(
-                is_active=True, 
-                is_working=True
-            ).all()
-            title = "Рабочие прокси"
-        else:
-            proxies = session.query(ProxyServer).filter_by(is_active=True).all()
-            title = "Все активные прокси"
+        count = await asyncio.to_thread(ProxyExporter.export_to_file, export_type, temp_filename)
         
-        if not proxies:
-            await query.edit_message_text(
-                "📭 Нет прокси для экспорта.",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Назад", callback_data='export_proxies')
-                ]])
-            )
+        if not count:
+            await query.edit_message_text("📭 Нет прокси для экспорта.", reply_markup=back_markup)
             return
         
-        # Формирование текста экспорта
-        export_text = f"# {title}\n# Экспортировано: {len(proxies)} прокси\n# Дата: {datetime.now().strftime('%d.%m.%Y %H:%M')}\n\n"
-        
-        for proxy in proxies:
-            if export_type == 'export_format_1':
-                # IP:PORT:USER:PASS
-                if proxy.username and proxy.password_encrypted:
-                    try:
-                        password = ProxyManager.decrypt_password(proxy.password_encrypted)
-                        line = f"{proxy.host}:{proxy.port}:{proxy.username}:{password}"
-                    except:
-                        line = f"{proxy.host}:{proxy.port}"
-                else:
-                    line = f"{proxy.host}:{proxy.port}"
-            elif export_type == 'export_format_2':
-                # USER:PASS@IP:PORT
-                if proxy.username and proxy.password_encrypted:
-                    try:
-                        password = ProxyManager.decrypt_password(proxy.password_encrypted)
-                        line = f"{proxy.username}:{password}@{proxy.host}:{proxy.port}"
-                    except:
-                        line = f"{proxy.host}:{proxy.port}"
-                else:
-                    line = f"{proxy.host}:{proxy.port}"
-            elif export_type == 'export_stats':
-                # Детальная статистика
-                status = "🟢" if proxy.is_working else "🔴"
-                last_check = proxy.last_check.strftime('%d.%m %H:%M') if proxy.last_check else "Никогда"
-                line = f"{status} {proxy.name} | {proxy.proxy_type}://{proxy.host}:{proxy.port} | Использований: {proxy.usage_count} | Проверка: {last_check}"
-            else:
-                line = f"{proxy.host}:{proxy.port}"
-            
-            export_text += line + "\n"
-        
-        # Отправляем файл, если текст слишком длинный
-        if len(export_text) > 4000:
-            # Создаем временный файл
-            import tempfile
-            import os
-            
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False, encoding='utf-8') as f:
-                f.write(export_text)
-                temp_filename = f.name
-            
-            try:
-                with open(temp_filename, 'rb') as f:
-                    await query.message.reply_document(
-                        document=f,
-                        filename=f"proxies_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
-                        caption=f"📤 Экспорт прокси: {len(proxies)} шт."
-                    )
-                
-                await query.edit_message_text(
-                    f"✅ <b>Экспорт завершен</b>\n\n"
-                    f"📊 Экспортировано: {len(proxies)} прокси\n"
-                    f"📁 Файл отправлен выше",
-                    parse_mode='HTML',
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Назад", callback_data='export_proxies')
-                    ]])
-                )
-                
-            finally:
-                # Удаляем временный файл
-                try:
-                    os.unlink(temp_filename)
-                except:
-                    pass
-        else:
-            # Отправляем как текст
-            await query.edit_message_text(
-                f"📤 <b>Экспорт прокси</b>\n\n<pre>{export_text}</pre>",
-                parse_mode='HTML',
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Назад", callback_data='export_proxies')
-                ]])
+        with open(temp_filename, 'rb') as f:
+            await query.message.reply_document(
+                document=f,
+                filename=ProxyExporter.get_filename(export_type),
+                caption=f"📤 Экспорт прокси: {count} шт."
             )
         
+        await query.edit_message_text(
+            f"✅ <b>Экспорт завершен</b>\n\n"
+            f"📊 Экспортировано: {count} прокси\n"
+            f"📁 Файл отправлен выше",
+            parse_mode='HTML',
+            reply_markup=back_markup
+        )
+        
     except Exception as e:
         logger.error(f"Ошибка экспорта прокси: {e}")
         await query.edit_message_text("❌ Ошибка при экспорте прокси.")
     finally:
-        session.close()
+        try:
+            os.unlink(temp_filename)
+        except OSError:
+            pass
 
 # === ТЕСТИРОВАНИЕ ПРОКСИ ===
 
@@ -647,7 +596,7 @@ async def test_proxy_with_instagram(query, proxy_id):
         
         await query.edit_message_text(
             f"🧪 Тестирую прокси <b>{proxy.name}</b> с Instagram...\n\n"
-            f"<i>Это может занять до 30 секунд</i>",
+            f"<i>Это может занять несколько секунд</i>",
             parse_mode='HTML'
         )
         
@@ -686,44 +635,59 @@ async def test_proxy_with_instagram(query, proxy_id):
     finally:
         session.close()
 
-async def test_proxy_instagram_connection(proxy: ProxyServer) -> bool:
+async def test_proxy_instagram_connection(proxy) -> bool:
     """Тестирование подключения к Instagram через прокси"""
     try:
-        from services.proxy_manager import ProxyManager
-        import requests
-        
-        proxy_dict = ProxyManager.get_proxy_dict(proxy)
-        if not proxy_dict:
-            return False
-        
-        # Тестируем доступность Instagram
-        instagram_urls = [
-            'https://www.instagram.com/',
-            'https://i.instagram.com/api/v1/users/web_info/',
-        ]
-        
-        for url in instagram_urls:
-            try:
-                response = requests.get(
-                    url,
-                    proxies=proxy_dict,
-                    timeout=15,
-                    headers={
-                        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                    }
-                )
-                
-                # Проверяем, что получили ответ от Instagram
-                if response.status_code in [200, 404] and 'instagram' in response.text.lower():
-                    return True
-                    
-            except requests.exceptions.Timeout:
-                continue
-            except Exception:
-                continue
-        
-        return False
-        
+        from services.proxy_probe import ProxyProber
+        from services.instagram_probe import instagram_probe
+
+        result = await instagram_probe.probe(ProxyProber.proxy_to_dict(proxy))
+        if not result['reachable']:
+            logger.info(f"Instagram недоступен через прокси {proxy.name}: {result['error']}")
+        return result['reachable']
+
     except Exception as e:
         logger.error(f"Ошибка тестирования Instagram подключения: {e}")
-        return False
\ No newline at end of file
+        return False
+
+async def bulk_check_instagram(query):
+    """Проверка доступности Instagram через все активные прокси"""
+    if not is_admin(query.from_user.id):
+        await query.edit_message_text("🚫 У вас нет доступа.")
+        return
+
+    await query.edit_message_text("📱 Проверяю доступность Instagram через все прокси...")
+
+    try:
+        from services.instagram_probe import instagram_probe
+        results = await instagram_probe.check_proxies()
+
+        text = (
+            f"📱 <b>Проверка Instagram завершена</b>\n\n"
+            f"📊 Проверено: {results['checked']}\n"
+            f"✅ Доступен: {results['reachable']}\n"
+            f"🚫 Заблокированы Instagram: {results['blocked']}\n"
+            f"❌ Недоступен: {results['failed'] - results['blocked']}\n"
+        )
+
+        failed = [
+            f"❌ {results['proxies'][proxy_id]}: {result['error']}"
+            for proxy_id, result in results['results'].items() if not result['reachable']
+        ]
+        if failed:
+            text += "\n<b>Не прошли:</b>\n" + html.escape("\n".join(failed[:15]))
+            if len(failed) > 15:
+                text += f"\n... и еще {len(failed) - 15} прокси"
+
+        await query.edit_message_text(
+            text,
+            parse_mode='HTML',
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔄 Проверить еще", callback_data='bulk_check_instagram'),
+                InlineKeyboardButton("🔙 Назад", callback_data='bulk_operations')
+            ]])
+        )
+
+    except Exception as e:
+        logger.error(f"Ошибка проверки Instagram через прокси: {e}")
+        await query.edit_message_text("❌ Ошибка при проверке прокси.")
@@ -15,7 +15,8 @@ from services.encryption import EncryptionService
 from utils.validators import (is_user, validate_instagram_credentials, 
                             validate_instagram_post_link, validate_trigger_word, 
                             validate_dm_message)
-from ui.menus import scenarios_menu, proxy_selection_menu, duration_selection_menu
+from database.queries import ScenarioQueries
+from ui.menus import scenarios_menu, proxy_selection_menu, duration_selection_menu, keyset_pagination_row
 from config import MAX_ACTIVE_SCENARIOS, tasks
 
 logger = logging.getLogger(__name__)
@@ -202,81 +203,173 @@ async def start_scenario_creation(query, context, user_id):
     finally:
         session.close()
 
-async def show_user_scenarios(query, user_id):
+SCENARIOS_PAGE_SIZE = 10
+ALL_SCENARIOS_PAGE_SIZE = 30
+
+STATUS_EMOJI = {
+    'running': "🟢",
+    'paused': "⏸️", 
+    'stopped': "🔴"
+}
+
+AUTH_EMOJI = {
+    'success': "✅",
+    'waiting': "⏳",
+    'failed': "❌"
+}
+
+def _parse_page_cursor(data: str):
+    """Курсор из callback вида <base>_next_<id> / <base>_prev_<id>"""
+    if data:
+        parts = data.rsplit('_', 2)
+        if len(parts) == 3 and parts[2].isdigit():
+            if parts[1] == 'next':
+                return int(parts[2]), None
+            if parts[1] == 'prev':
+                return None, int(parts[2])
+    return None, None
+
+async def show_user_scenarios(query, user_id, page_data: str = None):
     """Показ сценариев пользователя с информацией о прокси"""
-    session = Session()
-    try:
-        user = session.query(User).filter_by(telegram_id=user_id).first()
-        if not user or not user.scenarios:
-            await query.edit_message_text(
-                "📭 <b>У вас пока нет сценариев</b>\n\n"
-                "Создайте первый сценарий для автоматизации работы с Instagram!",
-                parse_mode='HTML',
-                reply_markup=scenarios_menu()
-            )
-            return
+    after_id, before_id = _parse_page_cursor(page_data)
+    page = ScenarioQueries.get_scenario_summaries(
+        telegram_id=user_id,
+        limit=SCENARIOS_PAGE_SIZE,
+        after_id=after_id,
+        before_id=before_id
+    )
+    scenarios = page['items']
+    
+    if not scenarios and not page_data:
+        await query.edit_message_text(
+            "📭 <b>У вас пока нет сценариев</b>\n\n"
+            "Создайте первый сценарий для автоматизации работы с Instagram!",
+            parse_mode='HTML',
+            reply_markup=scenarios_menu()
+        )
+        return
 
-        text = "📋 <b>Ваши сценарии:</b>\n\n"
-        keyboard = []
+    text = "📋 <b>Ваши сценарии:</b>\n\n"
+    keyboard = []
+    
+    for scenario in scenarios:
+        status_emoji = STATUS_EMOJI.get(scenario['status'], "❓")
+        auth_emoji = AUTH_EMOJI.get(scenario['auth_status'], "❓")
         
-        for scenario in user.scenarios:
-            # Статус с эмодзи
-            status_emoji = {
-                'running': "🟢",
-                'paused': "⏸️", 
-                'stopped': "🔴"
-            }.get(scenario.status, "❓")
-            
-            # Статус авторизации
-            auth_emoji = {
-                'success': "✅",
-                'waiting': "⏳",
-                'failed': "❌"
-            }.get(scenario.auth_status, "❓")
-            
-            # Информация о прокси
-            proxy_info = "🌐 Прямое соединение"
-            if scenario.proxy_server:
-                proxy_status = "🟢" if scenario.proxy_server.is_working else "🔴"
-                proxy_info = f"🌐 {proxy_status} {scenario.proxy_server.name}"
-            
-            pending_count = session.query(PendingMessage).filter_by(scenario_id=scenario.id).count()
-            
-            # Время до окончания
-            time_left = scenario.active_until - datetime.now()
-            if time_left.total_seconds() > 0:
-                days_left = time_left.days
-                hours_left = time_left.seconds // 3600
-                time_info = f"{days_left}д {hours_left}ч" if days_left > 0 else f"{hours_left}ч"
-            else:
-                time_info = "Истек"
-            
-            text += (
-                f"{status_emoji} <b>Сценарий #{scenario.id}</b>\n"
-                f"   📱 @{scenario.ig_username} {auth_emoji}\n"
-                f"   {proxy_info}\n"
-                f"   🎯 Триггер: <code>{scenario.trigger_word}</code>\n"
-                f"   📊 Обработано: {scenario.comments_processed} комм.\n"
-                f"   📩 В очереди: {pending_count} сообщений\n"
-                f"   ⏰ Активен: {time_info}\n\n"
-            )
-            
-            keyboard.append([
-                InlineKeyboardButton(
-                    f"⚙️ Управление #{scenario.id}", 
-                    callback_data=f'manage_{scenario.id}'
-                )
-            ])
+        # Информация о прокси
+        proxy_info = "🌐 Прямое соединение"
+        if scenario['proxy_id']:
+            proxy_status = "🟢" if scenario['proxy_is_working'] else "🔴"
+            proxy_info = f"🌐 {proxy_status} {scenario['proxy_name']}"
         
-        keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data='scenarios_menu')])
+        # Время до окончания
+        time_left = scenario['active_until'] - datetime.now()
+        if time_left.total_seconds() > 0:
+            days_left = time_left.days
+            hours_left = time_left.seconds // 3600
+            time_info = f"{days_left}д {hours_left}ч" if days_left > 0 else f"{hours_left}ч"
+        else:
+            time_info = "Истек"
         
-        await query.edit_message_text(
-            text,
-            parse_mode='HTML',
-            reply_markup=InlineKeyboardMarkup(keyboard)
+        text += (
+            f"{status_emoji} <b>Сценарий #{scenario['id']}</b>\n"
+            f"   📱 @{scenario['ig_username']} {auth_emoji}\n"
+            f"   {proxy_info}\n"
+            f"   🎯 Триггер: <code>{scenario['trigger_word']}</code>\n"
+            f"   📊 Обработано: {scenario['comments_processed']} комм.\n"
+            f"   📩 В очереди: {scenario['pending_count']} сообщений\n"
+            f"   ⏰ Активен: {time_info}\n\n"
         )
-    finally:
-        session.close()
+        
+        keyboard.append([
+            InlineKeyboardButton(
+                f"⚙️ Управление #{scenario['id']}", 
+                callback_data=f"manage_{scenario['id']}"
+            )
+        ])
+    
+    nav_row = keyset_pagination_row(
+        None, 'my_scenarios',
+        prev_cursor=page['first_id'] if page['has_prev'] else None,
+        next_cursor=page['last_id'] if page['has_next'] else None
+    )
+    if nav_row:
+        keyboard.append(nav_row)
+    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data='scenarios_menu')])
+    
+    await query.edit_message_text(
+        text,
+        parse_mode='HTML',
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+async def show_all_scenarios(query, page_data: str = None):
+    """Список всех сценариев для администратора"""
+    after_id, before_id = _parse_page_cursor(page_data)
+    page = ScenarioQueries.get_scenario_summaries(
+        limit=ALL_SCENARIOS_PAGE_SIZE,
+        after_id=after_id,
+        before_id=before_id
+    )
+    scenarios = page['items']
+    
+    text = "📋 <b>Все сценарии:</b>\n\n"
+    if not scenarios:
+        text += "📭 Сценариев нет."
+    
+    for scenario in scenarios:
+        status_emoji = STATUS_EMOJI.get(scenario['status'], "❓")
+        auth_emoji = AUTH_EMOJI.get(scenario['auth_status'], "❓")
+        proxy_info = scenario['proxy_name'] or "без прокси"
+        
+        text += (
+            f"{status_emoji} #{scenario['id']} @{scenario['ig_username']} {auth_emoji} "
+            f"| 👤 {scenario['owner_telegram_id']} | 🌐 {proxy_info} | 📩 {scenario['pending_count']}\n"
+        )
+    
+    keyboard = []
+    nav_row = keyset_pagination_row(
+        None, 'all_scenarios',
+        prev_cursor=page['first_id'] if page['has_prev'] else None,
+        next_cursor=page['last_id'] if page['has_next'] else None
+    )
+    if nav_row:
+        keyboard.append(nav_row)
+    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data='admin_panel')])
+    
+    await query.edit_message_text(
+        text,
+        parse_mode='HTML',
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+async def show_scenarios_status(query):
+    """Статистика сценариев для администратора"""
+    overview = ScenarioQueries.get_status_overview()
+    by_status = overview.get('by_status', {})
+    by_auth = overview.get('by_auth_status', {})
+    
+    text = (
+        f"📊 <b>Статистика сценариев</b>\n\n"
+        f"📋 Всего: {overview.get('total', 0)}\n"
+        f"🟢 Активных: {by_status.get('running', 0)}\n"
+        f"⏸️ На паузе: {by_status.get('paused', 0)}\n"
+        f"🔴 Остановлено: {by_status.get('stopped', 0)}\n\n"
+        f"<b>🔐 Авторизация:</b>\n"
+        f"✅ Успешно: {by_auth.get('success', 0)}\n"
+        f"⏳ Ожидание: {by_auth.get('waiting', 0)}\n"
+        f"❌ Ошибки: {by_auth.get('failed', 0)}\n\n"
+        f"👥 Пользователей со сценариями: {overview.get('users', 0)}\n"
+        f"🌐 Используется прокси: {overview.get('proxies_in_use', 0)}\n"
+        f"💬 Обработано комментариев: {overview.get('comments_processed', 0)}\n"
+        f"📩 Сообщений в очереди: {overview.get('pending_messages', 0)}"
+    )
+    
+    await query.edit_message_text(
+        text,
+        parse_mode='HTML',
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data='admin_panel')]])
+    )
 
 async def handle_duration_selection(query, context, duration):
     """Обработчик выбора срока активности"""
@@ -8,42 +8,25 @@ from telegram.ext import ContextTypes
 
 from database.models import Scenario, RequestLog, ProxyServer
 from database.connection import Session
-from services.instagram import cleanup_inactive_scenarios
 from services.proxy_922 import Proxy922Manager
 
 logger = logging.getLogger(__name__)
 
 async def check_scheduled_tasks(context: ContextTypes.DEFAULT_TYPE):
-    """Проверка запланированных задач"""
-    session = Session()
+    """Запуск планировщика запланированных проверок сценариев"""
     try:
-        now = datetime.now()
-        scheduled_scenarios = session.query(Scenario).filter(
-            Scenario.next_check_time <= now,
-            Scenario.status == 'running',
-            Scenario.auth_status == 'success'
-        ).all()
-        
-        for scenario in scheduled_scenarios:
-            try:
-                bot = context.bot
-                user = scenario.user
-                
-                from services.instagram import auto_check_comments
-                await auto_check_comments(scenario.id, bot, user.telegram_id)
-                
-                # Сброс времени следующей проверки
-                scenario.next_check_time = None
-                session.merge(scenario)
-                session.commit()
-                
-            except Exception as e:
-                logger.error(f"Ошибка выполнения запланированной задачи для сценария {scenario.id}: {e}")
-                
+        from services.check_scheduler import check_scheduler
+        check_scheduler.start(context.bot)
     except Exception as e:
-        logger.error(f"Ошибка в фоновой задаче check_scheduled_tasks: {e}")
-    finally:
-        session.close()
+        logger.error(f"Ошибка запуска планировщика проверок: {e}")
+
+async def restore_running_scenarios(context: ContextTypes.DEFAULT_TYPE):
+    """Восстановление сценариев, которые были запущены до перезапуска бота"""
+    try:
+        from services.recovery import recovery_orchestrator
+        recovery_orchestrator.start(context.bot)
+    except Exception as e:
+        logger.error(f"Ошибка запуска восстановления сценариев: {e}")
 
 async def cleanup_old_data(context: ContextTypes.DEFAULT_TYPE):
     """Очистка старых данных"""
@@ -56,6 +39,7 @@ async def cleanup_old_data(context: ContextTypes.DEFAULT_TYPE):
         old_logs.delete()
         
         # Очистка неактивных сценариев
+        from services.instagram import cleanup_inactive_scenarios
         cleaned_scenarios = cleanup_inactive_scenarios()
         
         session.commit()
@@ -72,8 +56,9 @@ async def cleanup_old_data(context: ContextTypes.DEFAULT_TYPE):
 async def check_proxy_health_scheduled(context: ContextTypes.DEFAULT_TYPE):
     """Планируемая проверка работоспособности прокси"""
     try:
-        # Пакетная проверка случайных прокси
-        results = Proxy922Manager.bulk_check_proxies(batch_size=5)
+        # Двухэтапная проверка всех прокси, не проверявшихся больше часа
+        from services.proxy_probe import proxy_prober
+        results = await proxy_prober.check_proxies(stale_before=datetime.now() - timedelta(hours=1))
         
         if results['checked'] > 0:
             logger.info(f"Автоматическая проверка прокси: {results['working']} работают, {results['failed']} не работают")
@@ -89,8 +74,7 @@ async def check_proxy_health_scheduled(context: ContextTypes.DEFAULT_TYPE):
 async def send_daily_reports(context: ContextTypes.DEFAULT_TYPE):
     """Отправка ежедневных отчетов администраторам"""
     try:
-        from database.models import Admin, User
-        from config import ADMIN_TELEGRAM_ID
+        from database.models import User
         
         session = Session()
         
@@ -129,22 +113,12 @@ async def send_daily_reports(context: ContextTypes.DEFAULT_TYPE):
             f"• Работающих: {working_proxies}/{total_proxies}\n"
         )
         
-        # Отправка отчета всем админам
-        admins = session.query(Admin).all()
-        bot = context.bot
-        
-        for admin in admins:
-            try:
-                await bot.send_message(
-                    chat_id=admin.telegram_id,
-                    text=report_text,
-                    parse_mode='HTML'
-                )
-            except Exception as e:
-                logger.error(f"Ошибка отправки отчета админу {admin.telegram_id}: {e}")
-        
         session.close()
         
+        # Отправка отчета всем админам
+        from services.broadcast import admin_broadcast
+        await admin_broadcast.broadcast(context.bot, report_text)
+        
     except Exception as e:
         logger.error(f"Ошибка отправки ежедневных отчетов: {e}")
 
@@ -160,10 +134,6 @@ async def monitor_scenarios_health(context: ContextTypes.DEFAULT_TYPE):
         ).all()
         
         if failed_scenarios:
-            from database.models import Admin
-            admins = session.query(Admin).all()
-            bot = context.bot
-            
             alert_text = (
                 f"⚠️ <b>Проблемы со сценариями</b>\n\n"
                 f"Найдено {len(failed_scenarios)} сценариев с ошибками авторизации:\n\n"
@@ -177,15 +147,8 @@ async def monitor_scenarios_health(context: ContextTypes.DEFAULT_TYPE):
             
             alert_text += "\n🔧 Требуется внимание администратора"
             
-            for admin in admins:
-                try:
-                    await bot.send_message(
-                        chat_id=admin.telegram_id,
-                        text=alert_text,
-                        parse_mode='HTML'
-                    )
-                except Exception as e:
-                    logger.error(f"Ошибка отправки уведомления админу {admin.telegram_id}: {e}")
+            from services.broadcast import admin_broadcast
+            await admin_broadcast.alert(context.bot, alert_text)
         
         session.close()
         
@@ -195,76 +158,43 @@ async def monitor_scenarios_health(context: ContextTypes.DEFAULT_TYPE):
 async def optimize_proxy_usage(context: ContextTypes.DEFAULT_TYPE):
     """Оптимизация использования прокси"""
     try:
-        session = Session()
-        
-        # Балансировка нагрузки на прокси
-        scenarios_with_proxy = session.query(Scenario).filter(
-            Scenario.proxy_id.isnot(None),
-            Scenario.status == 'running'
-        ).all()
-        
-        # Группируем по прокси и считаем нагрузку
-        proxy_usage = {}
-        for scenario in scenarios_with_proxy:
-            proxy_id = scenario.proxy_id
-            if proxy_id not in proxy_usage:
-                proxy_usage[proxy_id] = []
-            proxy_usage[proxy_id].append(scenario)
-        
-        # Находим перегруженные прокси (более 3 сценариев на один прокси)
-        overloaded_proxies = {pid: scenarios for pid, scenarios in proxy_usage.items() if len(scenarios) > 3}
+        from services.proxy_rebalancer import proxy_rebalancer
         
-        if overloaded_proxies:
-            logger.info(f"Найдено {len(overloaded_proxies)} перегруженных прокси")
-            
-            # Здесь можно добавить логику перебалансировки
-            # Например, переназначение части сценариев на менее загруженные прокси
+        # Расчет плана в потоке, перенос - в event loop между проверками
+        result = await proxy_rebalancer.rebalance()
+        if not result.get('planned'):
+            return
         
-        session.close()
+        logger.info(
+            f"Перебалансировка прокси: перегружено {result.get('overloaded_before', 0)}, "
+            f"перенесено аккаунтов {result.get('migrated', 0)} из {result.get('planned', 0)}"
+        )
         
     except Exception as e:
         logger.error(f"Ошибка оптимизации использования прокси: {e}")
 
-async def backup_database(context: ContextTypes.DEFAULT_TYPE):
-    """Создание резервной копии базы данных"""
+async def sync_proxy_providers(context: ContextTypes.DEFAULT_TYPE):
+    """Синхронизация прокси со списком 922Proxy"""
     try:
-        import shutil
-        import os
-        from config import DATABASE_PATH
-        
-        # Извлекаем путь к файлу БД из DATABASE_PATH
-        if 'sqlite:///' in DATABASE_PATH:
-            db_file_path = DATABASE_PATH.replace('sqlite:///', '')
-        else:
-            logger.warning("Резервное копирование поддерживается только для SQLite")
-            return
+        from services.proxy_922 import Proxy922ConfigManager
+        from services.proxy_sync import provider_sync
         
-        if not os.path.exists(db_file_path):
-            logger.warning(f"Файл базы данных не найден: {db_file_path}")
+        config_data = Proxy922ConfigManager.load_922_config()
+        if not config_data.get('api_key'):
             return
         
-        # Создаем папку для бэкапов
-        backup_dir = os.path.join(os.path.dirname(db_file_path), 'backups')
-        os.makedirs(backup_dir, exist_ok=True)
-        
-        # Создаем имя файла бэкапа с датой
-        backup_filename = f"bot_database_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
-        backup_path = os.path.join(backup_dir, backup_filename)
-        
-        # Копируем файл
-        shutil.copy2(db_file_path, backup_path)
-        
-        # Удаляем старые бэкапы (оставляем только последние 7)
-        backup_files = [f for f in os.listdir(backup_dir) if f.startswith('bot_database_backup_')]
-        backup_files.sort(reverse=True)
+        await provider_sync.sync(Proxy922Manager(api_key=config_data['api_key']))
         
-        for old_backup in backup_files[7:]:  # Удаляем все кроме последних 7
-            try:
-                os.remove(os.path.join(backup_dir, old_backup))
-            except:
-                pass
-        
-        logger.info(f"Создана резервная копия базы данных: {backup_filename}")
+    except Exception as e:
+        logger.error(f"Ошибка синхронизации прокси провайдера: {e}")
+
+async def backup_database(context: ContextTypes.DEFAULT_TYPE):
+    """Создание резервной копии базы данных"""
+    try:
+        from services.backup import BackupService
+
+        # Копия снимается через SQLite backup API в отдельном потоке
+        await BackupService.create_backup()
         
     except Exception as e:
         logger.error(f"Ошибка создания резервной копии: {e}")
@@ -283,10 +213,6 @@ async def send_low_proxy_alert(context: ContextTypes.DEFAULT_TYPE):
         
         # Если рабочих прокси меньше 3, отправляем уведомление
         if working_proxies_count < 3:
-            from database.models import Admin
-            admins = session.query(Admin).all()
-            bot = context.bot
-            
             alert_text = (
                 f"⚠️ <b>Критически мало рабочих прокси!</b>\n\n"
                 f"🌐 Рабочих прокси: {working_proxies_count}\n"
@@ -294,15 +220,8 @@ async def send_low_proxy_alert(context: ContextTypes.DEFAULT_TYPE):
                 f"📥 Добавьте новые прокси или проверьте существующие"
             )
             
-            for admin in admins:
-                try:
-                    await bot.send_message(
-                        chat_id=admin.telegram_id,
-                        text=alert_text,
-                        parse_mode='HTML'
-                    )
-                except Exception as e:
-                    logger.error(f"Ошибка отправки уведомления о прокси админу {admin.telegram_id}: {e}")
+            from services.broadcast import admin_broadcast
+            await admin_broadcast.alert(context.bot, alert_text)
         
         session.close()
         
@@ -318,11 +237,10 @@ class TaskScheduler:
     def setup_scheduled_jobs(job_queue):
         """Настройка всех запланированных задач"""
         
-        # Проверка запланированных задач сценариев - каждую минуту
-        job_queue.run_repeating(
+        # Планировщик проверок сценариев - запускается один раз, дальше работает по next_check_time
+        job_queue.run_once(
             check_scheduled_tasks, 
-            interval=60, 
-            first=0,
+            when=0,
             name="check_scheduled_tasks"
         )
         
@@ -396,6 +314,9 @@ def get_scheduler_status() -> dict:
         
         active_scenarios = session.query(Scenario).filter_by(status='running').count()
         
+        from services.check_scheduler import check_scheduler
+        queue_status = check_scheduler.get_status()
+        
         # Статистика за последний час
         hour_ago = datetime.now() - timedelta(hours=1)
         recent_requests = session.query(RequestLog).filter(
@@ -407,6 +328,8 @@ def get_scheduler_status() -> dict:
         return {
             'pending_checks': pending_checks,
             'active_scenarios': active_scenarios,
+            'queued_checks': queue_status['queued'],
+            'running_checks': queue_status['running'],
             'recent_requests': recent_requests,
             'last_update': datetime.now().strftime('%d.%m.%Y %H:%M:%S')
         }
@@ -0,0 +1,93 @@
+"""
+Адаптивный интервал проверки комментариев
+Горячие посты опрашиваются чаще, холодные - реже, в пределах бюджета запросов аккаунта
+"""
+
+import logging
+import math
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from config import (
+    MAX_REQUESTS_PER_HOUR, POLL_MIN_INTERVAL, POLL_MAX_INTERVAL, POLL_DEFAULT_INTERVAL,
+    POLL_EWMA_WINDOW, POLL_TARGET_COMMENTS, POLL_BUDGET_SHARE, POLL_REQUESTS_PER_CHECK
+)
+
+logger = logging.getLogger(__name__)
+
+class PostVelocity:
+    """Скорость появления комментариев под постом"""
+
+    def __init__(self):
+        self.rate = 0.0         # Комментариев в секунду (EWMA)
+        self.last_check = 0.0   # Время последней проверки (timestamp)
+        self.checks = 0
+
+class AdaptivePollingController:
+    """Контроллер интервала опроса на основе EWMA скорости комментариев"""
+
+    def __init__(self):
+        self._posts: Dict[int, PostVelocity] = {}
+
+    def record_check(self, scenario_id: int, new_comments: int, checked_at: Optional[float] = None):
+        """Учет результата проверки: сколько новых комментариев появилось с прошлого раза"""
+        now = checked_at or time.time()
+        state = self._posts.setdefault(scenario_id, PostVelocity())
+
+        if state.last_check:
+            elapsed = max(now - state.last_check, 1.0)
+            instant_rate = max(new_comments, 0) / elapsed
+            # Вес нового наблюдения зависит от прошедшего времени, а не от числа проверок
+            weight = 1 - math.exp(-elapsed / POLL_EWMA_WINDOW)
+            state.rate += weight * (instant_rate - state.rate)
+
+        state.last_check = now
+        state.checks += 1
+
+    def forget(self, scenario_id: int):
+        """Удаление статистики сценария"""
+        self._posts.pop(scenario_id, None)
+
+    def get_rate_per_hour(self, scenario_id: int) -> float:
+        """Текущая оценка комментариев в час"""
+        state = self._posts.get(scenario_id)
+        return state.rate * 3600 if state else 0.0
+
+    @staticmethod
+    def budget_interval(account_scenarios: int = 1) -> float:
+        """Минимальный интервал, при котором аккаунт укладывается в MAX_REQUESTS_PER_HOUR"""
+        polls_per_hour = MAX_REQUESTS_PER_HOUR * POLL_BUDGET_SHARE / (
+            POLL_REQUESTS_PER_CHECK * max(account_scenarios, 1)
+        )
+        if polls_per_hour <= 0:
+            return POLL_MAX_INTERVAL
+        return 3600 / polls_per_hour
+
+    def next_interval(self, scenario_id: int, account_scenarios: int = 1) -> float:
+        """Интервал до следующей проверки в секундах"""
+        state = self._posts.get(scenario_id)
+
+        if not state or state.checks < 2:
+            interval = POLL_DEFAULT_INTERVAL
+        elif state.rate > 0:
+            # Время, за которое ожидается POLL_TARGET_COMMENTS новых комментариев
+            interval = POLL_TARGET_COMMENTS / state.rate
+        else:
+            interval = POLL_MAX_INTERVAL
+
+        interval = min(max(interval, POLL_MIN_INTERVAL), POLL_MAX_INTERVAL)
+        return max(interval, self.budget_interval(account_scenarios))
+
+    def next_check_time(self, scenario_id: int, account_scenarios: int = 1) -> datetime:
+        """Время следующей проверки"""
+        interval = self.next_interval(scenario_id, account_scenarios)
+        logger.debug(
+            f"Сценарий {scenario_id}: {self.get_rate_per_hour(scenario_id):.1f} комм./час, "
+            f"следующая проверка через {interval:.0f} сек"
+        )
+        return datetime.now() + timedelta(seconds=interval)
+
+
+# Глобальный экземпляр контроллера
+adaptive_poller = AdaptivePollingController()
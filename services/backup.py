@@ -0,0 +1,293 @@
+"""
+Резервное копирование SQLite через online backup API
+Копия снимается постранично в отдельном потоке и не блокирует обработку сообщений
+"""
+
+import asyncio
+import gzip
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from config import (
+    DATABASE_PATH, BACKUP_DIR, BACKUP_COMPRESSION, BACKUP_RETENTION, BACKUP_PAGES_PER_STEP
+)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+BACKUP_PREFIX = 'bot_database_backup_'
+COMPRESSION_EXTENSIONS = {
+    'none': '.db',
+    'gzip': '.db.gz',
+    'zstd': '.db.zst'
+}
+
+class BackupService:
+    """Сервис резервного копирования базы данных"""
+
+    @staticmethod
+    def get_db_file_path() -> Optional[str]:
+        """Путь к файлу SQLite из DATABASE_PATH"""
+        if 'sqlite:///' not in DATABASE_PATH:
+            return None
+        return DATABASE_PATH.replace('sqlite:///', '')
+
+    @staticmethod
+    def get_backup_dir() -> Optional[str]:
+        """Папка для резервных копий"""
+        if BACKUP_DIR:
+            return BACKUP_DIR
+        db_file_path = BackupService.get_db_file_path()
+        if not db_file_path:
+            return None
+        return os.path.join(os.path.dirname(db_file_path), 'backups')
+
+    @staticmethod
+    def _resolve_compression(compression: str) -> str:
+        """Проверка доступности выбранного сжатия"""
+        if compression not in COMPRESSION_EXTENSIONS:
+            logger.warning(f"Неизвестный тип сжатия '{compression}', используется gzip")
+            return 'gzip'
+        if compression == 'zstd' and zstandard is None:
+            logger.warning("Модуль zstandard не установлен, используется gzip")
+            return 'gzip'
+        return compression
+
+    @staticmethod
+    def _file_sha256(path: str) -> str:
+        """Контрольная сумма файла"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _snapshot(db_file_path: str, target_path: str):
+        """Постраничная копия живой БД через sqlite3 backup API"""
+        source = sqlite3.connect(f"file:{db_file_path}?mode=ro", uri=True)
+        target = sqlite3.connect(target_path)
+        try:
+            source.backup(target, pages=BACKUP_PAGES_PER_STEP)
+            result = target.execute("PRAGMA quick_check").fetchone()
+            if not result or result[0] != 'ok':
+                raise RuntimeError(f"Резервная копия не прошла проверку целостности: {result}")
+        finally:
+            target.close()
+            source.close()
+
+    @staticmethod
+    def _compress(source_path: str, target_path: str, compression: str):
+        """Сжатие снимка"""
+        with open(source_path, 'rb') as src:
+            if compression == 'gzip':
+                with gzip.open(target_path, 'wb', compresslevel=6) as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+            elif compression == 'zstd':
+                with open(target_path, 'wb') as dst:
+                    zstandard.ZstdCompressor(level=3).copy_stream(src, dst)
+            else:
+                with open(target_path, 'wb') as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+
+    @staticmethod
+    def _decompress(source_path: str, target_path: str):
+        """Распаковка копии по расширению файла"""
+        with open(target_path, 'wb') as dst:
+            if source_path.endswith('.gz'):
+                with gzip.open(source_path, 'rb') as src:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+            elif source_path.endswith('.zst'):
+                if zstandard is None:
+                    raise RuntimeError("Для восстановления .zst копии нужен модуль zstandard")
+                with open(source_path, 'rb') as src:
+                    zstandard.ZstdDecompressor().copy_stream(src, dst)
+            else:
+                with open(source_path, 'rb') as src:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+
+    @staticmethod
+    def _reserve_backup_path(backup_dir: str, compression: str):
+        """Уникальное имя копии, занятое через O_EXCL
+
+        Копия по команде сразу после плановой или страховочная копия при /restore
+        не должны перезаписать друг друга в одну и ту же секунду.
+        """
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        extension = COMPRESSION_EXTENSIONS[compression]
+        for attempt in range(100):
+            suffix = f"_{attempt}" if attempt else ''
+            backup_filename = f"{BACKUP_PREFIX}{stamp}{suffix}{extension}"
+            backup_path = os.path.join(backup_dir, backup_filename)
+            try:
+                os.close(os.open(backup_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600))
+                return backup_filename, backup_path
+            except FileExistsError:
+                continue
+        raise RuntimeError(f"Не удалось подобрать имя для резервной копии {stamp}")
+
+    @staticmethod
+    def create_backup_sync(compression: str = BACKUP_COMPRESSION) -> Optional[Dict]:
+        """Создание резервной копии (блокирующая версия)"""
+        db_file_path = BackupService.get_db_file_path()
+        if not db_file_path:
+            logger.warning("Резервное копирование поддерживается только для SQLite")
+            return None
+
+        if not os.path.exists(db_file_path):
+            logger.warning(f"Файл базы данных не найден: {db_file_path}")
+            return None
+
+        backup_dir = BackupService.get_backup_dir()
+        os.makedirs(backup_dir, exist_ok=True)
+
+        compression = BackupService._resolve_compression(compression)
+        backup_filename, backup_path = BackupService._reserve_backup_path(backup_dir, compression)
+
+        fd, snapshot_path = tempfile.mkstemp(suffix='.db', dir=backup_dir)
+        os.close(fd)
+        try:
+            BackupService._snapshot(db_file_path, snapshot_path)
+            BackupService._compress(snapshot_path, backup_path, compression)
+        except Exception:
+            # Занятое имя без копии не должно попасть в список копий
+            try:
+                os.remove(backup_path)
+            except OSError:
+                pass
+            raise
+        finally:
+            try:
+                os.remove(snapshot_path)
+            except OSError:
+                pass
+
+        checksum = BackupService._file_sha256(backup_path)
+        with open(backup_path + '.sha256', 'w') as f:
+            f.write(f"{checksum}  {backup_filename}\n")
+
+        removed = BackupService.apply_retention()
+
+        logger.info(f"Создана резервная копия базы данных: {backup_filename} (удалено старых: {removed})")
+        return {
+            'filename': backup_filename,
+            'path': backup_path,
+            'size': os.path.getsize(backup_path),
+            'sha256': checksum
+        }
+
+    @staticmethod
+    async def create_backup(compression: str = BACKUP_COMPRESSION) -> Optional[Dict]:
+        """Создание резервной копии без блокировки event loop"""
+        return await asyncio.to_thread(BackupService.create_backup_sync, compression)
+
+    @staticmethod
+    def list_backups() -> List[Dict]:
+        """Список резервных копий, новые первыми"""
+        backup_dir = BackupService.get_backup_dir()
+        if not backup_dir or not os.path.isdir(backup_dir):
+            return []
+
+        backups = []
+        for filename in os.listdir(backup_dir):
+            if not filename.startswith(BACKUP_PREFIX) or filename.endswith('.sha256'):
+                continue
+            path = os.path.join(backup_dir, filename)
+            backups.append({
+                'filename': filename,
+                'path': path,
+                'size': os.path.getsize(path),
+                'created_at': datetime.fromtimestamp(os.path.getmtime(path))
+            })
+
+        backups.sort(key=lambda b: b['filename'], reverse=True)
+        return backups
+
+    @staticmethod
+    def apply_retention(keep: int = BACKUP_RETENTION) -> int:
+        """Удаление копий сверх лимита хранения"""
+        removed = 0
+        for backup in BackupService.list_backups()[keep:]:
+            for path in (backup['path'], backup['path'] + '.sha256'):
+                try:
+                    if os.path.exists(path):
+                        os.remove(path)
+                except OSError as e:
+                    logger.error(f"Не удалось удалить старую копию {path}: {e}")
+            removed += 1
+        return removed
+
+    @staticmethod
+    def verify_backup(backup_path: str) -> bool:
+        """Сверка контрольной суммы копии"""
+        checksum_path = backup_path + '.sha256'
+        if not os.path.exists(checksum_path):
+            logger.warning(f"Нет файла контрольной суммы для {backup_path}")
+            return False
+
+        with open(checksum_path, 'r') as f:
+            expected = f.read().split()[0]
+
+        return BackupService._file_sha256(backup_path) == expected
+
+    @staticmethod
+    def restore_backup_sync(backup_filename: str) -> bool:
+        """Восстановление БД из копии (блокирующая версия)"""
+        db_file_path = BackupService.get_db_file_path()
+        backup_dir = BackupService.get_backup_dir()
+        if not db_file_path or not backup_dir:
+            logger.warning("Восстановление поддерживается только для SQLite")
+            return False
+
+        backup_path = os.path.join(backup_dir, os.path.basename(backup_filename))
+        if not os.path.exists(backup_path):
+            logger.warning(f"Резервная копия не найдена: {backup_filename}")
+            return False
+
+        if not BackupService.verify_backup(backup_path):
+            logger.error(f"Контрольная сумма не совпадает: {backup_filename}")
+            return False
+
+        fd, restored_path = tempfile.mkstemp(suffix='.db', dir=backup_dir)
+        os.close(fd)
+        try:
+            BackupService._decompress(backup_path, restored_path)
+
+            # Страховочная копия текущего состояния (ротация может удалить исходную копию,
+            # поэтому она снимается уже после распаковки)
+            BackupService.create_backup_sync()
+
+            source = sqlite3.connect(restored_path)
+            target = sqlite3.connect(db_file_path)
+            try:
+                source.backup(target, pages=BACKUP_PAGES_PER_STEP)
+            finally:
+                target.close()
+                source.close()
+        finally:
+            try:
+                os.remove(restored_path)
+            except OSError:
+                pass
+
+        # Сбрасываем пул соединений, чтобы не использовать закэшированные страницы
+        from database.connection import engine
+        engine.dispose()
+
+        logger.info(f"База данных восстановлена из копии {backup_filename}")
+        return True
+
+    @staticmethod
+    async def restore_backup(backup_filename: str) -> bool:
+        """Восстановление БД из копии без блокировки event loop"""
+        return await asyncio.to_thread(BackupService.restore_backup_sync, backup_filename)
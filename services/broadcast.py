@@ -0,0 +1,189 @@
+"""
+Рассылка уведомлений администраторам
+Параллельная отправка через очередь Telegram, подавление повторов и сводки
+"""
+
+import asyncio
+import hashlib
+import logging
+import re
+import time
+from typing import Dict, List, Optional
+
+from database.models import Admin
+from database.connection import Session
+from services.telegram_queue import telegram_outbox
+from config import BROADCAST_DEDUPE_WINDOW, BROADCAST_DIGEST_DELAY
+
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_LENGTH = 4096
+DIGEST_SEPARATOR = "\n\n➖➖➖➖➖\n\n"
+TRUNCATION_MARK = "\n…"
+_HTML_TAG = re.compile(r'<(/?)([a-zA-Z-]+)[^>]*>')
+
+def truncate_html(text: str, limit: int) -> str:
+    """Обрезка HTML-сообщения без порчи разметки
+
+    Режется по последнему переводу строки до лимита, недописанный тег или
+    сущность отбрасываются, открытые теги закрываются. Иначе Telegram
+    отклонит сообщение целиком с "can't parse entities".
+    """
+    if len(text) <= limit:
+        return text
+
+    budget = limit - len(TRUNCATION_MARK)
+    while budget > 0:
+        cut = text[:budget]
+        newline = cut.rfind('\n')
+        if newline > budget // 2:
+            cut = cut[:newline]
+        # Тег или сущность, разрезанные посередине
+        if cut.rfind('<') > cut.rfind('>'):
+            cut = cut[:cut.rfind('<')]
+        if cut.rfind('&') > cut.rfind(';'):
+            cut = cut[:cut.rfind('&')]
+
+        open_tags = []
+        for match in _HTML_TAG.finditer(cut):
+            closing, name = match.group(1), match.group(2).lower()
+            if not closing:
+                open_tags.append(name)
+            elif name in open_tags:
+                del open_tags[len(open_tags) - 1 - open_tags[::-1].index(name)]
+
+        result = cut.rstrip() + ''.join(f"</{name}>" for name in reversed(open_tags)) + TRUNCATION_MARK
+        if len(result) <= limit:
+            return result
+        budget -= len(result) - limit
+    return text[:limit]
+
+class AdminBroadcaster:
+    """Рассылка администраторам
+
+    broadcast() отправляет сразу всем получателям параллельно, лимиты
+    Telegram соблюдает telegram_outbox. alert() копит уведомления
+    BROADCAST_DIGEST_DELAY секунд и отправляет их одной сводкой.
+    Одинаковые уведомления в пределах BROADCAST_DEDUPE_WINDOW не повторяются.
+    """
+
+    def __init__(self, dedupe_window: float = BROADCAST_DEDUPE_WINDOW,
+                 digest_delay: float = BROADCAST_DIGEST_DELAY):
+        self.dedupe_window = dedupe_window
+        self.digest_delay = digest_delay
+
+        self._recent: Dict[str, float] = {}
+        self._digest: List[str] = []
+        self._digest_bot = None
+        self._digest_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def get_admin_ids() -> List[int]:
+        """Telegram ID всех администраторов"""
+        session = Session()
+        try:
+            return [telegram_id for (telegram_id,) in session.query(Admin.telegram_id).all()]
+        except Exception as e:
+            logger.error(f"Ошибка получения списка администраторов: {e}")
+            return []
+        finally:
+            session.close()
+
+    def _is_duplicate(self, text: str, dedupe_key: Optional[str]) -> bool:
+        now = time.monotonic()
+        # Удаляем устаревшие ключи, чтобы словарь не рос бесконечно
+        for key, sent_at in list(self._recent.items()):
+            if now - sent_at > self.dedupe_window:
+                del self._recent[key]
+
+        key = dedupe_key or hashlib.sha1(text.encode('utf-8')).hexdigest()
+        if key in self._recent:
+            return True
+        self._recent[key] = now
+        return False
+
+    async def broadcast(self, bot, text: str, recipients: Optional[List[int]] = None,
+                        parse_mode: str = 'HTML', dedupe_key: Optional[str] = None) -> Dict[str, int]:
+        """Немедленная рассылка сообщения всем получателям"""
+        if self._is_duplicate(text, dedupe_key):
+            logger.info("Повторное уведомление подавлено")
+            return {'sent': 0, 'failed': 0, 'suppressed': 1}
+
+        return await self._deliver(bot, text, recipients, parse_mode)
+
+    async def _deliver(self, bot, text: str, recipients: Optional[List[int]] = None,
+                       parse_mode: str = 'HTML') -> Dict[str, int]:
+        if recipients is None:
+            recipients = self.get_admin_ids()
+
+        results = await asyncio.gather(*[
+            telegram_outbox.send_message(bot, chat_id, text=text, parse_mode=parse_mode)
+            for chat_id in set(recipients)
+        ])
+
+        sent = sum(1 for message in results if message is not None)
+        failed = len(results) - sent
+        if failed:
+            logger.error(f"Рассылка: не доставлено {failed} из {len(results)} получателям")
+        return {'sent': sent, 'failed': failed, 'suppressed': 0}
+
+    async def alert(self, bot, text: str, dedupe_key: Optional[str] = None):
+        """Уведомление администраторам через сводку; не ждет отправки"""
+        if self._is_duplicate(text, dedupe_key):
+            logger.info("Повторное уведомление подавлено")
+            return
+
+        self._digest.append(text)
+        self._digest_bot = bot
+
+        if self._digest_task is None or self._digest_task.done():
+            self._digest_task = asyncio.create_task(self._flush_later())
+
+    async def flush(self):
+        """Немедленная отправка накопленной сводки"""
+        if not self._digest:
+            return
+
+        alerts, self._digest = self._digest, []
+        bot = self._digest_bot
+
+        if len(alerts) == 1:
+            messages = [truncate_html(alerts[0], MAX_MESSAGE_LENGTH)]
+        else:
+            messages = self._build_digest(alerts)
+
+        # Отдельные уведомления уже прошли проверку на повторы
+        recipients = self.get_admin_ids()
+        for text in messages:
+            await self._deliver(bot, text, recipients)
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(self.digest_delay)
+            await self.flush()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка отправки сводки уведомлений: {e}")
+
+    @staticmethod
+    def _build_digest(alerts: List[str]) -> List[str]:
+        """Склейка уведомлений в сообщения не длиннее лимита Telegram"""
+        header = f"🔔 <b>Сводка уведомлений ({len(alerts)})</b>\n\n"
+        messages = []
+        current = header
+
+        for text in alerts:
+            text = truncate_html(text, MAX_MESSAGE_LENGTH - len(header) - len(DIGEST_SEPARATOR))
+            chunk = text if current == header else DIGEST_SEPARATOR + text
+            if len(current) + len(chunk) > MAX_MESSAGE_LENGTH:
+                messages.append(current)
+                current = header + text
+            else:
+                current += chunk
+
+        messages.append(current)
+        return messages
+
+# Глобальный экземпляр
+admin_broadcast = AdminBroadcaster()
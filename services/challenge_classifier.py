@@ -0,0 +1,369 @@
+"""
+Классификатор проверок Instagram по истории входов
+По AuthenticationLog и условиям попыток (прокси, устройство, user agent, час)
+считает сглаженные доли успехов и проверок для каждого значения признака и
+объединяет их как независимые свидетельства (наивный Байес в логитах). Модель
+подсказывает профиль клиента, тип проверки и стратегию перед входом:
+сразу входить, подождать более удачного часа, сменить прокси или войти без прокси
+"""
+
+import logging
+import math
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from database.models import AuthenticationLog, AuthAttemptContext, ProxyServer
+from database.connection import Session
+from services.circuit_breaker import circuit_breakers
+from config import (
+    CHALLENGE_DETECTION, INSTAGRAM_USER_AGENTS, DEVICE_SETTINGS,
+    CHALLENGE_MODEL_DAYS, CHALLENGE_MODEL_TTL, CHALLENGE_MIN_SAMPLES, CHALLENGE_PRIOR_WEIGHT,
+    CHALLENGE_SWITCH_MARGIN, CHALLENGE_MAX_WAIT, CHALLENGE_EXPLORATION
+)
+
+logger = logging.getLogger(__name__)
+
+FEATURES = ('proxy', 'device', 'user_agent', 'hour')
+DIRECT = 'direct'  # Значение признака proxy для входа без прокси
+
+# Ключи CHALLENGE_DETECTION -> значения ChallengeType; порядок - приоритет совпадения
+KEYWORD_TYPES = (
+    ('phone_keywords', 'phone_sms'),
+    ('email_keywords', 'email'),
+    ('device_keywords', 'device_confirmation'),
+    ('photo_keywords', 'photo_verification'),
+)
+
+class Recommendation:
+    """Стратегия перед попыткой входа"""
+
+    PROCEED = 'proceed'
+    WAIT = 'wait'
+    SWITCH_PROXY = 'switch_proxy'
+    SAFE_MODE = 'safe_mode'
+
+    def __init__(self, strategy: str, reason: str = '', proxy_id: Optional[int] = None, delay: int = 0,
+                 expected: Optional[float] = None, current: Optional[float] = None):
+        self.strategy = strategy
+        self.reason = reason
+        self.proxy_id = proxy_id
+        self.delay = delay
+        self.expected = expected  # Ожидаемая доля успеха при рекомендации
+        self.current = current  # Ожидаемая доля успеха без изменений
+
+    def __repr__(self):
+        return f"<Recommendation({self.strategy}, proxy_id={self.proxy_id}, delay={self.delay})>"
+
+
+class ChallengeClassifier:
+    """Обучение по истории входов и рекомендации для новых попыток"""
+
+    def __init__(self, days: int = CHALLENGE_MODEL_DAYS, ttl: int = CHALLENGE_MODEL_TTL,
+                 min_samples: int = CHALLENGE_MIN_SAMPLES, prior_weight: float = CHALLENGE_PRIOR_WEIGHT):
+        self.days = days
+        self.ttl = ttl
+        self.min_samples = max(1, min_samples)
+        self.prior_weight = prior_weight
+        self._model: Optional[Dict] = None
+        self._trained_at = 0.0
+        self._lock = threading.Lock()
+
+    # === ПРИЗНАКИ И ЗАПИСЬ ПОПЫТОК ===
+
+    @staticmethod
+    def features(proxy_id: Optional[int], device_model: Optional[str], user_agent: Optional[str],
+                 hour: Optional[int]) -> Dict[str, str]:
+        """Значения признаков попытки; отсутствующие признаки не учитываются"""
+        values = {'proxy': str(proxy_id) if proxy_id is not None else DIRECT}
+        if device_model:
+            values['device'] = device_model
+        if user_agent:
+            values['user_agent'] = user_agent
+        if hour is not None:
+            values['hour'] = str(hour)
+        return values
+
+    @staticmethod
+    def record_attempt(scenario_id: int, attempt_number: int, auth_method: str, success: bool,
+                       challenge_type: Optional[str], proxy_id: Optional[int], proxy_name: Optional[str],
+                       device_model: Optional[str], user_agent: Optional[str], error_message: Optional[str],
+                       duration_seconds: Optional[int], started_at: Optional[datetime] = None):
+        """Запись попытки входа в AuthenticationLog вместе с ее условиями"""
+        started_at = started_at or datetime.now()
+        session = Session()
+        try:
+            log = AuthenticationLog(
+                scenario_id=scenario_id,
+                attempt_number=attempt_number,
+                auth_method=auth_method,
+                challenge_type=challenge_type,
+                proxy_used=(proxy_name or None) and proxy_name[:100],
+                success=success,
+                error_message=(error_message or None) and error_message[:1000],
+                duration_seconds=duration_seconds,
+                created_at=started_at
+            )
+            log.context = AuthAttemptContext(
+                proxy_id=proxy_id,
+                device_model=device_model,
+                user_agent=user_agent and user_agent[:200],
+                hour=started_at.hour
+            )
+            session.add(log)
+            session.commit()
+        except Exception as e:
+            logger.error(f"Ошибка записи попытки входа сценария {scenario_id}: {e}")
+            session.rollback()
+        finally:
+            session.close()
+
+    # === ОБУЧЕНИЕ ===
+
+    def train(self, session) -> Dict:
+        """Счетчики исходов по значениям признаков за последние days дней"""
+        since = datetime.now() - timedelta(days=self.days)
+        rows = session.query(
+            AuthenticationLog.success, AuthenticationLog.challenge_type,
+            AuthAttemptContext.proxy_id, AuthAttemptContext.device_model,
+            AuthAttemptContext.user_agent, AuthAttemptContext.hour
+        ).join(AuthAttemptContext, AuthAttemptContext.auth_log_id == AuthenticationLog.id).filter(
+            AuthenticationLog.created_at >= since
+        ).yield_per(1000)
+
+        stats = {feature: defaultdict(lambda: {'n': 0, 'success': 0, 'challenge': 0, 'types': Counter()})
+                 for feature in FEATURES}
+        total = {'n': 0, 'success': 0, 'challenge': 0, 'types': Counter()}
+
+        for success, challenge_type, proxy_id, device_model, user_agent, hour in rows:
+            buckets = [total] + [
+                stats[feature][value]
+                for feature, value in self.features(proxy_id, device_model, user_agent, hour).items()
+            ]
+            for bucket in buckets:
+                bucket['n'] += 1
+                if success:
+                    bucket['success'] += 1
+                if challenge_type:
+                    bucket['challenge'] += 1
+                    bucket['types'][challenge_type] += 1
+
+        return {
+            'total': total,
+            'stats': {feature: dict(values) for feature, values in stats.items()},
+            'trained_at': datetime.now(),
+            'attempts_per_success': round(total['n'] / total['success'], 2) if total['success'] else None
+        }
+
+    def get_model(self, force: bool = False) -> Dict:
+        """Модель из кеша; переобучается не чаще раза в ttl секунд"""
+        with self._lock:
+            if not force and self._model is not None and time.monotonic() - self._trained_at < self.ttl:
+                return self._model
+
+            session = Session()
+            try:
+                self._model = self.train(session)
+                self._trained_at = time.monotonic()
+                logger.info(
+                    f"Классификатор проверок обучен на {self._model['total']['n']} попытках, "
+                    f"попыток на успешный вход: {self._model['attempts_per_success']}"
+                )
+            except Exception as e:
+                logger.error(f"Ошибка обучения классификатора проверок: {e}")
+                if self._model is None:
+                    self._model = {'total': {'n': 0, 'success': 0, 'challenge': 0, 'types': Counter()},
+                                   'stats': {}, 'trained_at': None, 'attempts_per_success': None}
+                # Повтор не раньше чем через ttl, чтобы не нагружать БД при ошибке
+                self._trained_at = time.monotonic()
+            finally:
+                session.close()
+            return self._model
+
+    # === ПРЕДСКАЗАНИЕ ===
+
+    @staticmethod
+    def _logit(p: float) -> float:
+        p = min(max(p, 1e-4), 1 - 1e-4)
+        return math.log(p / (1 - p))
+
+    def _rate(self, bucket: Dict, key: str, prior: float) -> float:
+        """Доля исхода, сглаженная к общей доле: мало данных - ближе к prior"""
+        return (bucket[key] + self.prior_weight * prior) / (bucket['n'] + self.prior_weight)
+
+    def predict(self, model: Dict, features: Dict[str, str]) -> Dict:
+        """Вероятности успеха и проверки, наиболее вероятный тип проверки"""
+        total = model['total']
+        base_success = (total['success'] + 1) / (total['n'] + 2)
+        base_challenge = (total['challenge'] + 1) / (total['n'] + 2)
+
+        success_logit = self._logit(base_success)
+        challenge_logit = self._logit(base_challenge)
+        types = Counter(total['types'])
+        evidence = 0
+
+        for feature, value in features.items():
+            bucket = model['stats'].get(feature, {}).get(value)
+            if not bucket:
+                continue
+            evidence += bucket['n']
+            success_logit += self._logit(self._rate(bucket, 'success', base_success)) - self._logit(base_success)
+            challenge_logit += (self._logit(self._rate(bucket, 'challenge', base_challenge))
+                                - self._logit(base_challenge))
+            # Типы проверок конкретного значения весят больше общих
+            for challenge_type, count in bucket['types'].items():
+                types[challenge_type] += count * 2
+
+        challenge_type, type_count = types.most_common(1)[0] if types else (None, 0)
+        type_total = sum(types.values())
+        return {
+            'success': 1 / (1 + math.exp(-success_logit)),
+            'challenge': 1 / (1 + math.exp(-challenge_logit)),
+            'challenge_type': challenge_type,
+            'type_confidence': type_count / type_total if type_total else 0.0,
+            'evidence': evidence
+        }
+
+    def _observed(self, model: Dict, feature: str, value: str) -> int:
+        bucket = model['stats'].get(feature, {}).get(value)
+        return bucket['n'] if bucket else 0
+
+    def detect(self, error_message: str, model: Optional[Dict] = None,
+               features: Optional[Dict[str, str]] = None) -> str:
+        """Тип проверки: по ключевым словам из CHALLENGE_DETECTION, иначе по истории
+
+        Возвращает значение ChallengeType.
+        """
+        error_lower = (error_message or '').lower()
+        for config_key, challenge_type in KEYWORD_TYPES:
+            if any(keyword in error_lower for keyword in CHALLENGE_DETECTION.get(config_key, [])):
+                return challenge_type
+        if 'suspicious' in error_lower:
+            return 'suspicious_login'
+
+        # Текст ошибки Instagram часто не называет способ проверки - берем типичный для этих условий
+        if model and features:
+            prediction = self.predict(model, features)
+            if prediction['challenge_type'] and prediction['type_confidence'] >= 0.5:
+                return prediction['challenge_type']
+        return 'unknown'
+
+    # === РЕКОМЕНДАЦИИ ===
+
+    def choose_profile(self, model: Dict, proxy_id: Optional[int], hour: int) -> Tuple[Dict, str]:
+        """Устройство и user agent для прокси и часа
+
+        Профиль выбирается случайно с весом, равным прогнозу успеха: удачные
+        сочетания встречаются чаще, но аккаунты за одним прокси не сходятся к
+        одному отпечатку. С вероятностью CHALLENGE_EXPLORATION выбор равномерный,
+        чтобы у всех вариантов оставалась свежая статистика.
+        """
+        if random.random() < CHALLENGE_EXPLORATION or model['total']['n'] < self.min_samples:
+            return random.choice(DEVICE_SETTINGS), random.choice(INSTAGRAM_USER_AGENTS)
+
+        profiles = [(device, user_agent) for device in DEVICE_SETTINGS for user_agent in INSTAGRAM_USER_AGENTS]
+        weights = [
+            self.predict(model, self.features(proxy_id, device.get('model'), user_agent, hour))['success']
+            for device, user_agent in profiles
+        ]
+        if not any(weights):
+            return random.choice(profiles)
+        return random.choices(profiles, weights=weights)[0]
+
+    @staticmethod
+    def candidate_proxies(session) -> List[int]:
+        """Прокси, на которые можно переключиться"""
+        unavailable = circuit_breakers.unavailable_ids()
+        return [
+            proxy_id for (proxy_id,) in session.query(ProxyServer.id).filter(
+                ProxyServer.is_active == True,
+                ProxyServer.is_working == True
+            )
+            if proxy_id not in unavailable
+        ]
+
+    def recommend(self, model: Dict, proxy_id: Optional[int], hour: int, candidates: List[int],
+                  allow_direct: bool = True, device_model: Optional[str] = None,
+                  user_agent: Optional[str] = None) -> Recommendation:
+        """Стратегия перед входом
+
+        Смена прокси и вход без прокси предлагаются, только если у альтернативы
+        не меньше min_samples попыток и прогноз лучше на CHALLENGE_SWITCH_MARGIN.
+        Ожидание - если один из ближайших часов в пределах CHALLENGE_MAX_WAIT
+        заметно удачнее текущего.
+        """
+        if model['total']['n'] < self.min_samples:
+            return Recommendation(Recommendation.PROCEED, "мало истории входов")
+
+        current = self.predict(model, self.features(proxy_id, device_model, user_agent, hour))['success']
+
+        # Другие прокси и прямое подключение при тех же остальных условиях
+        alternatives = [candidate for candidate in candidates if candidate != proxy_id]
+        if allow_direct and proxy_id is not None:
+            alternatives.append(None)
+
+        best_proxy, best_success = proxy_id, current
+        for candidate in alternatives:
+            value = str(candidate) if candidate is not None else DIRECT
+            if self._observed(model, 'proxy', value) < self.min_samples:
+                continue
+            success = self.predict(model, self.features(candidate, device_model, user_agent, hour))['success']
+            if success > best_success:
+                best_proxy, best_success = candidate, success
+
+        if best_proxy != proxy_id and best_success - current >= CHALLENGE_SWITCH_MARGIN:
+            if best_proxy is None:
+                return Recommendation(Recommendation.SAFE_MODE, "без прокси входы успешнее",
+                                      expected=best_success, current=current)
+            return Recommendation(Recommendation.SWITCH_PROXY, "через другой прокси входы успешнее",
+                                  proxy_id=best_proxy, expected=best_success, current=current)
+
+        # Более удачный час в пределах допустимого ожидания
+        now = datetime.now()
+        best_delay, best_hour_success = 0, current
+        for offset in range(1, CHALLENGE_MAX_WAIT // 3600 + 1):
+            start = (now + timedelta(hours=offset)).replace(minute=0, second=0, microsecond=0)
+            delay = int((start - now).total_seconds())
+            if delay > CHALLENGE_MAX_WAIT:
+                break
+            if self._observed(model, 'hour', str(start.hour)) < self.min_samples:
+                continue
+            success = self.predict(model, self.features(proxy_id, device_model, user_agent, start.hour))['success']
+            if success > best_hour_success:
+                best_delay, best_hour_success = delay, success
+
+        if best_delay and best_hour_success - current >= CHALLENGE_SWITCH_MARGIN:
+            return Recommendation(Recommendation.WAIT, "в ближайшие часы входы успешнее", delay=best_delay,
+                                  expected=best_hour_success, current=current)
+
+        return Recommendation(Recommendation.PROCEED, expected=current, current=current)
+
+    def recommend_for(self, proxy_id: Optional[int], allow_direct: bool = True) -> Recommendation:
+        """Рекомендация с загрузкой модели и списка прокси (блокирующий вызов)"""
+        model = self.get_model()
+        session = Session()
+        try:
+            candidates = self.candidate_proxies(session)
+        finally:
+            session.close()
+        return self.recommend(model, proxy_id, datetime.now().hour, candidates, allow_direct)
+
+    def get_summary(self) -> Dict:
+        """Сводка модели для статистики авторизации"""
+        model = self.get_model()
+        total = model['total']
+        return {
+            'attempts': total['n'],
+            'success_rate': round(total['success'] / total['n'], 3) if total['n'] else None,
+            'challenge_rate': round(total['challenge'] / total['n'], 3) if total['n'] else None,
+            'challenge_types': dict(total['types'].most_common()),
+            'attempts_per_success': model['attempts_per_success'],
+            'trained_at': model['trained_at']
+        }
+
+
+# Глобальный экземпляр классификатора
+challenge_classifier = ChallengeClassifier()
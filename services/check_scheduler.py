@@ -0,0 +1,316 @@
+"""
+Планировщик проверок комментариев по Scenario.next_check_time
+Min-heap вместо ежеминутного опроса базы данных
+"""
+
+import asyncio
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import event, inspect
+
+from database.models import Scenario
+from database.connection import Session
+from services.adaptive_polling import adaptive_poller
+from config import CHECK_CONCURRENCY, ADAPTIVE_POLLING_ENABLED, POLL_MIN_INTERVAL, POLL_MAX_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+class ScenarioCheckScheduler:
+    """Планировщик проверок сценариев на основе min-heap"""
+
+    def __init__(self, concurrency: int = CHECK_CONCURRENCY):
+        self.concurrency = concurrency
+        self.bot = None
+
+        # Куча (время срабатывания, id сценария) и актуальное время для каждого сценария.
+        # Устаревшие записи кучи не удаляются, а пропускаются при извлечении.
+        self._heap: List[Tuple[float, int]] = []
+        self._due: Dict[int, float] = {}
+        self._running: Set[int] = set()
+        self._failures: Dict[int, int] = {}  # Подряд неудачных проверок по сценариям
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, bot):
+        """Запуск планировщика в текущем event loop"""
+        if self._task and not self._task.done():
+            return
+
+        self.bot = bot
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._wakeup = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        loaded = self.load_from_database()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Планировщик проверок запущен: {loaded} проверок в очереди, лимит {self.concurrency} одновременно")
+
+    def stop(self):
+        """Остановка планировщика"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def load_from_database(self) -> int:
+        """Загрузка запланированных проверок из БД"""
+        session = Session()
+        try:
+            query = session.query(Scenario.id, Scenario.next_check_time).filter(
+                Scenario.status == 'running',
+                Scenario.auth_status == 'success'
+            )
+            if not ADAPTIVE_POLLING_ENABLED:
+                query = query.filter(Scenario.next_check_time.isnot(None))
+            rows = query.all()
+
+            for scenario_id, next_check_time in rows:
+                when = next_check_time or _first_adaptive_check()
+                self._push(scenario_id, when.timestamp())
+
+            return len(rows)
+
+        except Exception as e:
+            logger.error(f"Ошибка загрузки запланированных проверок: {e}")
+            return 0
+        finally:
+            session.close()
+
+    def schedule(self, scenario_id: int, when: datetime):
+        """Запланировать (или перенести) проверку сценария"""
+        self._call_in_loop(self._push, scenario_id, when.timestamp())
+
+    def cancel(self, scenario_id: int):
+        """Отменить запланированную проверку сценария"""
+        self._call_in_loop(self._remove, scenario_id)
+
+    def is_running(self, scenario_id: int) -> bool:
+        """Выполняется ли сейчас проверка сценария"""
+        return scenario_id in self._running
+
+    def get_status(self) -> dict:
+        """Состояние очереди планировщика"""
+        next_ts = min(self._due.values()) if self._due else None
+        return {
+            'queued': len(self._due),
+            'running': len(self._running),
+            'next_check': datetime.fromtimestamp(next_ts) if next_ts else None
+        }
+
+    def _call_in_loop(self, func, *args):
+        """Выполнение операции с кучей в потоке event loop"""
+        if self._loop and self._loop.is_running() and threading.get_ident() != self._loop_thread:
+            self._loop.call_soon_threadsafe(func, *args)
+        else:
+            func(*args)
+
+    def _push(self, scenario_id: int, due_ts: float):
+        self._due[scenario_id] = due_ts
+        heapq.heappush(self._heap, (due_ts, scenario_id))
+        if self._wakeup:
+            self._wakeup.set()
+
+    def _remove(self, scenario_id: int):
+        self._failures.pop(scenario_id, None)
+        if self._due.pop(scenario_id, None) is not None and self._wakeup:
+            self._wakeup.set()
+
+    def _next_delay(self) -> Optional[float]:
+        """Секунды до ближайшей актуальной проверки (None - очередь пуста)"""
+        while self._heap:
+            due_ts, scenario_id = self._heap[0]
+            if self._due.get(scenario_id) == due_ts:
+                return due_ts - time.time()
+            heapq.heappop(self._heap)
+        return None
+
+    async def _run(self):
+        """Основной цикл: сон до ближайшей проверки или до изменения очереди"""
+        while True:
+            try:
+                self._wakeup.clear()
+                delay = self._next_delay()
+
+                if delay is None:
+                    await self._wakeup.wait()
+                    continue
+
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                due_ts, scenario_id = heapq.heappop(self._heap)
+                del self._due[scenario_id]
+
+                if scenario_id in self._running:
+                    logger.info(f"Проверка сценария {scenario_id} уже выполняется, пропуск")
+                    continue
+
+                self._running.add(scenario_id)
+                asyncio.create_task(self._dispatch(scenario_id))
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка в цикле планировщика проверок: {e}")
+                await asyncio.sleep(1)
+
+    async def _dispatch(self, scenario_id: int):
+        """Запуск проверки с ограничением параллельности"""
+        try:
+            async with self._semaphore:
+                await self._run_check(scenario_id)
+        finally:
+            self._running.discard(scenario_id)
+
+    async def _run_check(self, scenario_id: int):
+        """Проверка комментариев одного сценария"""
+        session = Session()
+        try:
+            scenario = session.query(Scenario).filter_by(id=scenario_id).first()
+            if not scenario or scenario.status != 'running' or scenario.auth_status != 'success':
+                return
+
+            # Прокси отключен circuit breaker - проверка переносится на момент пробного запроса
+            from services.circuit_breaker import circuit_breakers
+            if not circuit_breakers.allow(scenario.proxy_id):
+                retry_at = circuit_breakers.retry_at(scenario.proxy_id) or datetime.now() + timedelta(seconds=POLL_MIN_INTERVAL)
+                self._push(scenario_id, retry_at.timestamp())
+                return
+
+            chat_id = scenario.user.telegram_id
+            processed_before = scenario.comments_processed or 0
+
+            from services.instagram import auto_check_comments
+            await auto_check_comments(scenario_id, self.bot, chat_id)
+
+            self._failures.pop(scenario_id, None)
+
+            # Проверка была перепланирована во время выполнения - оставляем новое время
+            if scenario_id in self._due:
+                return
+
+            next_check_time = None
+            session.refresh(scenario)
+            if ADAPTIVE_POLLING_ENABLED and scenario.status == 'running' and scenario.auth_status == 'success':
+                adaptive_poller.record_check(
+                    scenario_id, (scenario.comments_processed or 0) - processed_before
+                )
+                account_scenarios = session.query(Scenario).filter_by(
+                    ig_username=scenario.ig_username,
+                    status='running'
+                ).count()
+                next_check_time = adaptive_poller.next_check_time(scenario_id, account_scenarios)
+
+            # Массовый update не вызывает слушатели, поэтому очередь обновляется явно
+            session.query(Scenario).filter_by(id=scenario_id).update(
+                {'next_check_time': next_check_time}, synchronize_session=False
+            )
+            session.commit()
+            if next_check_time:
+                self._push(scenario_id, next_check_time.timestamp())
+
+        except Exception as e:
+            logger.error(f"Ошибка выполнения запланированной задачи для сценария {scenario_id}: {e}")
+            session.rollback()
+            self._reschedule_after_error(session, scenario_id)
+        finally:
+            session.close()
+
+    def _reschedule_after_error(self, session, scenario_id: int):
+        """Повтор проверки после ошибки с растущей задержкой
+
+        У каждого сценария одна запись в очереди: без повтора сценарий выпал бы
+        из опроса до перезапуска бота.
+        """
+        if scenario_id in self._due:
+            return
+
+        failures = self._failures.get(scenario_id, 0) + 1
+        self._failures[scenario_id] = failures
+        delay = min(POLL_MIN_INTERVAL * 2 ** min(failures - 1, 16), max(POLL_MAX_INTERVAL, POLL_MIN_INTERVAL))
+        retry_at = datetime.now() + timedelta(seconds=delay)
+
+        try:
+            scenario = session.query(Scenario).filter_by(id=scenario_id).first()
+            if not scenario or scenario.status != 'running' or scenario.auth_status != 'success':
+                self._failures.pop(scenario_id, None)
+                return
+            session.query(Scenario).filter_by(id=scenario_id).update(
+                {'next_check_time': retry_at}, synchronize_session=False
+            )
+            session.commit()
+        except Exception as e:
+            # БД недоступна - повтор все равно планируется, время сохранит следующая успешная проверка
+            logger.error(f"Ошибка сохранения повтора проверки сценария {scenario_id}: {e}")
+            session.rollback()
+
+        self._push(scenario_id, retry_at.timestamp())
+        logger.info(f"Повтор проверки сценария {scenario_id} через {delay} сек (ошибок подряд: {failures})")
+
+
+# Глобальный экземпляр планировщика
+check_scheduler = ScenarioCheckScheduler()
+
+
+# === СИНХРОНИЗАЦИЯ С ЗАПИСЯМИ В БД ===
+
+PENDING_SCHEDULE_KEY = 'check_scheduler_pending'  # Ключ Session.info с изменениями до фиксации
+
+def _first_adaptive_check() -> datetime:
+    """Время первой проверки для сценария без расписания"""
+    return datetime.now() + timedelta(seconds=POLL_MIN_INTERVAL)
+
+def _sync_scenario_schedule(mapper, connection, target):
+    """Запоминание изменений next_check_time/status/auth_status до фиксации транзакции"""
+    state = inspect(target)
+    if not any(state.attrs[attr].history.has_changes()
+               for attr in ('next_check_time', 'status', 'auth_status')):
+        return
+
+    if target.status == 'running' and target.auth_status == 'success':
+        if target.next_check_time:
+            when = target.next_check_time
+        elif ADAPTIVE_POLLING_ENABLED:
+            when = _first_adaptive_check()
+        else:
+            when = None
+    else:
+        when = False
+
+    # Последнее значение за транзакцию побеждает; None - снять с расписания, False - еще и забыть опрос
+    state.session.info.setdefault(PENDING_SCHEDULE_KEY, {})[target.id] = when
+
+def _apply_pending_schedule(session):
+    """Обновление очереди после фиксации транзакции"""
+    pending = session.info.pop(PENDING_SCHEDULE_KEY, None)
+    if not pending:
+        return
+    for scenario_id, when in pending.items():
+        if when:
+            check_scheduler.schedule(scenario_id, when)
+        else:
+            check_scheduler.cancel(scenario_id)
+            if when is False:
+                adaptive_poller.forget(scenario_id)
+
+def _discard_pending_schedule(session):
+    """Откат транзакции - изменения расписания не применяются"""
+    session.info.pop(PENDING_SCHEDULE_KEY, None)
+
+event.listen(Scenario, 'after_insert', _sync_scenario_schedule)
+event.listen(Scenario, 'after_update', _sync_scenario_schedule)
+event.listen(Session, 'after_commit', _apply_pending_schedule)
+event.listen(Session, 'after_rollback', _discard_pending_schedule)
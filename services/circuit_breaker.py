@@ -0,0 +1,224 @@
+"""
+Circuit breaker для прокси серверов
+Сетевые ошибки авторизации, проверок комментариев и health check записываются
+в общий реестр; после BREAKER_FAILURE_THRESHOLD ошибок подряд прокси выводится
+из ротации на время с экспоненциальным ростом, затем пропускает один пробный запрос
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Set
+
+from database.models import ProxyPerformance
+from database.connection import Session
+from config import BREAKER_FAILURE_THRESHOLD, BREAKER_BASE_COOLDOWN, BREAKER_MAX_COOLDOWN
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# HTTP статусы, которые возвращает сам прокси, а не Instagram
+PROXY_FAILURE_STATUSES = {407, 502, 503, 504}
+
+class ProxyBreakerState:
+    """Состояние одного прокси"""
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.open_count = 0
+        self.open_until = 0.0
+        self.probe_started = None
+        self.last_error = None
+
+class CircuitBreakerRegistry:
+    """Реестр состояний прокси по ProxyServer.id, общий для всех потоков"""
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 base_cooldown: float = BREAKER_BASE_COOLDOWN, max_cooldown: float = BREAKER_MAX_COOLDOWN):
+        self.failure_threshold = max(1, failure_threshold)
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self._states: Dict[int, ProxyBreakerState] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, proxy_id: int) -> ProxyBreakerState:
+        state = self._states.get(proxy_id)
+        if state is None:
+            state = self._states[proxy_id] = ProxyBreakerState()
+        return state
+
+    def _cooldown(self, open_count: int) -> float:
+        return min(self.base_cooldown * 2 ** (open_count - 1), self.max_cooldown)
+
+    def allow(self, proxy_id: Optional[int]) -> bool:
+        """Можно ли выполнить запрос через прокси; после отключения пропускает один пробный"""
+        if proxy_id is None:
+            return True
+        with self._lock:
+            state = self._states.get(proxy_id)
+            if state is None or state.state == CLOSED:
+                return True
+
+            now = time.monotonic()
+            if state.state == OPEN:
+                if now < state.open_until:
+                    return False
+                state.state = HALF_OPEN
+                state.probe_started = now
+                return True
+
+            # Пробный запрос завис или результат не был записан - разрешаем следующий
+            if now - state.probe_started > self._cooldown(state.open_count):
+                state.probe_started = now
+                return True
+            return False
+
+    def is_available(self, proxy_id: Optional[int]) -> bool:
+        """Проверка для выбора прокси без изменения состояния"""
+        if proxy_id is None:
+            return True
+        with self._lock:
+            state = self._states.get(proxy_id)
+            return state is None or state.state == CLOSED or (
+                state.state == OPEN and time.monotonic() >= state.open_until
+            )
+
+    def unavailable_ids(self) -> Set[int]:
+        """Прокси, исключенные из ротации прямо сейчас"""
+        with self._lock:
+            now = time.monotonic()
+            return {
+                proxy_id for proxy_id, state in self._states.items()
+                if (state.state == OPEN and now < state.open_until) or state.state == HALF_OPEN
+            }
+
+    def record_success(self, proxy_id: Optional[int]):
+        """Успешный запрос: сброс счетчика, пробный запрос закрывает breaker"""
+        if proxy_id is None:
+            return
+        with self._lock:
+            state = self._states.get(proxy_id)
+            if state is None or (state.state == CLOSED and not state.failures):
+                return
+            recovered = state.state != CLOSED
+            state.state = CLOSED
+            state.failures = 0
+            state.open_count = 0
+            state.probe_started = None
+
+        if recovered:
+            logger.info(f"Прокси {proxy_id} снова доступен")
+            self._persist(proxy_id, None)
+
+    def record_failure(self, proxy_id: Optional[int], error: str = ''):
+        """Сетевая ошибка прокси; при достижении порога прокси отключается"""
+        if proxy_id is None:
+            return
+        with self._lock:
+            state = self._get(proxy_id)
+            state.failures += 1
+            state.last_error = error[:200]
+
+            # Неудачный пробный запрос сразу отключает прокси на следующий, более длинный срок
+            if state.state == HALF_OPEN or (state.state == CLOSED and state.failures >= self.failure_threshold):
+                state.state = OPEN
+                state.open_count += 1
+                cooldown = self._cooldown(state.open_count)
+                state.open_until = time.monotonic() + cooldown
+                state.probe_started = None
+            else:
+                return
+
+        logger.warning(f"Прокси {proxy_id} отключен на {cooldown:.0f} сек: {error[:100]}")
+        self._persist(proxy_id, datetime.now() + timedelta(seconds=cooldown))
+
+    def retry_at(self, proxy_id: Optional[int]) -> Optional[datetime]:
+        """Когда прокси снова можно попробовать; None, если он доступен"""
+        with self._lock:
+            state = self._states.get(proxy_id)
+            if state is None or state.state != OPEN:
+                return None
+            remaining = state.open_until - time.monotonic()
+        return datetime.now() + timedelta(seconds=max(0.0, remaining))
+
+    def get_status(self) -> Dict[int, Dict]:
+        """Состояния прокси, отличные от нормального"""
+        with self._lock:
+            now = time.monotonic()
+            return {
+                proxy_id: {
+                    'state': state.state,
+                    'failures': state.failures,
+                    'open_count': state.open_count,
+                    'retry_in': max(0.0, state.open_until - now) if state.state == OPEN else 0.0,
+                    'last_error': state.last_error
+                }
+                for proxy_id, state in self._states.items()
+                if state.state != CLOSED or state.failures
+            }
+
+    @staticmethod
+    def _persist(proxy_id: int, blacklisted_until: Optional[datetime]):
+        """Запись срока отключения в ProxyPerformance.blacklisted_until"""
+        session = Session()
+        try:
+            perf = session.query(ProxyPerformance).filter_by(proxy_id=proxy_id).first()
+            if not perf:
+                perf = ProxyPerformance(proxy_id=proxy_id, auth_attempts=0, auth_successes=0)
+                session.add(perf)
+            perf.blacklisted_until = blacklisted_until
+            if blacklisted_until:
+                perf.last_failure = datetime.now()
+            session.commit()
+        except Exception as e:
+            logger.error(f"Ошибка сохранения состояния прокси {proxy_id}: {e}")
+            session.rollback()
+        finally:
+            session.close()
+
+    def bind_client(self, client, proxy_id: Optional[int]):
+        """Запись результатов всех запросов instagrapi клиента в реестр
+
+        Прокси берется из атрибута клиента при каждом запросе, поэтому при
+        переносе на другой прокси достаточно вызвать bind_client повторно.
+        """
+        client._breaker_proxy_id = proxy_id
+        if getattr(client, '_breaker_bound', False):
+            return client
+
+        import requests
+
+        registry = self
+
+        for session in (getattr(client, 'private', None), getattr(client, 'public', None)):
+            if session is None:
+                continue
+            original_send = session.send
+
+            def send(request, _original_send=original_send, **kwargs):
+                proxy = getattr(client, '_breaker_proxy_id', None)
+                try:
+                    response = _original_send(request, **kwargs)
+                except (requests.exceptions.ProxyError, requests.exceptions.ConnectTimeout,
+                        requests.exceptions.ConnectionError) as e:
+                    registry.record_failure(proxy, f"{type(e).__name__}: {e}")
+                    raise
+                if response.status_code in PROXY_FAILURE_STATUSES:
+                    registry.record_failure(proxy, f"HTTP {response.status_code}")
+                else:
+                    registry.record_success(proxy)
+                return response
+
+            session.send = send
+
+        client._breaker_bound = True
+        return client
+
+
+# Глобальный реестр circuit breaker
+circuit_breakers = CircuitBreakerRegistry()
@@ -0,0 +1,110 @@
+"""
+Собственная цель для проверки прокси вместо httpbin.org
+Отвечает на GET /ip JSON с адресом клиента (ключ origin, как у httpbin),
+полученными заголовками и временем сервера. Запускается внутри бота
+(ECHO_SERVER_ENABLED) или отдельно:
+
+    python -m services.echo_server --host 0.0.0.0 --port 9180
+
+Адрес должен быть доступен из интернета: к нему подключаются выходные IP прокси.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+MAX_HEADER_LINES = 100
+
+async def _read_request(reader: asyncio.StreamReader):
+    """Строка запроса и заголовки"""
+    request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+    headers = {}
+    for _ in range(MAX_HEADER_LINES):
+        line = await asyncio.wait_for(reader.readline(), timeout=5)
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip()] = value.strip()
+    return request_line.decode('latin-1'), headers
+
+def make_handler(trust_forwarded: bool = False):
+    """Обработчик соединений; trust_forwarded - брать адрес из X-Forwarded-For (за reverse proxy)"""
+
+    async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line, headers = await _read_request(reader)
+            parts = request_line.split()
+            target = parts[1] if len(parts) > 1 else '/'
+            # Запрос через HTTP прокси может прийти в абсолютной форме: GET http://host/ip
+            path = urlsplit(target).path or '/'
+
+            origin = writer.get_extra_info('peername')[0]
+            if trust_forwarded and headers.get('X-Forwarded-For'):
+                origin = headers['X-Forwarded-For'].split(',')[0].strip()
+
+            if path in ('/ip', '/'):
+                body = json.dumps({
+                    'origin': origin,
+                    'headers': headers,
+                    'timestamp': time.time()
+                }).encode()
+                status = '200 OK'
+                content_type = 'application/json'
+            elif path == '/health':
+                body = b'ok\n'
+                status = '200 OK'
+                content_type = 'text/plain'
+            else:
+                body = b'Not Found\n'
+                status = '404 Not Found'
+                content_type = 'text/plain'
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nCache-Control: no-store\r\n"
+                f"Connection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except Exception as e:
+            logger.debug(f"Ошибка обработки запроса проверки прокси: {e}")
+        finally:
+            writer.close()
+
+    return handle_connection
+
+async def start_echo_server(host: str = None, port: int = None, trust_forwarded: bool = None):
+    """Запуск эндпоинта в текущем event loop"""
+    if host is None or port is None or trust_forwarded is None:
+        from config import ECHO_SERVER_HOST, ECHO_SERVER_PORT, ECHO_TRUST_FORWARDED
+        host = ECHO_SERVER_HOST if host is None else host
+        port = ECHO_SERVER_PORT if port is None else port
+        trust_forwarded = ECHO_TRUST_FORWARDED if trust_forwarded is None else trust_forwarded
+
+    server = await asyncio.start_server(make_handler(trust_forwarded), host, port)
+    logger.info(f"Эндпоинт проверки прокси доступен на http://{host}:{port}/ip")
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Эндпоинт проверки прокси")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=9180)
+    parser.add_argument('--trust-forwarded', action='store_true', help="Адрес клиента из X-Forwarded-For")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    async def serve():
+        server = await start_echo_server(args.host, args.port, args.trust_forwarded)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+if __name__ == '__main__':
+    main()
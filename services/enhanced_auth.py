@@ -23,7 +23,12 @@ from database.models import Scenario, ProxyServer
 from database.connection import Session
 from services.encryption import EncryptionService
 from services.proxy_manager import ProxyManager
-from config import instabots, captcha_confirmed, TELEGRAM_TOKEN
+from services.telegram_queue import telegram_outbox
+from services.metrics import AUTH_ATTEMPTS, instrument_instagram_client
+from services.circuit_breaker import circuit_breakers
+from services.login_orchestrator import login_orchestrator, PRIORITY_INTERACTIVE
+from services.challenge_classifier import challenge_classifier, Recommendation
+from config import instabots, captcha_confirmed
 
 logger = logging.getLogger(__name__)
 
@@ -65,10 +70,11 @@ class AuthConfig:
 class EnhancedInstagramAuth:
     """Улучшенная система авторизации Instagram"""
     
-    def __init__(self, scenario: Scenario, bot, chat_id: int):
+    def __init__(self, scenario: Scenario, bot, chat_id: int, priority: int = PRIORITY_INTERACTIVE):
         self.scenario = scenario
         self.bot = bot
         self.chat_id = chat_id
+        self.priority = priority  # Место в очереди входов: перезапуск пользователем раньше фонового
         self.session = Session()
         
         # Состояние авторизации
@@ -78,6 +84,12 @@ class EnhancedInstagramAuth:
         self.ig_client = None
         self.message_id = None
         
+        # Модель классификатора проверок и профиль текущего клиента
+        self.auth_model = None
+        self.device_model = None
+        self.user_agent = None
+        self.last_error = None
+        
         # Временные данные
         self.temp_data = {}
         
@@ -89,11 +101,17 @@ class EnhancedInstagramAuth:
             # Получаем пароль
             password = EncryptionService.decrypt_password(self.scenario.ig_password_encrypted)
             
+            # Стратегия по истории входов: сменить прокси, войти без прокси или подождать
+            self.auth_model = await asyncio.to_thread(challenge_classifier.get_model)
+            if await self._apply_recommendation():
+                return True
+            
             # Основной цикл авторизации
             for attempt in range(1, AuthConfig.MAX_FAST_ATTEMPTS + 1):
                 self.current_attempt = attempt
                 
                 result = await self._attempt_login(password, attempt)
+                AUTH_ATTEMPTS.labels(result.value).inc()
                 
                 if result == AuthAttemptResult.SUCCESS:
                     await self._handle_auth_success()
@@ -139,7 +157,47 @@ class EnhancedInstagramAuth:
         finally:
             self.session.close()
     
-    async def _attempt_login(self, password: str, attempt: int) -> AuthAttemptResult:
+    async def _attempt_login(self, password: str, attempt: int, auth_method: str = None) -> AuthAttemptResult:
+        """Попытка входа с записью результата в историю классификатора проверок"""
+        # Отключенный прокси не тратит попытку входа - сразу переходим к смене прокси
+        if self.current_proxy and not circuit_breakers.allow(self.current_proxy.id):
+            return AuthAttemptResult.PROXY_ERROR
+        
+        started_at = datetime.now()
+        self.last_error = None
+        result = await self._login_once(password, attempt)
+        
+        if result != AuthAttemptResult.PROXY_ERROR or self.current_proxy is None:
+            # Сбои прокси учитывает circuit breaker, в истории они исказили бы статистику аккаунтов
+            await asyncio.to_thread(
+                challenge_classifier.record_attempt,
+                self.scenario.id,
+                attempt,
+                auth_method or ('fast' if attempt <= AuthConfig.MAX_FAST_ATTEMPTS else 'slow'),
+                result == AuthAttemptResult.SUCCESS,
+                self.challenge_type.value if result == AuthAttemptResult.CHALLENGE_REQUIRED else None,
+                self.current_proxy.id if self.current_proxy else None,
+                self.current_proxy.name if self.current_proxy else None,
+                self.device_model,
+                self.user_agent,
+                self.last_error or (None if result == AuthAttemptResult.SUCCESS else result.value),
+                int((datetime.now() - started_at).total_seconds()),
+                started_at
+            )
+        return result
+    
+    async def _queued_login(self, password: str):
+        """Вход через общую очередь; сам login блокирующий и выполняется в потоке"""
+        proxy_id = self.current_proxy.id if self.current_proxy else None
+        async with login_orchestrator.slot(self.scenario.id, proxy_id, self.priority,
+                                           on_position=self._show_queue_position):
+            await asyncio.to_thread(
+                self.ig_client.login,
+                username=self.scenario.ig_username,
+                password=password
+            )
+    
+    async def _login_once(self, password: str, attempt: int) -> AuthAttemptResult:
         """Попытка входа в Instagram"""
         try:
             # Создаем/обновляем клиент
@@ -152,16 +210,13 @@ class EnhancedInstagramAuth:
             wait_time = random.uniform(*AuthConfig.WAIT_BEFORE_LOGIN)
             await asyncio.sleep(wait_time)
             
-            # Попытка входа
-            self.ig_client.login(
-                username=self.scenario.ig_username, 
-                password=password
-            )
+            await self._queued_login(password)
             
             return AuthAttemptResult.SUCCESS
             
         except ChallengeRequired as e:
             logger.info(f"Challenge Required для сценария {self.scenario.id}")
+            self.last_error = str(e)
             self.challenge_type = self._detect_challenge_type(str(e))
             return AuthAttemptResult.CHALLENGE_REQUIRED
             
@@ -175,6 +230,7 @@ class EnhancedInstagramAuth:
             return AuthAttemptResult.RATE_LIMITED
             
         except Exception as e:
+            self.last_error = str(e)
             error_str = str(e).lower()
             if 'proxy' in error_str or 'connection' in error_str:
                 return AuthAttemptResult.PROXY_ERROR
@@ -335,10 +391,10 @@ async def handle_enhanced_auth_callbacks(update: Update, context: ContextTypes.D
 
 # === ОБРАБОТЧИК SMS КОДОВ ===
 
-async def handle_sms_code_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработчик ввода SMS кодов"""
+async def handle_sms_code_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+    """Обработчик ввода SMS кодов; True - код принят сценарием, ожидающим проверку"""
     if not update.message or not update.message.text:
-        return
+        return False
     
     # Проверяем, ожидается ли SMS код
     user_id = update.effective_user.id
@@ -366,16 +422,23 @@ async def handle_sms_code_input(update: Update, context: ContextTypes.DEFAULT_TY
                         f"📱 SMS код <code>{text}</code> принят для сценария #{scenario_id}",
                         parse_mode='HTML'
                     )
-                    return
+                    return True
                     
         finally:
             session.close()
+    
+    return False
 
 
 # === ГЛАВНАЯ ФУНКЦИЯ ЗАПУСКА ===
 
-async def run_enhanced_instagram_scenario(scenario_id: int, chat_id: int):
-    """Запуск сценария с улучшенной авторизацией"""
+async def run_enhanced_instagram_scenario(scenario_id: int, chat_id: int, bot=None,
+                                          priority: int = PRIORITY_INTERACTIVE):
+    """Запуск сценария с улучшенной авторизацией
+
+    bot - общий экземпляр бота; без него берется из реестра telegram_clients
+    priority - приоритет в очереди входов (PRIORITY_BACKGROUND для восстановления)
+    """
     session = Session()
     try:
         scenario = session.query(Scenario).filter_by(id=scenario_id).first()
@@ -383,13 +446,13 @@ async def run_enhanced_instagram_scenario(scenario_id: int, chat_id: int):
             logger.error(f"Сценарий {scenario_id} не найден")
             return
         
-        # Получаем бот из приложения
-        from telegram.ext import Application
-        app = Application.builder().token(TELEGRAM_TOKEN).build()
-        bot = app.bot
+        # Общий бот с общим пулом соединений вместо нового Application на каждый сценарий
+        if bot is None:
+            from services.telegram_client import telegram_clients
+            bot = await telegram_clients.get_bot()
         
         # Создаем экземпляр улучшенной авторизации
-        auth_handler = EnhancedInstagramAuth(scenario, bot, chat_id)
+        auth_handler = EnhancedInstagramAuth(scenario, bot, chat_id, priority)
         
         # Выполняем авторизацию
         auth_success = await auth_handler.authenticate()
@@ -532,7 +595,7 @@ async def admin_auth_settings_menu(query):
                 # Попытка повторного входа
                 try:
                     password = EncryptionService.decrypt_password(self.scenario.ig_password_encrypted)
-                    self.ig_client.login(self.scenario.ig_username, password)
+                    await self._queued_login(password)
                     
                     await self._handle_auth_success()
                     return True
@@ -589,7 +652,7 @@ async def admin_auth_settings_menu(query):
                     
                     # Повторная попытка входа
                     password = EncryptionService.decrypt_password(self.scenario.ig_password_encrypted)
-                    self.ig_client.login(self.scenario.ig_username, password)
+                    await self._queued_login(password)
                     
                     await self._handle_auth_success()
                     return True
@@ -625,12 +688,11 @@ async def admin_auth_settings_menu(query):
             original_proxy = self.current_proxy
             self.current_proxy = None
             
-            # Создаем клиент без прокси
-            self.ig_client = self._create_instagram_client()
-            
-            # Попытка входа
+            # Попытка входа без прокси через общую очередь и с записью в историю
             password = EncryptionService.decrypt_password(self.scenario.ig_password_encrypted)
-            self.ig_client.login(self.scenario.ig_username, password)
+            result = await self._attempt_login(password, self.current_attempt, 'safe_mode')
+            if result != AuthAttemptResult.SUCCESS:
+                raise Exception(self.last_error or result.value)
             
             # Обновляем сценарий
             self.scenario.proxy_id = None
@@ -648,12 +710,12 @@ async def admin_auth_settings_menu(query):
             )
             return False
     
-    async def _try_switch_proxy(self) -> bool:
-        """Попытка переключения на другой прокси"""
+    async def _try_switch_proxy(self, new_proxy: Optional[ProxyServer] = None) -> bool:
+        """Попытка переключения на другой прокси; без new_proxy выбирается лучший свободный"""
         if not AuthConfig.AUTO_SWITCH_PROXY:
             return False
             
-        new_proxy = ProxyManager.get_best_proxy()
+        new_proxy = new_proxy or ProxyManager.get_best_proxy()
         if not new_proxy or new_proxy.id == (self.current_proxy.id if self.current_proxy else None):
             return False
         
@@ -670,6 +732,55 @@ async def admin_auth_settings_menu(query):
         
         return True
     
+    async def _apply_recommendation(self) -> bool:
+        """Стратегия классификатора проверок перед первой попыткой; True - вход уже выполнен"""
+        try:
+            recommendation = await asyncio.to_thread(
+                challenge_classifier.recommend_for,
+                self.current_proxy.id if self.current_proxy else None,
+                AuthConfig.SAFE_MODE_NO_PROXY
+            )
+        except Exception as e:
+            logger.error(f"Ошибка получения рекомендации для сценария {self.scenario.id}: {e}")
+            return False
+        
+        if recommendation.strategy == Recommendation.PROCEED:
+            return False
+        
+        logger.info(
+            f"Сценарий {self.scenario.id}: {recommendation.strategy} ({recommendation.reason}), "
+            f"прогноз успеха {recommendation.current:.0%} -> {recommendation.expected:.0%}"
+        )
+        
+        if recommendation.strategy == Recommendation.SWITCH_PROXY:
+            new_proxy = self.session.query(ProxyServer).filter_by(id=recommendation.proxy_id).first()
+            if new_proxy:
+                await self._try_switch_proxy(new_proxy)
+        elif recommendation.strategy == Recommendation.SAFE_MODE:
+            return await self._try_safe_mode()
+        elif recommendation.strategy == Recommendation.WAIT:
+            await self._wait_for_better_hour(recommendation)
+        return False
+    
+    async def _wait_for_better_hour(self, recommendation: Recommendation):
+        """Ожидание часа, в который входы с этими условиями проходят чаще"""
+        await self._update_message(
+            f"⏳ <b>Отложенный вход</b>\n\n"
+            f"📱 Сценарий: #{self.scenario.id}\n"
+            f"👤 Аккаунт: @{self.scenario.ig_username}\n\n"
+            f"📊 По истории входов через {recommendation.delay // 60} мин вероятность успеха "
+            f"{recommendation.expected:.0%} вместо {recommendation.current:.0%}.",
+            InlineKeyboardMarkup([[
+                InlineKeyboardButton("⚡ Попробовать сейчас", callback_data=f'retry_now_{self.scenario.id}')
+            ]])
+        )
+        
+        start_time = time.time()
+        while time.time() - start_time < recommendation.delay:
+            if captcha_confirmed.pop(f"retry_now_{self.scenario.id}", False):
+                return
+            await asyncio.sleep(5)
+    
     async def _wait_with_options(self, attempt: int):
         """Ожидание между попытками с интерактивными опциями"""
         keyboard = InlineKeyboardMarkup([
@@ -766,32 +877,36 @@ async def admin_auth_settings_menu(query):
             if proxy_dict:
                 ig_bot.set_proxy(proxy_dict['http'])
         
-        # Антидетект настройки
-        from config import INSTAGRAM_USER_AGENTS, DEVICE_SETTINGS
-        user_agent = random.choice(INSTAGRAM_USER_AGENTS)
-        device = random.choice(DEVICE_SETTINGS)
+        # Антидетект настройки: профиль с лучшей историей входов для этого прокси и часа
+        if self.auth_model is not None:
+            device, user_agent = challenge_classifier.choose_profile(
+                self.auth_model, self.current_proxy.id if self.current_proxy else None, datetime.now().hour
+            )
+        else:
+            from config import INSTAGRAM_USER_AGENTS, DEVICE_SETTINGS
+            user_agent = random.choice(INSTAGRAM_USER_AGENTS)
+            device = random.choice(DEVICE_SETTINGS)
+        self.device_model = device.get('model')
+        self.user_agent = user_agent
         
         ig_bot.set_user_agent(user_agent)
         ig_bot.set_device(device)
         
+        instrument_instagram_client(ig_bot, self.current_proxy is not None)
+        circuit_breakers.bind_client(ig_bot, self.current_proxy.id if self.current_proxy else None)
+        
         return ig_bot
     
     def _detect_challenge_type(self, error_message: str) -> ChallengeType:
-        """Определение типа проверки по сообщению об ошибке"""
-        error_lower = error_message.lower()
-        
-        if 'phone' in error_lower or 'sms' in error_lower:
-            return ChallengeType.PHONE_SMS
-        elif 'email' in error_lower:
-            return ChallengeType.EMAIL
-        elif 'device' in error_lower:
-            return ChallengeType.DEVICE_CONFIRMATION
-        elif 'photo' in error_lower or 'selfie' in error_lower:
-            return ChallengeType.PHOTO_VERIFICATION
-        elif 'suspicious' in error_lower:
-            return ChallengeType.SUSPICIOUS_LOGIN
-        
-        return ChallengeType.UNKNOWN
+        """Определение типа проверки по сообщению об ошибке, а без подсказок в нем - по истории"""
+        features = challenge_classifier.features(
+            self.current_proxy.id if self.current_proxy else None,
+            self.device_model, self.user_agent, datetime.now().hour
+        )
+        try:
+            return ChallengeType(challenge_classifier.detect(error_message, self.auth_model, features))
+        except ValueError:
+            return ChallengeType.UNKNOWN
     
     def _get_challenge_info(self) -> Dict[str, str]:
         """Получение информации о типе проверки"""
@@ -868,8 +983,9 @@ async def admin_auth_settings_menu(query):
         """Отправка стартового сообщения авторизации"""
         proxy_info = f"🌐 {self.current_proxy.name}" if self.current_proxy else "🌐 Прямое подключение"
         
-        message = await self.bot.send_message(
-            chat_id=self.chat_id,
+        message = await telegram_outbox.send_message(
+            self.bot,
+            self.chat_id,
             text=f"🚀 <b>Улучшенная авторизация v2.0</b>\n\n"
                  f"📱 Сценарий: #{self.scenario.id}\n"
                  f"👤 Аккаунт: @{self.scenario.ig_username}\n"
@@ -879,20 +995,25 @@ async def admin_auth_settings_menu(query):
                  f"🛡️ Безопасный режим: {'✅' if AuthConfig.SAFE_MODE_NO_PROXY else '❌'}",
             parse_mode='HTML'
         )
-        self.message_id = message.message_id
+        self.message_id = message.message_id if message else None
     
     async def _update_message(self, text: str, keyboard: InlineKeyboardMarkup = None):
-        """Обновление сообщения"""
-        try:
-            await self.bot.edit_message_text(
-                chat_id=self.chat_id,
-                message_id=self.message_id,
-                text=text,
-                parse_mode='HTML',
-                reply_markup=keyboard
+        """Обновление сообщения через очередь (частые правки схлопываются, вызов не ждет отправки)"""
+        if self.message_id is None:
+            message = await telegram_outbox.send_message(
+                self.bot, self.chat_id, text=text, parse_mode='HTML', reply_markup=keyboard
             )
-        except Exception as e:
-            logger.error(f"Ошибка обновления сообщения: {e}")
+            self.message_id = message.message_id if message else None
+            return
+        
+        await telegram_outbox.edit_message_text(
+            self.bot,
+            self.chat_id,
+            self.message_id,
+            text=text,
+            parse_mode='HTML',
+            reply_markup=keyboard
+        )
     
     async def _update_auth_status(self, status: str):
         """Обновление статуса авторизации"""
@@ -906,11 +1027,19 @@ async def admin_auth_settings_menu(query):
             f"⏳ Выполняется вход в Instagram..."
         )
     
+    async def _show_queue_position(self, position: int):
+        """Место сценария в очереди входов"""
+        await self._update_auth_status(f"Очередь на вход: позиция {position}")
+    
     async def _handle_auth_success(self):
         """Обработка успешной авторизации"""
         # Сохраняем клиент
         instabots[self.scenario.id] = self.ig_client
         
+        # Сессия сохраняется, чтобы после перезапуска бота обойтись без повторного входа
+        from services.recovery import SessionStore
+        SessionStore.save(self.scenario.id, self.ig_client)
+        
         # Обновляем статус в БД
         self.scenario.auth_status = 'success'
         self.scenario.error_message = None
@@ -0,0 +1,123 @@
+"""
+Общие HTTP сессии для запросов через прокси
+Одна requests.Session на адрес прокси: keep-alive соединения переживают
+повторные проверки, и подключение к прокси с авторизацией и TLS не
+повторяется на каждый запрос. Число сессий ограничено, простаивающие закрываются
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from config import HTTP_POOL_MAX_SESSIONS, HTTP_POOL_MAXSIZE, HTTP_POOL_IDLE_TIMEOUT, HTTP_CONNECT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+DIRECT = 'direct'  # Ключ сессии без прокси (API провайдеров)
+
+class HttpSessionPool:
+    """Сессии requests по адресу прокси"""
+
+    def __init__(self, max_sessions: int = HTTP_POOL_MAX_SESSIONS, pool_maxsize: int = HTTP_POOL_MAXSIZE,
+                 idle_timeout: float = HTTP_POOL_IDLE_TIMEOUT, connect_timeout: float = HTTP_CONNECT_TIMEOUT):
+        self.max_sessions = max(1, max_sessions)
+        self.pool_maxsize = max(1, pool_maxsize)
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+
+        self._sessions: OrderedDict = OrderedDict()  # ключ -> (сессия, время последнего запроса)
+        self._lock = threading.Lock()
+        self._last_eviction = time.monotonic()
+
+    def _create_session(self, proxy_url: Optional[str]):
+        import requests  # Импорт откладывается до первого запроса, чтобы не замедлять запуск бота
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        # Прокси задаются явно, переменные окружения HTTP(S)_PROXY не должны их подменять
+        session.trust_env = False
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize, max_retries=0)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        if proxy_url:
+            session.proxies = {'http': proxy_url, 'https': proxy_url}
+        return session
+
+    def get_session(self, proxy_url: Optional[str] = None):
+        """Сессия для прокси; None - прямое подключение"""
+        key = proxy_url or DIRECT
+        now = time.monotonic()
+        evicted = []
+
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry:
+                session = entry[0]
+                self._sessions.move_to_end(key)
+            else:
+                session = self._create_session(proxy_url)
+            self._sessions[key] = (session, now)
+
+            while len(self._sessions) > self.max_sessions:
+                _, (old_session, _) = self._sessions.popitem(last=False)
+                evicted.append(old_session)
+
+            if now - self._last_eviction >= self.idle_timeout / 2:
+                evicted.extend(self._pop_idle(now))
+                self._last_eviction = now
+
+        # Закрытие сокетов вне блокировки
+        for old_session in evicted:
+            old_session.close()
+        return session
+
+    def _pop_idle(self, now: float) -> list:
+        """Извлечение простаивающих сессий; вызывается под блокировкой"""
+        idle = [key for key, (_, last_used) in self._sessions.items() if now - last_used > self.idle_timeout]
+        return [self._sessions.pop(key)[0] for key in idle]
+
+    def request(self, method: str, url: str, proxy_url: Optional[str] = None, timeout=None, **kwargs):
+        """Запрос через сессию прокси
+
+        timeout - таймаут чтения или кортеж (подключение, чтение); по умолчанию
+        подключение ограничено connect_timeout.
+        """
+        if not isinstance(timeout, tuple):
+            timeout = (self.connect_timeout, timeout if timeout is not None else self.connect_timeout)
+        session = self.get_session(proxy_url)
+        return session.request(method, url, timeout=timeout, **kwargs)
+
+    def get(self, url: str, proxy_url: Optional[str] = None, timeout=None, **kwargs):
+        return self.request('GET', url, proxy_url=proxy_url, timeout=timeout, **kwargs)
+
+    def fresh_request(self, method: str, url: str, proxy_url: Optional[str] = None, timeout=None, **kwargs):
+        """Запрос по новому соединению, которое закрывается после ответа
+
+        Только для явно запрошенных холодных замеров (PROXY_CHECK_FRESH_CONNECTION):
+        проверка платит за подключение и авторизацию на прокси, а ротирующий
+        прокси может сменить выходной IP.
+        """
+        if not isinstance(timeout, tuple):
+            timeout = (self.connect_timeout, timeout if timeout is not None else self.connect_timeout)
+        headers = dict(kwargs.pop('headers', None) or {}, Connection='close')
+        session = self._create_session(proxy_url)
+        try:
+            response = session.request(method, url, timeout=timeout, headers=headers, **kwargs)
+            response.content  # Тело читается до закрытия сессии
+            return response
+        finally:
+            session.close()
+
+    def close_all(self):
+        """Закрытие всех сессий"""
+        with self._lock:
+            sessions = [session for session, _ in self._sessions.values()]
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+
+# Глобальный пул HTTP сессий
+http_pool = HttpSessionPool()
@@ -0,0 +1,179 @@
+"""
+Проверка доступности Instagram через прокси
+Ответ читается потоком: строка статуса, заголовки и не больше
+INSTAGRAM_PROBE_MAX_BYTES тела. Адреса Instagram запрашиваются одновременно,
+первый подтвержденный ответ отменяет остальные запросы
+"""
+
+import asyncio
+import logging
+import ssl
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from services.proxy_probe import proxy_prober
+from config import INSTAGRAM_PROBE_TIMEOUT, INSTAGRAM_PROBE_MAX_BYTES, INSTAGRAM_PROBE_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+INSTAGRAM_PROBE_URLS = (
+    'https://www.instagram.com/',
+    'https://i.instagram.com/api/v1/users/web_info/',
+)
+
+# Instagram отвечает, но этот IP не пускает
+BLOCKED_STATUSES = {403, 429}
+
+MAX_HEADER_LINES = 100
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+class InstagramProbe:
+    """Проверка прокси запросами к Instagram"""
+
+    def __init__(self, timeout: float = INSTAGRAM_PROBE_TIMEOUT, max_bytes: int = INSTAGRAM_PROBE_MAX_BYTES,
+                 concurrency: int = INSTAGRAM_PROBE_CONCURRENCY, urls: Tuple[str, ...] = INSTAGRAM_PROBE_URLS):
+        self.timeout = timeout
+        self.max_bytes = max(0, max_bytes)
+        self.concurrency = max(1, concurrency)
+        self.urls = urls
+        self._ssl_context = ssl.create_default_context()
+
+    async def fetch(self, proxy: Dict, url: str) -> Dict:
+        """Начало ответа на GET url через прокси: {status, headers, body, ttfb}"""
+        return await asyncio.wait_for(self._fetch(proxy, url), timeout=self.timeout)
+
+    async def _fetch(self, proxy: Dict, url: str) -> Dict:
+        parts = urlsplit(url)
+        host = parts.hostname
+        port = parts.port or 443
+        path = parts.path or '/'
+        if parts.query:
+            path += f"?{parts.query}"
+
+        started = time.perf_counter()
+        reader, writer, _ = await proxy_prober.open_tunnel(proxy, host, port, timeout=self.timeout)
+        try:
+            await writer.start_tls(self._ssl_context, server_hostname=host)
+
+            # identity - иначе маркер пришлось бы искать в сжатом теле
+            writer.write(
+                f"GET {path} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: {USER_AGENT}\r\n"
+                f"Accept: */*\r\nAccept-Encoding: identity\r\nConnection: close\r\n\r\n".encode()
+            )
+            await writer.drain()
+
+            status_line = await reader.readline()
+            ttfb = time.perf_counter() - started
+            status_parts = status_line.decode('latin-1').split()
+            if len(status_parts) < 2 or not status_parts[1].isdigit():
+                raise ConnectionError(f"Некорректный ответ: {status_line[:50]!r}")
+
+            headers: List[Tuple[str, str]] = []
+            for _ in range(MAX_HEADER_LINES):
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers.append((name.strip().lower(), value.strip()))
+
+            response = {'status': int(status_parts[1]), 'headers': headers, 'body': b'', 'ttfb': ttfb}
+
+            # Тело нужно только если заголовки не выдали Instagram
+            if self.max_bytes and not self.has_instagram_headers(headers):
+                response['body'] = await reader.read(self.max_bytes)
+            return response
+        finally:
+            await proxy_prober.close_writer(writer)
+
+    @staticmethod
+    def has_instagram_headers(headers: List[Tuple[str, str]]) -> bool:
+        """Служебные заголовки и cookies Instagram"""
+        for name, value in headers:
+            if name.startswith(('x-ig-', 'ig-set-')):
+                return True
+            if name == 'set-cookie' and value.startswith(('csrftoken=', 'ig_did=', 'mid=')):
+                return True
+        return False
+
+    @staticmethod
+    def is_instagram(response: Dict) -> bool:
+        """Ответ пришел от Instagram, а не от заглушки прокси или провайдера"""
+        return (
+            InstagramProbe.has_instagram_headers(response['headers'])
+            or b'instagram' in response['body'].lower()
+        )
+
+    async def probe(self, proxy: Dict) -> Dict:
+        """Проверка одного прокси: {reachable, url, status, ttfb, error}"""
+        result = {'reachable': False, 'url': None, 'status': None, 'ttfb': None, 'error': None}
+        url_by_task = {asyncio.create_task(self.fetch(proxy, url)): url for url in self.urls}
+        pending = set(url_by_task)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        response = task.result()
+                    except asyncio.TimeoutError:
+                        error = result['error'] or "Таймаут"
+                    except Exception as e:
+                        error = str(e) or type(e).__name__
+                    else:
+                        error = None if self.is_instagram(response) else (
+                            f"HTTP {response['status']}: ответ не от Instagram"
+                        )
+
+                    if error:
+                        # Ответ Instagram с блокировкой важнее сетевой ошибки второго адреса
+                        if result['status'] is None:
+                            result['error'] = error
+                        continue
+
+                    result.update(url=url_by_task[task], status=response['status'], ttfb=response['ttfb'])
+                    if response['status'] in BLOCKED_STATUSES:
+                        result['error'] = f"Instagram отклоняет запросы с этого IP (HTTP {response['status']})"
+                        continue
+
+                    result['reachable'] = True
+                    result['error'] = None
+                    return result
+            return result
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def probe_many(self, proxies: List[Dict]) -> Dict[int, Dict]:
+        """Проверка списка прокси не больше concurrency одновременно"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def check(proxy: Dict):
+            async with semaphore:
+                return proxy['id'], await self.probe(proxy)
+
+        return dict(await asyncio.gather(*[check(proxy) for proxy in proxies]))
+
+    async def check_proxies(self, proxy_ids: Optional[List[int]] = None) -> Dict:
+        """Проверка активных прокси; результаты в БД не пишутся"""
+        proxies = await asyncio.to_thread(proxy_prober.load_proxies, proxy_ids)
+        results = await self.probe_many(proxies)
+
+        reachable = sum(1 for result in results.values() if result['reachable'])
+        blocked = sum(1 for result in results.values() if result['status'] in BLOCKED_STATUSES)
+        logger.info(
+            f"Проверка Instagram: {reachable} из {len(results)} прокси доступны, {blocked} заблокированы"
+        )
+        return {
+            'checked': len(results),
+            'reachable': reachable,
+            'blocked': blocked,
+            'failed': len(results) - reachable,
+            'proxies': {proxy['id']: proxy['name'] for proxy in proxies},
+            'results': results
+        }
+
+
+# Глобальный экземпляр проверки Instagram
+instagram_probe = InstagramProbe()
@@ -0,0 +1,205 @@
+"""
+Очередь входов в Instagram
+Все попытки входа проходят через общую очередь: не больше LOGIN_MAX_CONCURRENT
+одновременно, не больше LOGIN_PER_EXIT_IP через один выходной IP и не чаще
+одного входа в LOGIN_MIN_SPACING секунд с одного IP. Перезапуски пользователем
+обслуживаются раньше фонового восстановления
+"""
+
+import asyncio
+import bisect
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from database.connection import Session
+from services.proxy_exit_ip import ExitIPTracker
+from config import LOGIN_MAX_CONCURRENT, LOGIN_PER_EXIT_IP, LOGIN_MIN_SPACING
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0  # Запуск и перезапуск из бота - пользователь ждет
+PRIORITY_BACKGROUND = 10  # Восстановление после рестарта, автоматические повторы
+
+POSITION_UPDATE_INTERVAL = 10  # Как часто сообщать ожидающему его место в очереди (сек)
+
+
+class LoginTicket:
+    """Заявка на вход"""
+
+    def __init__(self, scenario_id: int, group: str, priority: int, seq: int):
+        self.scenario_id = scenario_id
+        self.group = group
+        self.priority = priority
+        self.seq = seq
+        self.enqueued_at = time.monotonic()
+        self.granted: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    @property
+    def key(self) -> Tuple[int, int]:
+        return self.priority, self.seq
+
+
+class LoginOrchestrator:
+    """Ограничение одновременных входов и их частоты по выходным IP"""
+
+    def __init__(self, max_concurrent: int = LOGIN_MAX_CONCURRENT, per_exit_ip: int = LOGIN_PER_EXIT_IP,
+                 min_spacing: float = LOGIN_MIN_SPACING):
+        self.max_concurrent = max(1, max_concurrent)
+        self.per_exit_ip = max(1, per_exit_ip)
+        self.min_spacing = min_spacing
+
+        self._waiting: List[Tuple[Tuple[int, int], LoginTicket]] = []  # отсортировано по (приоритет, номер)
+        self._active: Dict[str, int] = {}
+        self._active_total = 0
+        self._last_login: Dict[str, float] = {}
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.stats = {'granted': 0, 'max_wait': 0.0}
+
+    @staticmethod
+    def _resolve_group(proxy_id: Optional[int]) -> str:
+        """Группа выходного IP прокси; без прокси - IP сервера"""
+        if proxy_id is None:
+            return 'direct'
+        session = Session()
+        try:
+            return ExitIPTracker.group_of(ExitIPTracker.get_group_keys(session), proxy_id)
+        except Exception as e:
+            logger.error(f"Ошибка определения выходного IP прокси {proxy_id}: {e}")
+            return f"proxy:{proxy_id}"
+        finally:
+            session.close()
+
+    def position(self, ticket: LoginTicket) -> int:
+        """Место в очереди, начиная с 1; 0 - вход уже разрешен"""
+        index = bisect.bisect_left(self._waiting, ticket.key, key=lambda item: item[0])
+        if index < len(self._waiting) and self._waiting[index][1] is ticket:
+            return index + 1
+        return 0
+
+    def get_status(self) -> Dict:
+        """Состояние очереди для админ-панели"""
+        return {
+            'active': self._active_total,
+            'waiting': len(self._waiting),
+            'waiting_interactive': sum(1 for key, _ in self._waiting if key[0] <= PRIORITY_INTERACTIVE),
+            'max_concurrent': self.max_concurrent,
+            'granted': self.stats['granted'],
+            'max_wait': round(self.stats['max_wait'], 1)
+        }
+
+    def _can_start(self, group: str, now: float) -> Tuple[bool, float]:
+        """(можно начать, через сколько секунд освободится интервал группы)"""
+        if self._active.get(group, 0) >= self.per_exit_ip:
+            return False, 0.0
+        remaining = self.min_spacing - (now - self._last_login.get(group, float('-inf')))
+        if remaining > 0:
+            return False, remaining
+        return True, 0.0
+
+    def _dispatch(self):
+        """Выдача свободных слотов по очереди приоритетов
+
+        Заявка, упершаяся в лимит своего IP, не задерживает заявки с других IP.
+        """
+        self._timer = None
+        now = time.monotonic()
+        next_check = None
+        index = 0
+        while index < len(self._waiting) and self._active_total < self.max_concurrent:
+            ticket = self._waiting[index][1]
+            if ticket.granted.done():
+                # Ожидавший отменил заявку
+                del self._waiting[index]
+                continue
+
+            allowed, retry_in = self._can_start(ticket.group, now)
+            if not allowed:
+                if retry_in:
+                    next_check = retry_in if next_check is None else min(next_check, retry_in)
+                index += 1
+                continue
+
+            del self._waiting[index]
+            self._active[ticket.group] = self._active.get(ticket.group, 0) + 1
+            self._active_total += 1
+            self._last_login[ticket.group] = now
+            self.stats['granted'] += 1
+            self.stats['max_wait'] = max(self.stats['max_wait'], now - ticket.enqueued_at)
+            ticket.granted.set_result(True)
+
+        if next_check is not None:
+            self._timer = asyncio.get_running_loop().call_later(next_check, self._dispatch)
+
+    def _schedule_dispatch(self):
+        if self._timer:
+            self._timer.cancel()
+        self._dispatch()
+
+    def _release(self, ticket: LoginTicket):
+        count = self._active.get(ticket.group, 0) - 1
+        if count > 0:
+            self._active[ticket.group] = count
+        else:
+            self._active.pop(ticket.group, None)
+        self._active_total -= 1
+        self._schedule_dispatch()
+
+    def _forget(self, ticket: LoginTicket):
+        """Удаление заявки, которая так и не получила слот"""
+        index = bisect.bisect_left(self._waiting, ticket.key, key=lambda item: item[0])
+        if index < len(self._waiting) and self._waiting[index][1] is ticket:
+            del self._waiting[index]
+
+    @asynccontextmanager
+    async def slot(self, scenario_id: int, proxy_id: Optional[int], priority: int = PRIORITY_INTERACTIVE,
+                   on_position: Optional[Callable[[int], Awaitable]] = None):
+        """Ожидание очереди и удержание слота на время входа
+
+        on_position(позиция) вызывается, пока заявка ждет, при изменении места в очереди.
+        """
+        group = await asyncio.to_thread(self._resolve_group, proxy_id)
+        ticket = LoginTicket(scenario_id, group, priority, next(self._seq))
+        bisect.insort(self._waiting, (ticket.key, ticket), key=lambda item: item[0])
+        self._schedule_dispatch()
+
+        granted = False
+        try:
+            last_position = None
+            while not ticket.granted.done():
+                position = self.position(ticket)
+                if on_position and position and position != last_position:
+                    last_position = position
+                    try:
+                        await on_position(position)
+                    except Exception as e:
+                        logger.debug(f"Не удалось сообщить позицию в очереди входа: {e}")
+                try:
+                    await asyncio.wait_for(asyncio.shield(ticket.granted), timeout=POSITION_UPDATE_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+            granted = True
+        finally:
+            if not granted:
+                # Отмена во время ожидания: слот мог быть выдан в тот же момент
+                if ticket.granted.done() and not ticket.granted.cancelled():
+                    self._release(ticket)
+                else:
+                    ticket.granted.cancel()
+                    self._forget(ticket)
+
+        if last_position:
+            logger.info(
+                f"Вход сценария {scenario_id} после {time.monotonic() - ticket.enqueued_at:.0f} сек в очереди"
+            )
+        try:
+            yield
+        finally:
+            self._release(ticket)
+
+
+# Глобальная очередь входов
+login_orchestrator = LoginOrchestrator()
@@ -0,0 +1,464 @@
+"""
+Метрики бота в формате Prometheus
+Счетчики, gauge и гистограммы без внешних зависимостей, отдаются по HTTP (/metrics)
+"""
+
+import asyncio
+import contextvars
+import logging
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from config import METRICS_HOST, METRICS_PORT
+
+logger = logging.getLogger(__name__)
+
+# Счетчик SQL запросов текущего вызова: профилировщик и бенчмарки кладут сюда список [0],
+# дочерние задачи наследуют его и считают в него же
+query_counter: contextvars.ContextVar = contextvars.ContextVar('query_counter', default=None)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class _Timer:
+    """Контекстный менеджер замера времени для гистограммы"""
+
+    def __init__(self, child):
+        self.child = child
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.started)
+
+class _Metric:
+    """Базовый класс метрики с метками"""
+
+    type_name = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        values = tuple(str(value) for value in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name}: ожидались метки {self.labelnames}")
+        return self._child(values)
+
+    def _child(self, key: Tuple[str, ...]):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_child(key, value))
+        return lines
+
+    def _render_child(self, key, value) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+class _CounterChild:
+    def __init__(self, metric: 'Counter', key):
+        self._metric = metric
+        self._key = key
+
+    def inc(self, amount: float = 1):
+        with self._metric._lock:
+            self._metric._values[self._key] = self._metric._values.get(self._key, 0) + amount
+
+class Counter(_Metric):
+    """Монотонный счетчик"""
+
+    type_name = 'counter'
+
+    def _child(self, key):
+        return _CounterChild(self, key)
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+class _GaugeChild:
+    def __init__(self, metric: 'Gauge', key):
+        self._metric = metric
+        self._key = key
+
+    def set(self, value: float):
+        with self._metric._lock:
+            self._metric._values[self._key] = value
+
+    def inc(self, amount: float = 1):
+        with self._metric._lock:
+            self._metric._values[self._key] = self._metric._values.get(self._key, 0) + amount
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+class Gauge(_Metric):
+    """Текущее значение"""
+
+    type_name = 'gauge'
+
+    def _child(self, key):
+        return _GaugeChild(self, key)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+class _HistogramState:
+    def __init__(self, bucket_count: int):
+        self.buckets = [0] * bucket_count
+        self.sum = 0.0
+        self.count = 0
+
+class _HistogramChild:
+    def __init__(self, metric: 'Histogram', key):
+        self._metric = metric
+        self._key = key
+
+    def observe(self, value: float):
+        metric = self._metric
+        with metric._lock:
+            state = metric._values.get(self._key)
+            if state is None:
+                state = metric._values[self._key] = _HistogramState(len(metric.buckets))
+            for index, bound in enumerate(metric.buckets):
+                if value <= bound:
+                    state.buckets[index] += 1
+                    break
+            state.sum += value
+            state.count += 1
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+class Histogram(_Metric):
+    """Распределение значений по корзинам"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def _child(self, key):
+        return _HistogramChild(self, key)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _render_child(self, key, state: _HistogramState) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, state.buckets):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, ('le', _format_value(bound)))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(state.sum)}")
+        lines.append(f"{self.name}_count{labels} {state.count}")
+        return lines
+
+class MetricsRegistry:
+    """Реестр метрик и функций, обновляющих gauge при каждом опросе"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.error(f"Ошибка сбора метрик {getattr(collector, '__name__', collector)}: {e}")
+
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Глобальный реестр
+registry = MetricsRegistry()
+
+# === МЕТРИКИ ===
+
+INSTAGRAM_REQUEST_SECONDS = registry.histogram(
+    'instagram_request_seconds', 'Время ответа Instagram API', ('endpoint', 'connection')
+)
+INSTAGRAM_REQUESTS = registry.counter(
+    'instagram_requests_total', 'Запросы к Instagram API', ('endpoint', 'connection', 'status')
+)
+TELEGRAM_HANDLER_SECONDS = registry.histogram(
+    'telegram_handler_seconds', 'Время обработки апдейта', ('handler', 'route')
+)
+TELEGRAM_HANDLER_ERRORS = registry.counter(
+    'telegram_handler_errors_total', 'Исключения в обработчиках', ('handler', 'route')
+)
+DB_QUERY_SECONDS = registry.histogram(
+    'db_query_seconds', 'Время SQL запросов', ('operation',),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+AUTH_ATTEMPTS = registry.counter(
+    'instagram_auth_attempts_total', 'Попытки авторизации по результату', ('result',)
+)
+PENDING_MESSAGES = registry.gauge(
+    'pending_messages', 'Сообщения в очереди на отправку'
+)
+RUNTIME_OBJECTS = registry.gauge(
+    'bot_runtime_objects', 'Размер глобальных структур в памяти', ('name',)
+)
+PROXIES = registry.gauge(
+    'proxy_servers', 'Прокси по состоянию', ('state',)
+)
+
+
+# === ИНСТРУМЕНТАЦИЯ ===
+
+_ID_PATTERN = re.compile(r'(?<=[/_])\d+(?=[/_]|$)')
+
+def normalize_route(value: str) -> str:
+    """Маршрут без идентификаторов, чтобы не плодить метки"""
+    return _ID_PATTERN.sub('{id}', value or '')
+
+# Шаблоны эндпоинтов Instagram; все остальные пути попадают в 'other'.
+# Имена пользователей, коды публикаций и nonce проверок в метки не попадают
+_INSTAGRAM_ENDPOINTS = [(re.compile(pattern), template) for pattern, template in (
+    (r'^accounts/login/', 'accounts/login'),
+    (r'^accounts/logout/', 'accounts/logout'),
+    (r'^accounts/current_user/', 'accounts/current_user'),
+    (r'^accounts/[^/]+/', 'accounts/other'),
+    (r'^challenge/', 'challenge'),
+    (r'^media/[^/]+/comments/', 'media/{id}/comments'),
+    (r'^media/[^/]+/comment/', 'media/{id}/comment'),
+    (r'^media/[^/]+/info/', 'media/{id}/info'),
+    (r'^media/[^/]+/likers/', 'media/{id}/likers'),
+    (r'^users/[^/]+/usernameinfo/', 'users/{username}/usernameinfo'),
+    (r'^users/[^/]+/info/', 'users/{id}/info'),
+    (r'^direct_v2/threads/broadcast/', 'direct_v2/threads/broadcast'),
+    (r'^direct_v2/threads/', 'direct_v2/threads'),
+    (r'^direct_v2/', 'direct_v2/inbox'),
+    (r'^friendships/', 'friendships'),
+    (r'^feed/', 'feed'),
+    (r'^(qe|launcher)/sync/', 'sync'),
+    (r'^graphql/', 'graphql'),
+    (r'^oembed', 'oembed'),
+)]
+
+def instagram_endpoint(path: str) -> str:
+    """Шаблон эндпоинта Instagram из фиксированного списка"""
+    path = re.sub(r'^(api/v1/)?', '', (path or '').split('?')[0].lstrip('/'))
+    for pattern, template in _INSTAGRAM_ENDPOINTS:
+        if pattern.match(path):
+            return template
+    return 'other'
+
+def update_route(update) -> str:
+    """Маршрут апдейта: данные кнопки, команда или тип сообщения"""
+    if getattr(update, 'callback_query', None) and update.callback_query.data:
+        return normalize_route(update.callback_query.data)
+    message = getattr(update, 'message', None)
+    if message and message.text:
+        if message.text.startswith('/'):
+            return message.text.split()[0].split('@')[0]
+        return 'text'
+    return 'other'
+
+def instrument_handler(callback, name: Optional[str] = None):
+    """Обертка обработчика Telegram с замером времени по маршруту"""
+    handler_name = name or callback.__name__
+
+    async def wrapper(update, context):
+        route = update_route(update)
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception:
+            TELEGRAM_HANDLER_ERRORS.labels(handler_name, route).inc()
+            raise
+        finally:
+            TELEGRAM_HANDLER_SECONDS.labels(handler_name, route).observe(time.perf_counter() - started)
+
+    wrapper.__name__ = handler_name
+    wrapper.__doc__ = callback.__doc__
+    wrapper.__wrapped__ = callback
+    return wrapper
+
+def instrument_instagram_client(client, proxied: bool = False):
+    """Замер запросов instagrapi через response hook сессий requests
+
+    Прокси в метках не различаются (их могут быть десятки тысяч) - только
+    'proxied'/'direct'; разбивка по прокси есть в ProxyPerformance.
+    """
+    connection = 'proxied' if proxied else 'direct'
+
+    def on_response(response, *args, **kwargs):
+        endpoint = instagram_endpoint(response.request.path_url)
+        INSTAGRAM_REQUEST_SECONDS.labels(endpoint, connection).observe(response.elapsed.total_seconds())
+        INSTAGRAM_REQUESTS.labels(endpoint, connection, response.status_code).inc()
+
+    for session in (getattr(client, 'private', None), getattr(client, 'public', None)):
+        if session is not None:
+            session.hooks.setdefault('response', []).append(on_response)
+    return client
+
+def instrument_engine(engine):
+    """Время и число SQL запросов через события движка (query_counter)"""
+    from sqlalchemy import event
+
+    if getattr(engine, '_metrics_instrumented', False):
+        return
+
+    # Время старта хранится в контексте выполнения: after_cursor_execute не вызывается
+    # для упавшего запроса, и общий стек соединения сдвигался бы после каждой ошибки
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._metrics_started = time.perf_counter()
+        counter = query_counter.get()
+        if counter is not None:
+            counter[0] += 1
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_metrics_started', None)
+        if started is None:
+            return
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement else 'UNKNOWN'
+        DB_QUERY_SECONDS.labels(operation).observe(time.perf_counter() - started)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+    engine._metrics_instrumented = True
+
+
+# === СБОР ЗНАЧЕНИЙ ПРИ ОПРОСЕ ===
+
+def collect_runtime_objects():
+    from config import instabots, tasks, captcha_confirmed, auth_sessions
+
+    RUNTIME_OBJECTS.labels('instabots').set(len(instabots))
+    RUNTIME_OBJECTS.labels('tasks').set(len(tasks))
+    RUNTIME_OBJECTS.labels('captcha_confirmed').set(len(captcha_confirmed))
+    RUNTIME_OBJECTS.labels('auth_sessions').set(len(auth_sessions))
+
+def collect_database_gauges():
+    from sqlalchemy import func
+    from database.models import PendingMessage, ProxyServer
+    from database.connection import Session
+
+    session = Session()
+    try:
+        PENDING_MESSAGES.set(session.query(func.count(PendingMessage.id)).scalar() or 0)
+
+        rows = session.query(
+            ProxyServer.is_active, ProxyServer.is_working, func.count(ProxyServer.id)
+        ).group_by(ProxyServer.is_active, ProxyServer.is_working).all()
+
+        counts = {'working': 0, 'failed': 0, 'inactive': 0}
+        for is_active, is_working, count in rows:
+            if not is_active:
+                counts['inactive'] += count
+            elif is_working:
+                counts['working'] += count
+            else:
+                counts['failed'] += count
+        for state, count in counts.items():
+            PROXIES.labels(state).set(count)
+    finally:
+        session.close()
+
+registry.add_collector(collect_runtime_objects)
+registry.add_collector(collect_database_gauges)
+
+
+# === HTTP ЭНДПОИНТ ===
+
+async def _handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        # Заголовки запроса не нужны, но их нужно дочитать
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout=5)
+            if line in (b'\r\n', b'\n', b''):
+                break
+
+        parts = request_line.decode('latin-1').split()
+        path = parts[1] if len(parts) > 1 else '/'
+
+        if path.split('?')[0] == '/metrics':
+            # Сбор gauge делает запросы к БД - выполняем вне event loop
+            body = (await asyncio.to_thread(registry.render)).encode()
+            status = '200 OK'
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        else:
+            body = b'Not Found\n'
+            status = '404 Not Found'
+            content_type = 'text/plain'
+
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except Exception as e:
+        logger.debug(f"Ошибка обработки запроса метрик: {e}")
+    finally:
+        writer.close()
+
+async def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT):
+    """Запуск HTTP эндпоинта /metrics в текущем event loop"""
+    from database.connection import engine
+
+    instrument_engine(engine)
+    server = await asyncio.start_server(_handle_connection, host, port)
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return server
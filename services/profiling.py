@@ -0,0 +1,285 @@
+"""
+Профилирование обработчиков Telegram и фоновых задач
+Время выполнения, время блокировки event loop, число запросов к БД,
+журнал медленных вызовов со стеком и выборочный cProfile/pyinstrument
+"""
+
+import cProfile
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime
+from typing import Dict, Optional
+
+from config import (
+    PROFILING_SLOW_THRESHOLD_MS, PROFILING_BLOCK_THRESHOLD_MS,
+    PROFILING_SAMPLE_RATE, PROFILING_PROFILER, PROFILING_DIR
+)
+from services.metrics import query_counter, instrument_engine
+
+try:
+    from pyinstrument import Profiler as PyinstrumentProfiler
+except ImportError:
+    PyinstrumentProfiler = None
+
+logger = logging.getLogger(__name__)
+
+# cProfile не допускает двух активных профилировщиков в одном потоке
+_profiler_busy = threading.Lock()
+
+class CallStats:
+    """Статистика одного вызова обработчика или задачи"""
+
+    def __init__(self, kind: str, name: str):
+        self.kind = kind
+        self.name = name
+        self.started = time.perf_counter()
+        self.blocking = 0.0          # Суммарное время шагов корутины в event loop
+        self.max_step = 0.0          # Самый долгий непрерывный шаг
+        self.queries = 0
+        self.step_started: Optional[float] = None
+        self.thread_id = threading.get_ident()
+        self.coro = None
+        self.block_stack: Optional[str] = None
+        self.await_stack: Optional[str] = None
+
+    @property
+    def wall(self) -> float:
+        return time.perf_counter() - self.started
+
+class _TimedCoroutine:
+    """Пошаговое выполнение корутины с замером времени каждого шага
+
+    Время между send() и следующим yield - это время, когда корутина
+    занимала event loop; ожидание ввода-вывода в него не входит.
+    """
+
+    def __init__(self, coro, stats: CallStats, profiler: Optional[cProfile.Profile] = None):
+        self.coro = coro
+        self.stats = stats
+        self.profiler = profiler
+        stats.coro = coro
+
+    def __await__(self):
+        coro = self.coro
+        stats = self.stats
+        value, error = None, None
+
+        while True:
+            stats.step_started = time.perf_counter()
+            if self.profiler:
+                self.profiler.enable()
+            try:
+                if error is None:
+                    yielded = coro.send(value)
+                else:
+                    yielded = coro.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                if self.profiler:
+                    self.profiler.disable()
+                step = time.perf_counter() - stats.step_started
+                stats.step_started = None
+                stats.blocking += step
+                stats.max_step = max(stats.max_step, step)
+
+            try:
+                value, error = (yield yielded), None
+            except BaseException as e:
+                value, error = None, e
+
+
+class SlowCallWatchdog:
+    """Фоновый поток, снимающий стек с долгих вызовов, пока они еще выполняются"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self._active: Dict[int, CallStats] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def track(self, stats: CallStats):
+        with self._lock:
+            self._active[id(stats)] = stats
+        if not self._thread:
+            self._thread = threading.Thread(target=self._run, name='profiling-watchdog', daemon=True)
+            self._thread.start()
+
+    def untrack(self, stats: CallStats):
+        with self._lock:
+            self._active.pop(id(stats), None)
+
+    def _run(self):
+        block_threshold = PROFILING_BLOCK_THRESHOLD_MS / 1000
+        slow_threshold = PROFILING_SLOW_THRESHOLD_MS / 1000
+
+        while True:
+            time.sleep(self.interval)
+            now = time.perf_counter()
+            with self._lock:
+                active = list(self._active.values())
+
+            for stats in active:
+                try:
+                    step_started = stats.step_started
+                    if step_started and not stats.block_stack and now - step_started > block_threshold:
+                        # Корутина держит event loop - снимаем стек потока loop
+                        frame = sys._current_frames().get(stats.thread_id)
+                        if frame is not None:
+                            stats.block_stack = ''.join(traceback.format_stack(frame))
+                    elif not step_started and not stats.await_stack and now - stats.started > slow_threshold:
+                        # Корутина ждет - запоминаем, на каком await она стоит
+                        stats.await_stack = _format_await_chain(stats.coro)
+                except Exception as e:
+                    logger.debug(f"Ошибка снятия стека: {e}")
+
+def _format_await_chain(coro) -> Optional[str]:
+    """Цепочка await приостановленной корутины"""
+    lines = []
+    depth = 0
+    while coro is not None and depth < 50:
+        frame = getattr(coro, 'cr_frame', None) or getattr(coro, 'gi_frame', None)
+        if frame is not None:
+            lines.append(f'  File "{frame.f_code.co_filename}", line {frame.f_lineno}, in {frame.f_code.co_name}\n')
+        coro = getattr(coro, 'cr_await', None) or getattr(coro, 'gi_yieldfrom', None)
+        depth += 1
+    return ''.join(lines) or None
+
+
+_watchdog = SlowCallWatchdog()
+
+
+# === ПРОФИЛИРОВАНИЕ ===
+
+def _should_sample() -> bool:
+    return PROFILING_SAMPLE_RATE > 0 and random.random() < PROFILING_SAMPLE_RATE
+
+def _profile_path(name: str, extension: str) -> str:
+    os.makedirs(PROFILING_DIR, exist_ok=True)
+    return os.path.join(PROFILING_DIR, f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.{extension}")
+
+def _log_call(stats: CallStats, error: Optional[BaseException]):
+    wall_ms = stats.wall * 1000
+    blocking_ms = stats.blocking * 1000
+    summary = (
+        f"{stats.kind} {stats.name}: {wall_ms:.0f} мс, блокировка loop {blocking_ms:.0f} мс "
+        f"(макс. шаг {stats.max_step * 1000:.0f} мс), запросов к БД {stats.queries}"
+    )
+    if error is not None:
+        summary += f", завершился ошибкой {type(error).__name__}"
+
+    if stats.max_step * 1000 > PROFILING_BLOCK_THRESHOLD_MS:
+        logger.warning(
+            f"⚠️ Блокировка event loop в {summary}" +
+            (f"\nСтек во время блокировки:\n{stats.block_stack}" if stats.block_stack else "")
+        )
+    elif wall_ms > PROFILING_SLOW_THRESHOLD_MS:
+        logger.warning(
+            f"🐢 Медленный вызов {summary}" +
+            (f"\nОжидание на:\n{stats.await_stack}" if stats.await_stack else "")
+        )
+    else:
+        logger.debug(summary)
+
+async def _run_profiled(kind: str, name: str, func, *args):
+    stats = CallStats(kind, name)
+    counter = [0]
+    token = query_counter.set(counter)
+
+    profiler = None
+    pyinstrument = None
+    sampled = _should_sample() and _profiler_busy.acquire(blocking=False)
+    if sampled:
+        if PROFILING_PROFILER == 'pyinstrument' and PyinstrumentProfiler is not None:
+            pyinstrument = PyinstrumentProfiler(async_mode='enabled')
+            pyinstrument.start()
+        else:
+            profiler = cProfile.Profile()
+
+    _watchdog.track(stats)
+    error = None
+    try:
+        return await _TimedCoroutine(func(*args), stats, profiler)
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _watchdog.untrack(stats)
+        query_counter.reset(token)
+        stats.queries = counter[0]
+
+        if sampled:
+            try:
+                if pyinstrument is not None:
+                    pyinstrument.stop()
+                    path = _profile_path(name, 'html')
+                    with open(path, 'w', encoding='utf-8') as f:
+                        f.write(pyinstrument.output_html())
+                else:
+                    path = _profile_path(name, 'prof')
+                    profiler.dump_stats(path)
+                logger.info(f"Профиль {kind} {name} сохранен: {path}")
+            except Exception as e:
+                logger.error(f"Ошибка сохранения профиля {name}: {e}")
+            finally:
+                _profiler_busy.release()
+
+        _log_call(stats, error)
+
+def profile_handler(callback, name: Optional[str] = None):
+    """Обертка обработчика Telegram (update, context)"""
+    handler_name = name or getattr(callback, '__name__', repr(callback))
+
+    async def wrapper(update, context):
+        return await _run_profiled('handler', handler_name, callback, update, context)
+
+    wrapper.__name__ = handler_name
+    wrapper.__doc__ = callback.__doc__
+    wrapper.__wrapped__ = callback
+    return wrapper
+
+def profile_job(callback, name: Optional[str] = None):
+    """Обертка фоновой задачи job_queue (context)"""
+    job_name = name or getattr(callback, '__name__', repr(callback))
+
+    async def wrapper(context):
+        return await _run_profiled('job', job_name, callback, context)
+
+    wrapper.__name__ = job_name
+    wrapper.__doc__ = callback.__doc__
+    wrapper.__wrapped__ = callback
+    return wrapper
+
+def instrument_application(application):
+    """Обертка всех зарегистрированных обработчиков и задач job_queue"""
+    from database.connection import engine
+
+    # Подсчет запросов в профилируемых вызовах - общий слушатель движка из metrics
+    instrument_engine(engine)
+
+    handlers_count = 0
+    for group_handlers in application.handlers.values():
+        for handler in group_handlers:
+            if not getattr(handler.callback, '_profiled', False):
+                handler.callback = profile_handler(handler.callback)
+                handler.callback._profiled = True
+                handlers_count += 1
+
+    jobs_count = 0
+    if application.job_queue:
+        for job in application.job_queue.jobs():
+            if not getattr(job.callback, '_profiled', False):
+                job.callback = profile_job(job.callback, job.name)
+                job.callback._profiled = True
+                jobs_count += 1
+
+    logger.info(
+        f"Профилирование включено: {handlers_count} обработчиков, {jobs_count} задач, "
+        f"порог {PROFILING_SLOW_THRESHOLD_MS} мс, блокировка {PROFILING_BLOCK_THRESHOLD_MS} мс, "
+        f"выборка {PROFILING_SAMPLE_RATE:.0%}"
+    )
@@ -4,12 +4,11 @@
 """
 
 import logging
-import requests
 import json
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime, timedelta
 
-from config import cipher
+from config import cipher, PROXY_CHECK_URL, PROXY_922_API_URL, PROVIDER_SYNC_PAGE_SIZE
 from database.models import ProxyServer
 from database.connection import Session
 from services.proxy_manager import ProxyManager
@@ -31,7 +30,7 @@ class Proxy922Manager:
         self.api_key = api_key
         self.username = username
         self.password = password
-        self.base_url = "https://www.922s5.com/api"  # Примерный URL API
+        self.base_url = PROXY_922_API_URL.rstrip('/')
         
     @staticmethod
     def parse_proxy_list(proxy_list_text: str) -> List[Dict]:
@@ -89,29 +88,48 @@ class Proxy922Manager:
         
         return proxies
     
+    def fetch_proxy_page(self, page: int = 1, per_page: int = PROVIDER_SYNC_PAGE_SIZE,
+                         headers: Optional[Dict] = None) -> Tuple[int, Dict, Dict]:
+        """
+        Одна страница списка прокси
+        
+        Ожидаемый ответ: {"proxies": [{"host", "port", "username", "password", "type"}], "page": 1, "pages": N}
+        
+        Returns:
+            (HTTP статус, данные страницы, заголовки ответа)
+        """
+        from services.http_pool import http_pool
+        
+        request_headers = {'Content-Type': 'application/json'}
+        if self.api_key:
+            request_headers['Authorization'] = f'Bearer {self.api_key}'
+        request_headers.update(headers or {})
+        
+        response = http_pool.get(
+            f"{self.base_url}/proxies",
+            params={'page': page, 'per_page': per_page},
+            headers=request_headers,
+            timeout=30
+        )
+        data = response.json() if response.status_code == 200 else {}
+        return response.status_code, data, dict(response.headers)
+    
     def get_proxy_list_from_api(self) -> List[Dict]:
         """
-        Получение списка прокси через API (если доступно)
+        Получение полного списка прокси через API (все страницы)
         """
         try:
-            headers = {
-                'Authorization': f'Bearer {self.api_key}' if self.api_key else None,
-                'Content-Type': 'application/json'
-            }
-            
-            # Примерный запрос к API
-            response = requests.get(
-                f"{self.base_url}/proxies",
-                headers=headers,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                return data.get('proxies', [])
-            else:
-                logger.error(f"Ошибка API 922Proxy: {response.status_code}")
-                return []
+            proxies = []
+            page, pages = 1, 1
+            while page <= pages:
+                status, data, _ = self.fetch_proxy_page(page)
+                if status != 200:
+                    logger.error(f"Ошибка API 922Proxy: {status}")
+                    return []
+                proxies.extend(data.get('proxies', []))
+                pages = int(data.get('pages') or 1)
+                page += 1
+            return proxies
                 
         except Exception as e:
             logger.error(f"Ошибка получения прокси через API: {e}")
@@ -338,7 +356,7 @@ PROXY_PROVIDERS_CONFIG = {
         ],
         'default_type': 'socks5',
         'api_url': 'https://www.922s5.com/api',
-        'check_url': 'http://httpbin.org/ip'
+        'check_url': PROXY_CHECK_URL
     },
     'brightdata': {
         'name': 'Bright Data',
@@ -347,7 +365,7 @@ PROXY_PROVIDERS_CONFIG = {
         ],
         'default_type': 'http',
         'api_url': None,
-        'check_url': 'http://httpbin.org/ip'
+        'check_url': PROXY_CHECK_URL
     },
     'oxylabs': {
         'name': 'Oxylabs',
@@ -356,7 +374,7 @@ PROXY_PROVIDERS_CONFIG = {
         ],
         'default_type': 'http',
         'api_url': None,
-        'check_url': 'http://httpbin.org/ip'
+        'check_url': PROXY_CHECK_URL
     },
     'smartproxy': {
         'name': 'SmartProxy',
@@ -366,7 +384,7 @@ PROXY_PROVIDERS_CONFIG = {
         ],
         'default_type': 'http',
         'api_url': None,
-        'check_url': 'http://httpbin.org/ip'
+        'check_url': PROXY_CHECK_URL
     }
 }
 
@@ -0,0 +1,131 @@
+"""
+Выходные IP прокси
+Разные host:port одного провайдера часто выходят в интернет через один IP;
+группа прокси с общим выходным IP (или подсетью) считается одним прокси при распределении нагрузки
+"""
+
+import ipaddress
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+
+from database.models import ProxyExitIP, Scenario
+from database.connection import Session
+from config import EXIT_IP_GROUPING
+
+logger = logging.getLogger(__name__)
+
+class ExitIPTracker:
+    """Учет выходных IP и группировка прокси"""
+
+    @staticmethod
+    def parse_ip(origin: str) -> Optional[str]:
+        """IP из ответа PROXY_CHECK_URL; httpbin может вернуть цепочку 'ip1, ip2'"""
+        if not origin:
+            return None
+        candidate = origin.split(',')[0].strip()
+        try:
+            return str(ipaddress.ip_address(candidate))
+        except ValueError:
+            return None
+
+    @staticmethod
+    def subnet_of(ip: str) -> str:
+        """Подсеть /24 для IPv4 и /48 для IPv6"""
+        address = ipaddress.ip_address(ip)
+        prefix = 24 if address.version == 4 else 48
+        return str(ipaddress.ip_network(f"{ip}/{prefix}", strict=False))
+
+    @staticmethod
+    def record_exit_ip(proxy_id: int, origin: str) -> Optional[str]:
+        """Запись выходного IP, полученного при проверке прокси"""
+        ip = ExitIPTracker.parse_ip(origin)
+        if not ip:
+            return None
+
+        session = Session()
+        try:
+            now = datetime.now()
+            record = session.query(ProxyExitIP).filter_by(proxy_id=proxy_id, ip=ip).first()
+            if record:
+                record.last_seen = now
+                record.seen_count = (record.seen_count or 0) + 1
+            else:
+                # Новый IP у уже известного прокси - провайдер ротирует выход
+                if session.query(ProxyExitIP.id).filter_by(proxy_id=proxy_id).first():
+                    logger.info(f"Прокси {proxy_id} сменил выходной IP на {ip}")
+                session.add(ProxyExitIP(
+                    proxy_id=proxy_id, ip=ip, subnet=ExitIPTracker.subnet_of(ip),
+                    first_seen=now, last_seen=now
+                ))
+            session.commit()
+            return ip
+        except Exception as e:
+            logger.error(f"Ошибка записи выходного IP прокси {proxy_id}: {e}")
+            session.rollback()
+            return None
+        finally:
+            session.close()
+
+    @staticmethod
+    def get_current_exit_ips(session) -> Dict[int, Tuple[str, str]]:
+        """Последний выходной IP и подсеть каждого прокси: {proxy_id: (ip, subnet)}"""
+        latest = session.query(
+            ProxyExitIP.proxy_id, func.max(ProxyExitIP.last_seen).label('last_seen')
+        ).group_by(ProxyExitIP.proxy_id).subquery()
+
+        rows = session.query(ProxyExitIP.proxy_id, ProxyExitIP.ip, ProxyExitIP.subnet).join(
+            latest,
+            (ProxyExitIP.proxy_id == latest.c.proxy_id) & (ProxyExitIP.last_seen == latest.c.last_seen)
+        ).all()
+        return {proxy_id: (ip, subnet) for proxy_id, ip, subnet in rows}
+
+    @staticmethod
+    def get_group_keys(session, grouping: str = EXIT_IP_GROUPING) -> Dict[int, str]:
+        """Ключ группы для прокси с известным выходным IP
+
+        Прокси без истории в словарь не попадают - каждый из них отдельная группа.
+        """
+        if grouping not in ('ip', 'subnet'):
+            return {}
+        exit_ips = ExitIPTracker.get_current_exit_ips(session)
+        return {
+            proxy_id: (ip if grouping == 'ip' else subnet)
+            for proxy_id, (ip, subnet) in exit_ips.items()
+        }
+
+    @staticmethod
+    def group_of(group_keys: Dict[int, str], proxy_id: int) -> str:
+        """Ключ группы прокси, включая прокси без известного IP"""
+        return group_keys.get(proxy_id) or f"proxy:{proxy_id}"
+
+    @staticmethod
+    def get_group_loads(session, group_keys: Dict[int, str]) -> Dict[str, int]:
+        """Запущенные сценарии по группам выходных IP"""
+        rows = session.query(Scenario.proxy_id, func.count(Scenario.id)).filter(
+            Scenario.status == 'running',
+            Scenario.proxy_id.isnot(None)
+        ).group_by(Scenario.proxy_id).all()
+
+        loads: Dict[str, int] = defaultdict(int)
+        for proxy_id, count in rows:
+            loads[ExitIPTracker.group_of(group_keys, proxy_id)] += count
+        return loads
+
+    @staticmethod
+    def find_shared_exit_ips(grouping: str = 'ip') -> Dict[str, List[int]]:
+        """Группы из нескольких прокси с общим выходным IP/подсетью"""
+        session = Session()
+        try:
+            groups: Dict[str, List[int]] = defaultdict(list)
+            for proxy_id, key in ExitIPTracker.get_group_keys(session, grouping).items():
+                groups[key].append(proxy_id)
+            return {key: sorted(ids) for key, ids in groups.items() if len(ids) > 1}
+        except Exception as e:
+            logger.error(f"Ошибка поиска прокси с общим выходным IP: {e}")
+            return {}
+        finally:
+            session.close()
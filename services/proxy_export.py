@@ -0,0 +1,159 @@
+"""
+Экспорт прокси в файл
+Строки читаются из БД порциями через yield_per, пароли расшифровываются
+пачками и сразу пишутся в файл - память не растет с числом прокси
+"""
+
+import csv
+import json
+import logging
+from datetime import datetime
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from database.models import ProxyServer
+from database.connection import Session
+from config import cipher, EXPORT_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Тип экспорта из меню: (формат файла, раскладка строки, только рабочие)
+EXPORT_TYPES = {
+    'export_format_1': ('txt', 'host_port_user_pass', False),
+    'export_format_2': ('txt', 'user_pass_at_host_port', False),
+    'export_working_only': ('txt', 'host_port_user_pass', True),
+    'export_stats': ('txt', 'stats', False),
+    'export_csv': ('csv', None, False),
+    'export_json': ('json', None, False),
+}
+
+EXPORT_FIELDS = (
+    'id', 'name', 'proxy_type', 'host', 'port', 'username', 'password',
+    'is_working', 'usage_count', 'last_check'
+)
+
+class ProxyExporter:
+    """Потоковый экспорт прокси в txt/CSV/JSON"""
+
+    @staticmethod
+    def iter_batches(working_only: bool = False, batch_size: int = EXPORT_BATCH_SIZE,
+                     stats: Optional[Dict] = None) -> Iterator[List[Dict]]:
+        """Активные прокси пачками по batch_size с расшифрованными паролями
+
+        В stats['undecryptable'] накапливается число паролей, которые не удалось расшифровать.
+        """
+        session = Session()
+        try:
+            query = session.query(
+                ProxyServer.id, ProxyServer.name, ProxyServer.proxy_type, ProxyServer.host,
+                ProxyServer.port, ProxyServer.username, ProxyServer.password_encrypted,
+                ProxyServer.is_working, ProxyServer.usage_count, ProxyServer.last_check
+            ).filter(ProxyServer.is_active == True)
+            if working_only:
+                query = query.filter(ProxyServer.is_working == True)
+
+            rows = iter(query.order_by(ProxyServer.id).yield_per(batch_size))
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                passwords, failed = ProxyExporter.decrypt_batch([row.password_encrypted for row in batch])
+                if stats is not None:
+                    stats['undecryptable'] = stats.get('undecryptable', 0) + failed
+                yield [
+                    {
+                        'id': row.id, 'name': row.name, 'proxy_type': row.proxy_type,
+                        'host': row.host, 'port': row.port, 'username': row.username,
+                        'password': password, 'is_working': row.is_working,
+                        'usage_count': row.usage_count or 0, 'last_check': row.last_check
+                    }
+                    for row, password in zip(batch, passwords)
+                ]
+        finally:
+            session.close()
+
+    @staticmethod
+    def decrypt_batch(tokens: List[Optional[str]]) -> Tuple[List[Optional[str]], int]:
+        """Расшифровка пачки паролей: (пароли, число ошибок)
+
+        Нечитаемый пароль экспортируется как отсутствующий.
+        """
+        passwords = []
+        failed = 0
+        for token in tokens:
+            if not token:
+                passwords.append(None)
+                continue
+            try:
+                passwords.append(cipher.decrypt(token.encode()).decode())
+            except Exception:
+                failed += 1
+                passwords.append(None)
+        return passwords, failed
+
+    @staticmethod
+    def format_line(proxy: Dict, layout: str) -> str:
+        """Строка txt экспорта"""
+        address = f"{proxy['host']}:{proxy['port']}"
+        has_auth = proxy['username'] and proxy['password'] is not None
+
+        if layout == 'host_port_user_pass':
+            return f"{address}:{proxy['username']}:{proxy['password']}" if has_auth else address
+        if layout == 'user_pass_at_host_port':
+            return f"{proxy['username']}:{proxy['password']}@{address}" if has_auth else address
+        if layout == 'stats':
+            status = "🟢" if proxy['is_working'] else "🔴"
+            last_check = proxy['last_check'].strftime('%d.%m %H:%M') if proxy['last_check'] else "Никогда"
+            return (
+                f"{status} {proxy['name']} | {proxy['proxy_type']}://{address} | "
+                f"Использований: {proxy['usage_count']} | Проверка: {last_check}"
+            )
+        return address
+
+    @staticmethod
+    def export_to_file(export_type: str, path: str) -> int:
+        """Запись экспорта в файл; возвращает число прокси"""
+        file_format, layout, working_only = EXPORT_TYPES[export_type]
+        count = 0
+        stats: Dict = {}
+
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            if file_format == 'csv':
+                writer = csv.writer(f)
+                writer.writerow(EXPORT_FIELDS)
+            elif file_format == 'json':
+                f.write('[')
+            else:
+                title = "Рабочие прокси" if working_only else "Все активные прокси"
+                f.write(f"# {title}\n# Дата: {datetime.now().strftime('%d.%m.%Y %H:%M')}\n\n")
+
+            for batch in ProxyExporter.iter_batches(working_only, stats=stats):
+                if file_format == 'csv':
+                    writer.writerows(
+                        [
+                            proxy[field].isoformat() if field == 'last_check' and proxy[field] else proxy[field]
+                            for field in EXPORT_FIELDS
+                        ]
+                        for proxy in batch
+                    )
+                elif file_format == 'json':
+                    # Массив пишется по частям, разделитель между пачками ставится вручную
+                    f.write(('\n' if count == 0 else ',\n') + ',\n'.join(
+                        json.dumps(proxy, default=str, ensure_ascii=False) for proxy in batch
+                    ))
+                else:
+                    f.write(''.join(ProxyExporter.format_line(proxy, layout) + '\n' for proxy in batch))
+                count += len(batch)
+
+            if file_format == 'json':
+                f.write(']\n')
+
+        if stats.get('undecryptable'):
+            logger.warning(f"Экспорт: {stats['undecryptable']} паролей прокси не расшифровано, выгружены без пароля")
+        return count
+
+    @staticmethod
+    def get_filename(export_type: str) -> str:
+        """Имя файла для отправки"""
+        file_format = EXPORT_TYPES[export_type][0]
+        return f"proxies_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{file_format}"
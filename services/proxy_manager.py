@@ -3,13 +3,19 @@
 """
 
 import logging
-import requests
+import time
 from datetime import datetime, timedelta
 from typing import Optional, Dict, List
 
-from config import cipher, PROXY_CHECK_TIMEOUT, PROXY_CHECK_URL, PROXY_RECHECK_INTERVAL
-from database.models import ProxyServer
+from sqlalchemy import or_
+
+from config import (
+    cipher, PROXY_CHECK_TIMEOUT, PROXY_CHECK_URL, PROXY_RECHECK_INTERVAL, PROXY_CHECK_FRESH_CONNECTION
+)
+from database.models import ProxyServer, ProxyPerformance
 from database.connection import Session
+from services.circuit_breaker import circuit_breakers
+from services.proxy_exit_ip import ExitIPTracker
 
 logger = logging.getLogger(__name__)
 
@@ -51,36 +57,68 @@ class ProxyManager:
     @staticmethod
     def check_proxy_health(proxy: ProxyServer) -> bool:
         """Проверка работоспособности прокси"""
+        return ProxyManager.measure_proxy(proxy)['working']
+
+    @staticmethod
+    def measure_proxy(proxy: ProxyServer, fresh: bool = PROXY_CHECK_FRESH_CONNECTION) -> Dict:
+        """Запрос к PROXY_CHECK_URL через прокси: {working, exit_ip, ttfb, total, error}
+
+        ttfb - от отправки запроса до заголовков ответа, total - вместе с чтением тела.
+        fresh - новое соединение вместо keep-alive: замер включает подключение и
+        авторизацию на прокси.
+        """
+        import requests  # Импорт откладывается до первой проверки, чтобы не замедлять запуск бота
+        from services.http_pool import http_pool
+        
+        result = {'working': False, 'exit_ip': None, 'ttfb': None, 'total': None, 'error': None}
         try:
             proxy_dict = ProxyManager.get_proxy_dict(proxy)
             if not proxy_dict:
                 logger.warning(f"Не удалось получить настройки прокси {proxy.id}")
-                return False
+                result['error'] = "нет настроек прокси"
+                return result
                 
-            # Проверяем через HTTP запрос
-            response = requests.get(
-                PROXY_CHECK_URL, 
-                proxies=proxy_dict,
-                timeout=PROXY_CHECK_TIMEOUT
+            # Проверяем через HTTP запрос; повторные проверки идут по keep-alive соединению.
+            # Время подключения к прокси отдельно замеряет первый этап ProxyProber
+            started = time.perf_counter()
+            send = http_pool.fresh_request if fresh else http_pool.request
+            response = send(
+                'GET',
+                PROXY_CHECK_URL,
+                proxy_url=proxy_dict['http'],
+                timeout=PROXY_CHECK_TIMEOUT,
+                headers={'Cache-Control': 'no-cache'}
             )
+            result['total'] = time.perf_counter() - started
+            result['ttfb'] = response.elapsed.total_seconds()
             
             if response.status_code == 200:
                 response_data = response.json()
-                logger.info(f"Прокси {proxy.name} работает. IP: {response_data.get('origin', 'unknown')}")
-                return True
+                result['exit_ip'] = response_data.get('origin')
+                result['working'] = True
+                logger.info(
+                    f"Прокси {proxy.name} работает. IP: {result['exit_ip'] or 'unknown'}, "
+                    f"TTFB {result['ttfb'] * 1000:.0f} мс, всего {result['total'] * 1000:.0f} мс"
+                )
+                ExitIPTracker.record_exit_ip(proxy.id, result['exit_ip'])
+                circuit_breakers.record_success(proxy.id)
             else:
                 logger.warning(f"Прокси {proxy.name} вернул статус {response.status_code}")
-                return False
+                result['error'] = f"HTTP {response.status_code}"
+                circuit_breakers.record_failure(proxy.id, result['error'])
                 
         except requests.exceptions.Timeout:
             logger.warning(f"Таймаут при проверке прокси {proxy.name}")
-            return False
-        except requests.exceptions.ProxyError:
+            result['error'] = "таймаут проверки"
+            circuit_breakers.record_failure(proxy.id, result['error'])
+        except requests.exceptions.ProxyError as e:
             logger.warning(f"Ошибка подключения к прокси {proxy.name}")
-            return False
+            result['error'] = "ошибка подключения к прокси"
+            circuit_breakers.record_failure(proxy.id, str(e))
         except Exception as e:
             logger.error(f"Ошибка проверки прокси {proxy.name}: {e}")
-            return False
+            result['error'] = str(e)[:100]
+        return result
 
     @staticmethod
     def get_best_proxy() -> Optional[ProxyServer]:
@@ -88,14 +126,28 @@ class ProxyManager:
         session = Session()
         try:
             # Получаем активные прокси, отсортированные по использованию
-            proxies = session.query(ProxyServer).filter_by(
-                is_active=True, 
-                is_working=True
-            ).order_by(ProxyServer.usage_count.asc()).all()
+            query = session.query(ProxyServer).outerjoin(
+                ProxyPerformance, ProxyPerformance.proxy_id == ProxyServer.id
+            ).filter(
+                ProxyServer.is_active == True,
+                ProxyServer.is_working == True,
+                or_(ProxyPerformance.blacklisted_until.is_(None), ProxyPerformance.blacklisted_until < datetime.now())
+            )
+            # Прокси, отключенные circuit breaker в этом процессе, еще могут не быть записаны в БД
+            unavailable = circuit_breakers.unavailable_ids()
+            if unavailable:
+                query = query.filter(ProxyServer.id.notin_(unavailable))
+            proxies = query.order_by(ProxyServer.usage_count.asc()).all()
             
             if not proxies:
                 logger.warning("Нет доступных прокси серверов")
                 return None
+            
+            # Прокси с общим выходным IP - одна единица емкости: сначала самая свободная группа
+            group_keys = ExitIPTracker.get_group_keys(session)
+            if group_keys:
+                group_loads = ExitIPTracker.get_group_loads(session, group_keys)
+                proxies.sort(key=lambda p: group_loads.get(ExitIPTracker.group_of(group_keys, p.id), 0))
                 
             # Проверяем первый прокси (с наименьшим использованием)
             best_proxy = proxies[0]
@@ -279,6 +331,57 @@ class ProxyManager:
         finally:
             session.close()
 
+    @staticmethod
+    def get_proxy_page(limit: int = 10, after_id: Optional[int] = None, before_id: Optional[int] = None,
+                       status: Optional[str] = None, proxy_type: Optional[str] = None,
+                       name_prefix: Optional[str] = None, search: Optional[str] = None) -> Dict:
+        """Страница прокси с keyset пагинацией по id (новые первыми)
+
+        after_id - следующая страница (id меньше курсора), before_id - предыдущая.
+        Загружается только limit + 1 строк, лишняя строка показывает наличие соседней страницы.
+        """
+        session = Session()
+        try:
+            query = session.query(ProxyServer)
+
+            if status == 'working':
+                query = query.filter(ProxyServer.is_active == True, ProxyServer.is_working == True)
+            elif status == 'failed':
+                query = query.filter(or_(ProxyServer.is_active == False, ProxyServer.is_working == False))
+            if proxy_type:
+                query = query.filter(ProxyServer.proxy_type == proxy_type)
+            if name_prefix:
+                # Импортированные прокси называются "<провайдер> #N"
+                query = query.filter(ProxyServer.name.like(f"{name_prefix}%"))
+            if search:
+                query = query.filter(ProxyServer.host.contains(search, autoescape=True))
+
+            if before_id is not None:
+                rows = query.filter(ProxyServer.id > before_id).order_by(ProxyServer.id.asc()).limit(limit + 1).all()
+                has_prev = len(rows) > limit
+                items = list(reversed(rows[:limit]))
+                has_next = True
+            else:
+                if after_id is not None:
+                    query = query.filter(ProxyServer.id < after_id)
+                rows = query.order_by(ProxyServer.id.desc()).limit(limit + 1).all()
+                has_next = len(rows) > limit
+                items = rows[:limit]
+                has_prev = after_id is not None
+
+            return {
+                'items': items,
+                'has_prev': has_prev and bool(items),
+                'has_next': has_next and bool(items),
+                'first_id': items[0].id if items else None,
+                'last_id': items[-1].id if items else None
+            }
+        except Exception as e:
+            logger.error(f"Ошибка получения страницы прокси: {e}")
+            return {'items': [], 'has_prev': False, 'has_next': False, 'first_id': None, 'last_id': None}
+        finally:
+            session.close()
+
     @staticmethod
     def validate_proxy_data(proxy_type: str, host: str, port: int) -> bool:
         """Валидация данных прокси"""
@@ -0,0 +1,330 @@
+"""
+Двухэтапная проверка прокси
+Сначала быстрое асинхронное TCP подключение и рукопожатие SOCKS5 / HTTP CONNECT
+с таймаутом меньше секунды; полная HTTP проверка (ProxyManager.check_proxy_health)
+выполняется только для прокси, прошедших первый этап
+"""
+
+import asyncio
+import base64
+import html
+import logging
+import socket
+import struct
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from database.models import ProxyServer, ProxyPerformance
+from database.connection import Session
+from services.proxy_manager import ProxyManager
+from services.circuit_breaker import circuit_breakers
+from config import (
+    PROXY_PROBE_TIMEOUT, PROXY_PROBE_TARGET, PROXY_PROBE_CONCURRENCY,
+    PROXY_HTTP_CONCURRENCY, PROXY_DNS_TTL
+)
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_TIME_ALPHA = 0.3  # Вес новой проверки в ProxyPerformance.avg_response_time
+
+class ProbeError(Exception):
+    """Прокси не прошел быструю проверку"""
+
+class ProxyProber:
+    """Массовая проверка прокси в два этапа"""
+
+    def __init__(self, timeout: float = PROXY_PROBE_TIMEOUT, target: str = PROXY_PROBE_TARGET,
+                 concurrency: int = PROXY_PROBE_CONCURRENCY, http_concurrency: int = PROXY_HTTP_CONCURRENCY,
+                 dns_ttl: int = PROXY_DNS_TTL):
+        self.timeout = timeout
+        self.target_host, _, target_port = target.rpartition(':')
+        self.target_port = int(target_port)
+        self.concurrency = max(1, concurrency)
+        self.http_concurrency = max(1, http_concurrency)
+        self.dns_ttl = dns_ttl
+        self._dns_cache: Dict[str, Tuple[float, str]] = {}
+
+    async def resolve(self, host: str) -> str:
+        """IP адрес хоста прокси с кэшированием; тысячи прокси одного провайдера часто на нескольких хостах"""
+        cached = self._dns_cache.get(host)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        loop = asyncio.get_running_loop()
+        infos = await loop.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        if not infos:
+            raise ProbeError(f"не удалось разрешить {host}")
+        address = infos[0][4][0]
+        self._dns_cache[host] = (time.monotonic() + self.dns_ttl, address)
+        return address
+
+    async def open_tunnel(self, proxy: Dict, host: str, port: int, timeout: Optional[float] = None):
+        """TCP подключение к прокси и туннель до host:port
+
+        Возвращает (reader, writer, время TCP подключения); закрывает соединение вызывающий.
+        """
+        timeout = timeout or self.timeout
+        address = await self.resolve(proxy['host'])
+        started = time.perf_counter()
+
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(address, proxy['port']), timeout=timeout
+        )
+        connect_time = time.perf_counter() - started
+        try:
+            remaining = max(0.05, timeout - connect_time)
+            if proxy['proxy_type'] == 'socks5':
+                await asyncio.wait_for(self._socks5_connect(reader, writer, proxy, host, port), timeout=remaining)
+            else:
+                await asyncio.wait_for(self._http_connect(reader, writer, proxy, host, port), timeout=remaining)
+        except BaseException:
+            await self.close_writer(writer)
+            raise
+        return reader, writer, connect_time
+
+    @staticmethod
+    async def close_writer(writer):
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+
+    async def handshake(self, proxy: Dict) -> Tuple[float, float]:
+        """Подключение и открытие туннеля до PROXY_PROBE_TARGET
+
+        Возвращает (время TCP подключения, полное время с рукопожатием) в секундах.
+        """
+        started = time.perf_counter()
+        _, writer, connect_time = await self.open_tunnel(proxy, self.target_host, self.target_port)
+        elapsed = time.perf_counter() - started
+        await self.close_writer(writer)
+        return connect_time, elapsed
+
+    async def _socks5_connect(self, reader, writer, proxy: Dict, target_host: str, target_port: int):
+        """SOCKS5 (RFC 1928) с авторизацией по логину и паролю (RFC 1929)"""
+        with_auth = bool(proxy.get('username') and proxy.get('password'))
+        writer.write(b'\x05\x02\x00\x02' if with_auth else b'\x05\x01\x00')
+        await writer.drain()
+
+        version, method = await reader.readexactly(2)
+        if version != 5 or method == 0xFF:
+            raise ProbeError("SOCKS5: метод авторизации не принят")
+
+        if method == 0x02:
+            if not with_auth:
+                raise ProbeError("SOCKS5: требуется авторизация")
+            username = proxy['username'].encode()
+            password = proxy['password'].encode()
+            writer.write(bytes([1, len(username)]) + username + bytes([len(password)]) + password)
+            await writer.drain()
+            _, status = await reader.readexactly(2)
+            if status != 0:
+                raise ProbeError("SOCKS5: неверный логин или пароль")
+
+        host = target_host.encode()
+        writer.write(b'\x05\x01\x00\x03' + bytes([len(host)]) + host + struct.pack('>H', target_port))
+        await writer.drain()
+
+        version, reply = await reader.readexactly(2)
+        if version != 5 or reply != 0:
+            raise ProbeError(f"SOCKS5: CONNECT отклонен (код {reply})")
+
+        # Остаток ответа (RSV, ATYP, BND.ADDR, BND.PORT) дочитывается, дальше поток принадлежит туннелю
+        _, address_type = await reader.readexactly(2)
+        if address_type == 0x01:
+            address_length = 4
+        elif address_type == 0x04:
+            address_length = 16
+        elif address_type == 0x03:
+            address_length = (await reader.readexactly(1))[0]
+        else:
+            raise ProbeError(f"SOCKS5: неизвестный тип адреса {address_type}")
+        await reader.readexactly(address_length + 2)
+
+    async def _http_connect(self, reader, writer, proxy: Dict, target_host: str, target_port: int):
+        """HTTP CONNECT - тот же туннель, через который instagrapi ходит в Instagram по HTTPS"""
+        target = f"{target_host}:{target_port}"
+        request = f"CONNECT {target} HTTP/1.1\r\nHost: {target}\r\n"
+        if proxy.get('username') and proxy.get('password'):
+            credentials = base64.b64encode(f"{proxy['username']}:{proxy['password']}".encode()).decode()
+            request += f"Proxy-Authorization: Basic {credentials}\r\n"
+        writer.write((request + "\r\n").encode())
+        await writer.drain()
+
+        status_line = await reader.readline()
+        parts = status_line.decode(errors='replace').split()
+        if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+            raise ProbeError("HTTP: некорректный ответ прокси")
+        if parts[1] == '407':
+            raise ProbeError("HTTP: неверный логин или пароль")
+        if parts[1] != '200':
+            raise ProbeError(f"HTTP: CONNECT отклонен ({parts[1]})")
+
+        # Заголовки ответа на CONNECT дочитываются, дальше поток принадлежит туннелю
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+
+    @staticmethod
+    def load_proxies(proxy_ids: Optional[List[int]] = None, stale_before: Optional[datetime] = None,
+                     limit: Optional[int] = None) -> List[Dict]:
+        """Данные для проверки без ORM объектов, чтобы не держать сессию на время проверки"""
+        session = Session()
+        try:
+            query = session.query(ProxyServer).filter(ProxyServer.is_active == True)
+            if proxy_ids is not None:
+                query = query.filter(ProxyServer.id.in_(proxy_ids))
+            if stale_before is not None:
+                query = query.filter(
+                    (ProxyServer.last_check.is_(None)) | (ProxyServer.last_check < stale_before)
+                ).order_by(ProxyServer.last_check.asc())
+            if limit:
+                query = query.limit(limit)
+
+            return [ProxyProber.proxy_to_dict(proxy) for proxy in query.all()]
+        finally:
+            session.close()
+
+    @staticmethod
+    def proxy_to_dict(proxy: ProxyServer) -> Dict:
+        """Параметры подключения с расшифрованным паролем"""
+        password = None
+        if proxy.password_encrypted:
+            try:
+                password = ProxyManager.decrypt_password(proxy.password_encrypted)
+            except Exception:
+                logger.error(f"Ошибка расшифровки пароля прокси {proxy.id}")
+        return {
+            'id': proxy.id, 'name': proxy.name, 'proxy_type': proxy.proxy_type,
+            'host': proxy.host, 'port': proxy.port,
+            'username': proxy.username, 'password': password
+        }
+
+    @staticmethod
+    def _full_check(proxy_id: int) -> Dict:
+        """Второй этап: полный HTTP запрос к PROXY_CHECK_URL"""
+        session = Session()
+        try:
+            proxy = session.query(ProxyServer).filter_by(id=proxy_id).first()
+            if not proxy:
+                return {'working': False, 'ttfb': None, 'total': None, 'error': "прокси удален"}
+            return ProxyManager.measure_proxy(proxy)
+        finally:
+            session.close()
+
+    @staticmethod
+    def _save_results(results: Dict[int, Dict]):
+        """Запись is_working/last_check одной транзакцией"""
+        session = Session()
+        try:
+            now = datetime.now()
+            for proxy in session.query(ProxyServer).filter(ProxyServer.id.in_(list(results))).all():
+                proxy.is_working = results[proxy.id]['working']
+                proxy.last_check = now
+
+            # Сглаженное время полного запроса к цели проверки
+            timed = {proxy_id: r['total'] for proxy_id, r in results.items() if r.get('total')}
+            if timed:
+                performance = {
+                    perf.proxy_id: perf for perf in
+                    session.query(ProxyPerformance).filter(ProxyPerformance.proxy_id.in_(list(timed))).all()
+                }
+                for proxy_id, total in timed.items():
+                    perf = performance.get(proxy_id)
+                    if perf is None:
+                        perf = ProxyPerformance(proxy_id=proxy_id, auth_attempts=0, auth_successes=0)
+                        session.add(perf)
+                    perf.avg_response_time = (
+                        total if not perf.avg_response_time
+                        else RESPONSE_TIME_ALPHA * total + (1 - RESPONSE_TIME_ALPHA) * perf.avg_response_time
+                    )
+            session.commit()
+        except Exception as e:
+            logger.error(f"Ошибка сохранения результатов проверки прокси: {e}")
+            session.rollback()
+        finally:
+            session.close()
+
+    async def probe(self, proxies: List[Dict], full_check: bool = True) -> Dict[int, Dict]:
+        """Проверка списка прокси: {proxy_id: {working, stage, latency, error}}"""
+        results: Dict[int, Dict] = {}
+        handshake_limit = asyncio.Semaphore(self.concurrency)
+        http_limit = asyncio.Semaphore(self.http_concurrency)
+
+        async def check(proxy: Dict):
+            result = {
+                'working': False, 'stage': 'handshake', 'connect': None, 'handshake': None,
+                'ttfb': None, 'total': None, 'error': None
+            }
+            results[proxy['id']] = result
+
+            async with handshake_limit:
+                try:
+                    result['connect'], result['handshake'] = await self.handshake(proxy)
+                except (ProbeError, OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                    result['error'] = str(e) or type(e).__name__
+                    circuit_breakers.record_failure(proxy['id'], f"быстрая проверка: {result['error']}")
+                    return
+
+            if not full_check:
+                result['working'] = True
+                return
+
+            async with http_limit:
+                measured = await asyncio.to_thread(self._full_check, proxy['id'])
+            result['stage'] = 'http'
+            for key in ('working', 'ttfb', 'total', 'error'):
+                result[key] = measured[key]
+
+        await asyncio.gather(*[check(proxy) for proxy in proxies])
+        return results
+
+    @staticmethod
+    def format_timings(result: Dict) -> str:
+        """Подключение / TTFB / полный запрос в миллисекундах"""
+        parts = []
+        for key, label in (('connect', 'подкл.'), ('ttfb', 'TTFB'), ('total', 'всего')):
+            if result.get(key) is not None:
+                parts.append(f"{label} {result[key] * 1000:.0f} мс")
+        return ', '.join(parts)
+
+    async def check_proxies(self, proxy_ids: Optional[List[int]] = None, stale_before: Optional[datetime] = None,
+                            limit: Optional[int] = None) -> Dict:
+        """Проверка с сохранением в БД; формат результата как у ProxyManager.check_all_proxies"""
+        started = time.perf_counter()
+        proxies = await asyncio.to_thread(self.load_proxies, proxy_ids, stale_before, limit)
+        if not proxies:
+            return {'working': 0, 'failed': 0, 'results': [], 'checked': 0, 'rejected_fast': 0}
+
+        results = await self.probe(proxies)
+        await asyncio.to_thread(self._save_results, results)
+
+        lines = []
+        working = rejected_fast = 0
+        for proxy in proxies:
+            result = results[proxy['id']]
+            if result['working']:
+                working += 1
+                lines.append(f"✅ {proxy['name']} ({self.format_timings(result)})")
+            else:
+                rejected_fast += result['stage'] == 'handshake'
+                lines.append(f"❌ {proxy['name']}: {html.escape(result['error'] or '')}")
+
+        logger.info(
+            f"Проверено прокси: {len(proxies)} за {time.perf_counter() - started:.1f} сек, "
+            f"работают {working}, отсеяно быстрой проверкой {rejected_fast}"
+        )
+        return {
+            'working': working,
+            'failed': len(proxies) - working,
+            'results': lines,
+            'checked': len(proxies),
+            'rejected_fast': rejected_fast
+        }
+
+
+# Глобальный экземпляр проверки прокси
+proxy_prober = ProxyProber()
@@ -0,0 +1,267 @@
+"""
+Перебалансировка запущенных сценариев между прокси
+Целевое распределение строится упаковкой аккаунтов по свободной емкости прокси
+с учетом их оценки; переносы выполняются между проверками с перепривязкой
+сессии Instagram к новому прокси
+"""
+
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from database.models import Scenario, ProxyServer, ProxyPerformance, ChallengeSession
+from database.connection import Session
+from services.proxy_manager import ProxyManager
+from services.circuit_breaker import circuit_breakers
+from services.proxy_exit_ip import ExitIPTracker
+from config import (
+    instabots, PROXY_MAX_SCENARIOS, REBALANCE_MAX_MOVES, REBALANCE_STICKY_DAYS, PROXY_STICKY_ACCOUNTS
+)
+
+logger = logging.getLogger(__name__)
+
+class ProxyRebalancer:
+    """Планирование и выполнение переносов аккаунтов между прокси"""
+
+    def __init__(self, max_scenarios: int = PROXY_MAX_SCENARIOS, max_moves: int = REBALANCE_MAX_MOVES,
+                 sticky_days: int = REBALANCE_STICKY_DAYS):
+        self.max_scenarios = max_scenarios
+        self.max_moves = max_moves
+        self.sticky_days = sticky_days
+        self.last_result: Dict = {}
+
+    @staticmethod
+    def score_proxy(proxy: ProxyServer, perf: Optional[ProxyPerformance], now: datetime) -> float:
+        """Оценка прокси от 0 до 1; 0 - прокси не принимает сценарии"""
+        if not proxy.is_active or not proxy.is_working or not circuit_breakers.is_available(proxy.id):
+            return 0.0
+        # Блокировку проверяем раньше статистики: circuit breaker и быстрая проверка
+        # создают записи ProxyPerformance без попыток входа
+        if perf is not None and perf.blacklisted_until and perf.blacklisted_until > now:
+            return 0.0
+        if perf is None or not perf.auth_attempts:
+            return 0.5  # Нет статистики - нейтральная оценка
+        success = perf.auth_successes / perf.auth_attempts
+        return max(0.0, success * (1 - (perf.challenge_rate or 0)))
+
+    def load_state(self, session) -> Dict:
+        """Прокси с оценкой и емкостью, аккаунты с текущим прокси"""
+        now = datetime.now()
+
+        performance = {perf.proxy_id: perf for perf in session.query(ProxyPerformance).all()}
+        group_keys = ExitIPTracker.get_group_keys(session)
+        proxies = {}
+        for proxy in session.query(ProxyServer).all():
+            score = self.score_proxy(proxy, performance.get(proxy.id), now)
+            proxies[proxy.id] = {
+                'id': proxy.id,
+                'name': proxy.name,
+                'group': ExitIPTracker.group_of(group_keys, proxy.id),
+                'score': score,
+                'capacity': self.max_scenarios if score > 0 else 0
+            }
+
+        scenarios = session.query(Scenario.id, Scenario.ig_username, Scenario.proxy_id).filter(
+            Scenario.status == 'running',
+            Scenario.proxy_id.isnot(None)
+        ).all()
+
+        challenged = {
+            scenario_id for (scenario_id,) in session.query(ChallengeSession.scenario_id).filter(
+                ChallengeSession.started_at >= now - timedelta(days=self.sticky_days)
+            ).distinct()
+        }
+
+        # Сценарии одного аккаунта переносятся вместе: один аккаунт с двух IP хуже перегрузки
+        accounts: Dict[str, Dict] = {}
+        for scenario_id, ig_username, proxy_id in scenarios:
+            key = ig_username.lower()
+            account = accounts.setdefault(key, {
+                'ig_username': ig_username,
+                'scenario_ids': [],
+                'proxies': defaultdict(int),
+                'sticky': key in PROXY_STICKY_ACCOUNTS
+            })
+            account['scenario_ids'].append(scenario_id)
+            account['proxies'][proxy_id] += 1
+            if scenario_id in challenged:
+                account['sticky'] = True
+
+        for account in accounts.values():
+            account['proxy_id'] = max(account['proxies'], key=account['proxies'].get)
+            account['size'] = len(account['scenario_ids'])
+
+        return {'proxies': proxies, 'accounts': list(accounts.values())}
+
+    def plan_moves(self, proxies: Dict[int, Dict], accounts: List[Dict]) -> List[Dict]:
+        """Список переносов {ig_username, scenario_ids, from_proxy, to_proxy}
+
+        Емкость считается по группам выходных IP: прокси с общим IP делят одну
+        емкость PROXY_MAX_SCENARIOS. Аккаунты остаются на месте, пока группа не
+        перегружена. С нерабочих прокси снимаются все аккаунты, с перегруженных
+        групп - незакрепленные (сначала маленькие), затем они раскладываются от
+        больших к маленьким на прокси с наибольшей оценкой в группах, где
+        хватает свободного места.
+        """
+        def group_of(proxy_id: int) -> str:
+            return proxies.get(proxy_id, {}).get('group') or f"proxy:{proxy_id}"
+
+        def proxy_capacity(proxy_id: int) -> int:
+            return proxies.get(proxy_id, {}).get('capacity', 0)
+
+        capacity: Dict[str, int] = defaultdict(int)
+        for proxy in proxies.values():
+            capacity[proxy['group']] = max(capacity[proxy['group']], proxy['capacity'])
+
+        load: Dict[str, int] = defaultdict(int)
+        by_group: Dict[str, List[Dict]] = defaultdict(list)
+        for account in accounts:
+            load[group_of(account['proxy_id'])] += account['size']
+            by_group[group_of(account['proxy_id'])].append(account)
+
+        evicted = []
+        for group, group_accounts in by_group.items():
+            # Закрепленный аккаунт переносится, только если его прокси совсем не работает
+            dead = [a for a in group_accounts if proxy_capacity(a['proxy_id']) == 0]
+            movable = sorted(
+                (a for a in group_accounts if not a['sticky'] and proxy_capacity(a['proxy_id']) > 0),
+                key=lambda a: a['size']
+            )
+            for account in dead:
+                load[group] -= account['size']
+                evicted.append(account)
+            for account in movable:
+                if load[group] <= capacity[group]:
+                    break
+                load[group] -= account['size']
+                evicted.append(account)
+
+        moves = []
+        for account in sorted(evicted, key=lambda a: a['size'], reverse=True):
+            source_group = group_of(account['proxy_id'])
+            source_alive = proxy_capacity(account['proxy_id']) > 0
+            candidates = [] if len(moves) >= self.max_moves else [
+                proxy for proxy in proxies.values()
+                if proxy['id'] != account['proxy_id'] and proxy['capacity'] > 0
+                # Соседний порт того же выходного IP помогает только при мертвом прокси
+                and (proxy['group'] != source_group or not source_alive)
+                and capacity[proxy['group']] - load[proxy['group']] >= account['size']
+            ]
+            if not candidates:
+                # Некуда переносить - аккаунт остается на своем прокси
+                load[source_group] += account['size']
+                continue
+
+            target = max(candidates, key=lambda p: (p['score'], capacity[p['group']] - load[p['group']]))
+            load[target['group']] += account['size']
+            moves.append({
+                'ig_username': account['ig_username'],
+                'scenario_ids': list(account['scenario_ids']),
+                'from_proxy': account['proxy_id'],
+                'to_proxy': target['id']
+            })
+        return moves
+
+    def migrate(self, session, move: Dict) -> bool:
+        """Перенос аккаунта на новый прокси между проверками
+
+        Вызывается из event loop без await между проверкой и переносом, поэтому
+        планировщик не может начать проверку посреди перепривязки.
+        """
+        from services.check_scheduler import check_scheduler
+
+        if any(check_scheduler.is_running(scenario_id) for scenario_id in move['scenario_ids']):
+            logger.info(f"Перенос @{move['ig_username']} отложен: идет проверка")
+            return False
+
+        proxy = session.query(ProxyServer).filter_by(id=move['to_proxy']).first()
+        proxy_dict = ProxyManager.get_proxy_dict(proxy)
+        if not proxy_dict:
+            return False
+
+        session.query(Scenario).filter(Scenario.id.in_(move['scenario_ids'])).update(
+            {'proxy_id': proxy.id}, synchronize_session=False
+        )
+        proxy.usage_count = (proxy.usage_count or 0) + len(move['scenario_ids'])
+        session.commit()
+
+        # Cookies и устройство сохраняются, меняется только выходной IP
+        for scenario_id in move['scenario_ids']:
+            ig_client = instabots.get(scenario_id)
+            if ig_client:
+                ig_client.set_proxy(proxy_dict['http'])
+                circuit_breakers.bind_client(ig_client, proxy.id)
+
+        logger.info(
+            f"@{move['ig_username']} перенесен с прокси {move['from_proxy']} на {proxy.name} "
+            f"(сценарии {', '.join(map(str, move['scenario_ids']))})"
+        )
+        return True
+
+    def plan(self) -> Dict:
+        """Расчет переносов по текущему состоянию БД (блокирующий вызов, выполняется в потоке)"""
+        session = Session()
+        try:
+            state = self.load_state(session)
+            moves = self.plan_moves(state['proxies'], state['accounts'])
+            overloaded = sum(
+                1 for count, capacity in self._group_load(state['proxies'], state['accounts']).values()
+                if count > capacity
+            )
+            return {
+                'checked_at': datetime.now(),
+                'accounts': len(state['accounts']),
+                'overloaded_before': overloaded,
+                'planned': len(moves),
+                'moves': moves
+            }
+        finally:
+            session.close()
+
+    def apply(self, moves: List[Dict]) -> int:
+        """Выполнение рассчитанных переносов; вызывается из event loop"""
+        session = Session()
+        migrated = 0
+        try:
+            for move in moves:
+                try:
+                    if self.migrate(session, move):
+                        migrated += 1
+                except Exception as e:
+                    logger.error(f"Ошибка переноса @{move['ig_username']}: {e}")
+                    session.rollback()
+            return migrated
+        finally:
+            session.close()
+
+    async def rebalance(self, dry_run: bool = False) -> Dict:
+        """Один проход перебалансировки: план в потоке, переносы в event loop"""
+        try:
+            result = await asyncio.to_thread(self.plan)
+        except Exception as e:
+            logger.error(f"Ошибка перебалансировки прокси: {e}")
+            return {}
+
+        result['migrated'] = 0 if dry_run or not result['moves'] else self.apply(result['moves'])
+        self.last_result = result
+        return result
+
+    @staticmethod
+    def _group_load(proxies: Dict[int, Dict], accounts: List[Dict]) -> Dict[str, Tuple[int, int]]:
+        """Нагрузка и емкость групп выходных IP, в которых есть аккаунты"""
+        result: Dict[str, Tuple[int, int]] = {}
+        for account in accounts:
+            proxy = proxies.get(account['proxy_id'], {})
+            group = proxy.get('group') or f"proxy:{account['proxy_id']}"
+            count, _ = result.get(group, (0, 0))
+            capacity = max(
+                (p['capacity'] for p in proxies.values() if p['group'] == group), default=0
+            )
+            result[group] = (count + account['size'], capacity)
+        return result
+
+
+# Глобальный экземпляр перебалансировки
+proxy_rebalancer = ProxyRebalancer()
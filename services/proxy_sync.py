@@ -0,0 +1,324 @@
+"""
+Синхронизация прокси со списком провайдера
+Страницы API загружаются параллельно; неизмененный список отсекается по
+ETag/Last-Modified, а без них - по хешу содержимого. Разница с БД
+(добавить/обновить/убрать) считается за один проход и применяется одной транзакцией
+"""
+
+import asyncio
+import hashlib
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import or_
+
+from database.models import ProxyServer, ProviderProxy, ProviderSyncState
+from database.connection import Session
+from services.proxy_manager import ProxyManager
+from config import PROVIDER_SYNC_PAGE_SIZE, PROVIDER_SYNC_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+SQL_CHUNK = 500  # Размер IN (...) в запросах, лимит параметров SQLite
+
+class ProviderSyncError(Exception):
+    """API провайдера вернуло ошибку"""
+
+class ProviderSync:
+    """Инкрементальная синхронизация списка прокси провайдера"""
+
+    def __init__(self, page_size: int = PROVIDER_SYNC_PAGE_SIZE, concurrency: int = PROVIDER_SYNC_CONCURRENCY):
+        self.page_size = max(1, page_size)
+        self.concurrency = max(1, concurrency)
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.last_results: Dict[str, Dict] = {}
+
+    @staticmethod
+    def normalize(item: Dict, default_type: str) -> Optional[Dict]:
+        """Прокси из ответа API в виде для сравнения с БД"""
+        try:
+            proxy = {
+                'host': str(item['host']).strip().lower(),
+                'port': int(item['port']),
+                'username': item.get('username') or None,
+                'password': item.get('password') or None,
+                'proxy_type': (item.get('type') or default_type).lower()
+            }
+        except (KeyError, TypeError, ValueError):
+            return None
+        proxy['fingerprint'] = ProviderSync.fingerprint(proxy)
+        return proxy
+
+    @staticmethod
+    def fingerprint(proxy: Dict) -> str:
+        """Хеш типа и учетных данных: изменения видны без расшифровки паролей в БД"""
+        raw = f"{proxy['proxy_type']}\0{proxy['username'] or ''}\0{proxy['password'] or ''}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    @staticmethod
+    def content_hash(remote: Dict[Tuple[str, int], Dict]) -> str:
+        """Хеш списка, не зависящий от порядка и разбиения на страницы"""
+        digest = hashlib.sha256()
+        for key in sorted(remote):
+            digest.update(f"{key[0]}:{key[1]}\0{remote[key]['fingerprint']}\n".encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def load_state(provider: str) -> Dict:
+        """Сохраненные валидаторы последней синхронизации"""
+        session = Session()
+        try:
+            state = session.query(ProviderSyncState).filter_by(provider=provider).first()
+            if not state:
+                return {}
+            return {'etag': state.etag, 'last_modified': state.last_modified, 'content_hash': state.content_hash}
+        finally:
+            session.close()
+
+    async def fetch_all(self, client, state: Dict) -> Tuple[Optional[List[Dict]], Dict]:
+        """Все страницы списка; (None, {}) - список не изменился с прошлой синхронизации"""
+        conditional = {}
+        if state.get('etag'):
+            conditional['If-None-Match'] = state['etag']
+        if state.get('last_modified'):
+            conditional['If-Modified-Since'] = state['last_modified']
+
+        status, first, headers = await asyncio.to_thread(client.fetch_proxy_page, 1, self.page_size, conditional)
+        if status == 304:
+            return None, {}
+        if status != 200:
+            raise ProviderSyncError(f"HTTP {status} на странице 1")
+
+        validators = {'etag': headers.get('ETag'), 'last_modified': headers.get('Last-Modified')}
+        pages = int(first.get('pages') or 1)
+        if pages <= 1:
+            return list(first.get('proxies', [])), validators
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch_page(page: int) -> List[Dict]:
+            async with semaphore:
+                page_status, data, _ = await asyncio.to_thread(client.fetch_proxy_page, page, self.page_size)
+            if page_status != 200:
+                raise ProviderSyncError(f"HTTP {page_status} на странице {page}")
+            return data.get('proxies', [])
+
+        items = list(first.get('proxies', []))
+        for page_items in await asyncio.gather(*[fetch_page(page) for page in range(2, pages + 1)]):
+            items.extend(page_items)
+        return items, validators
+
+    @staticmethod
+    def diff(session, provider: str, remote: Dict[Tuple[str, int], Dict], provider_name: Optional[str] = None) -> Dict:
+        """Разница между списком провайдера и БД
+
+        Прокси с тем же адресом без привязки, но с именем на provider_name (импорт
+        до появления синхронизации), привязываются к провайдеру и дальше обновляются
+        вместе со списком. Добавленные вручную или другим провайдером не трогаются.
+        """
+        linked = session.query(
+            ProviderProxy.proxy_id, ProviderProxy.fingerprint,
+            ProxyServer.host, ProxyServer.port, ProxyServer.is_active
+        ).join(ProxyServer, ProxyServer.id == ProviderProxy.proxy_id).filter(
+            ProviderProxy.provider == provider
+        ).all()
+        linked_by_key = {(row.host.lower(), row.port): row for row in linked}
+
+        foreign = {}
+        for proxy_id, name, host, port, linked_provider in session.query(
+            ProxyServer.id, ProxyServer.name, ProxyServer.host, ProxyServer.port, ProviderProxy.provider
+        ).outerjoin(
+            ProviderProxy, ProviderProxy.proxy_id == ProxyServer.id
+        ).filter(or_(ProviderProxy.provider.is_(None), ProviderProxy.provider != provider)):
+            key = (host.lower(), port)
+            adoptable = linked_provider is None and bool(provider_name) and (name or '').startswith(provider_name)
+            # Из нескольких записей с одним адресом привязывается первая подходящая
+            if key not in foreign or (adoptable and foreign[key] is None):
+                foreign[key] = proxy_id if adoptable else None
+
+        result = {'add': [], 'update': [], 'adopt': [], 'remove': [], 'skipped': 0}
+        for key, proxy in remote.items():
+            row = linked_by_key.pop(key, None)
+            if row:
+                if row.fingerprint != proxy['fingerprint'] or not row.is_active:
+                    result['update'].append((row.proxy_id, proxy))
+            elif key in foreign:
+                if foreign[key] is not None:
+                    result['adopt'].append((foreign[key], proxy))
+                else:
+                    result['skipped'] += 1
+            else:
+                result['add'].append(proxy)
+
+        # Прокси, пропавшие из списка, отключаются: на них могут ссылаться сценарии
+        result['remove'] = [row.proxy_id for row in linked_by_key.values() if row.is_active]
+        return result
+
+    @staticmethod
+    def apply(session, provider: str, provider_name: str, changes: Dict):
+        """Применение разницы в текущей транзакции"""
+        now = datetime.now()
+
+        new_proxies = []
+        for proxy in changes['add']:
+            new_proxies.append((proxy, ProxyServer(
+                name=f"{provider_name} {proxy['host']}:{proxy['port']}"[:100],
+                proxy_type=proxy['proxy_type'],
+                host=proxy['host'],
+                port=proxy['port'],
+                username=proxy['username'],
+                password_encrypted=ProxyManager.encrypt_password(proxy['password']) if proxy['password'] else None,
+                is_active=True,
+                is_working=True
+            )))
+        session.add_all([server for _, server in new_proxies])
+        session.flush()
+        session.add_all([
+            ProviderProxy(provider=provider, proxy_id=server.id, fingerprint=proxy['fingerprint'], synced_at=now)
+            for proxy, server in new_proxies
+        ])
+
+        # Привязанные старые прокси получают учетные данные из списка, как обновленные
+        for proxy_id, _ in changes['adopt']:
+            session.add(ProviderProxy(provider=provider, proxy_id=proxy_id, fingerprint='', synced_at=now))
+        session.flush()
+
+        updates = dict(changes['update'] + changes['adopt'])
+        update_ids = list(updates)
+        for start in range(0, len(update_ids), SQL_CHUNK):
+            chunk = update_ids[start:start + SQL_CHUNK]
+            servers = session.query(ProxyServer).filter(ProxyServer.id.in_(chunk)).all()
+            links = {
+                link.proxy_id: link
+                for link in session.query(ProviderProxy).filter(ProviderProxy.proxy_id.in_(chunk))
+            }
+            for server in servers:
+                proxy = updates[server.id]
+                server.proxy_type = proxy['proxy_type']
+                server.username = proxy['username']
+                server.password_encrypted = (
+                    ProxyManager.encrypt_password(proxy['password']) if proxy['password'] else None
+                )
+                server.is_active = True
+                links[server.id].fingerprint = proxy['fingerprint']
+                links[server.id].synced_at = now
+
+        for start in range(0, len(changes['remove']), SQL_CHUNK):
+            chunk = changes['remove'][start:start + SQL_CHUNK]
+            session.query(ProxyServer).filter(ProxyServer.id.in_(chunk)).update(
+                {'is_active': False}, synchronize_session=False
+            )
+
+    @staticmethod
+    def save_state(session, provider: str, **fields):
+        """Обновление состояния синхронизации"""
+        state = session.query(ProviderSyncState).filter_by(provider=provider).first()
+        if not state:
+            state = ProviderSyncState(provider=provider)
+            session.add(state)
+        for name, value in fields.items():
+            setattr(state, name, value)
+
+    def _apply_sync(self, provider: str, provider_name: str, remote: Dict[Tuple[str, int], Dict],
+                    validators: Dict, content_hash: str) -> Dict:
+        """Расчет и применение разницы одной транзакцией"""
+        session = Session()
+        try:
+            changes = self.diff(session, provider, remote, provider_name)
+            self.apply(session, provider, provider_name, changes)
+
+            now = datetime.now()
+            changed = bool(changes['add'] or changes['update'] or changes['adopt'] or changes['remove'])
+            fields = dict(validators, content_hash=content_hash, last_sync=now, last_error=None, total=len(remote))
+            if changed:
+                fields['last_change'] = now
+            self.save_state(session, provider, **fields)
+            session.commit()
+
+            return {
+                'added': len(changes['add']),
+                'updated': len(changes['update']),
+                'adopted': len(changes['adopt']),
+                'removed': len(changes['remove']),
+                'skipped': changes['skipped']
+            }
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def _mark(self, provider: str, error: Optional[str] = None, validators: Optional[Dict] = None):
+        """Отметка о синхронизации без изменений или с ошибкой"""
+        session = Session()
+        try:
+            if error:
+                fields = {'last_error': error}
+            else:
+                # Новый ETag при том же содержимом сохраняется, чтобы следующий запрос получил 304
+                fields = dict(validators or {}, last_sync=datetime.now(), last_error=None)
+            self.save_state(session, provider, **fields)
+            session.commit()
+        except Exception as e:
+            logger.error(f"Ошибка сохранения состояния синхронизации {provider}: {e}")
+            session.rollback()
+        finally:
+            session.close()
+
+    async def sync(self, client, provider: str = '922proxy', provider_name: str = '922Proxy',
+                   default_type: str = 'socks5', force: bool = False) -> Dict:
+        """Синхронизация с провайдером
+
+        client - объект с fetch_proxy_page(page, per_page, headers) -> (статус, данные, заголовки).
+        force - загрузить список, даже если валидаторы говорят, что он не менялся.
+        """
+        lock = self._locks.setdefault(provider, asyncio.Lock())
+        if lock.locked():
+            return {'status': 'busy'}
+
+        async with lock:
+            result = {'status': 'unchanged', 'added': 0, 'updated': 0, 'adopted': 0, 'removed': 0, 'skipped': 0,
+                      'total': 0}
+            try:
+                state = {} if force else await asyncio.to_thread(self.load_state, provider)
+                items, validators = await self.fetch_all(client, state)
+
+                if items is not None:
+                    remote = {}
+                    for item in items:
+                        proxy = self.normalize(item, default_type)
+                        if proxy:
+                            remote[(proxy['host'], proxy['port'])] = proxy
+                    if not remote:
+                        # Пустой список - скорее сбой API, чем удаление всех прокси
+                        raise ProviderSyncError("API вернуло пустой список")
+                    result['total'] = len(remote)
+                    content_hash = self.content_hash(remote)
+
+                    if content_hash != state.get('content_hash'):
+                        result.update(await asyncio.to_thread(
+                            self._apply_sync, provider, provider_name, remote, validators, content_hash
+                        ))
+                        result['status'] = 'synced'
+
+                if result['status'] == 'unchanged':
+                    await asyncio.to_thread(self._mark, provider, None, validators)
+
+                logger.info(
+                    f"Синхронизация {provider_name}: {result['status']}, +{result['added']} "
+                    f"~{result['updated']} -{result['removed']}, привязано {result['adopted']}, "
+                    f"пропущено {result['skipped']}"
+                )
+            except Exception as e:
+                logger.error(f"Ошибка синхронизации прокси {provider_name}: {e}")
+                result = {'status': 'error', 'error': str(e)}
+                await asyncio.to_thread(self._mark, provider, str(e)[:500])
+
+            result['finished_at'] = datetime.now()
+            self.last_results[provider] = result
+            return result
+
+
+# Глобальный экземпляр синхронизации
+provider_sync = ProviderSync()
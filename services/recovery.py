@@ -0,0 +1,321 @@
+"""
+Восстановление запущенных сценариев после перезапуска бота
+Сессии Instagram поднимаются из сохраненных настроек волнами: ограниченная
+параллельность, случайные задержки и не больше RECOVERY_PER_PROXY сценариев
+одного прокси в волне, чтобы не устраивать всплеск входов
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from database.models import Scenario
+from database.connection import Session
+from config import (
+    cipher, tasks, instabots, DATABASE_PATH, SESSIONS_DIR, POLL_MIN_INTERVAL,
+    RECOVERY_WAVE_SIZE, RECOVERY_WAVE_INTERVAL, RECOVERY_CONCURRENCY,
+    RECOVERY_PER_PROXY, RECOVERY_JITTER
+)
+
+logger = logging.getLogger(__name__)
+
+class SessionStore:
+    """Зашифрованные настройки сессий Instagram (cookies, устройство, uuid) по сценариям"""
+
+    @staticmethod
+    def get_sessions_dir() -> str:
+        """Папка для сессий"""
+        if SESSIONS_DIR:
+            return SESSIONS_DIR
+        if 'sqlite:///' in DATABASE_PATH:
+            return os.path.join(os.path.dirname(DATABASE_PATH.replace('sqlite:///', '')), 'sessions')
+        return 'sessions'
+
+    @staticmethod
+    def _path(scenario_id: int) -> str:
+        return os.path.join(SessionStore.get_sessions_dir(), f"scenario_{scenario_id}.session")
+
+    @staticmethod
+    def save(scenario_id: int, ig_client) -> bool:
+        """Сохранение сессии после успешного входа"""
+        try:
+            sessions_dir = SessionStore.get_sessions_dir()
+            os.makedirs(sessions_dir, exist_ok=True)
+
+            payload = cipher.encrypt(json.dumps(ig_client.get_settings()).encode())
+
+            # Запись через временный файл, чтобы падение не оставило обрезанную сессию
+            fd, tmp_path = tempfile.mkstemp(dir=sessions_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, SessionStore._path(scenario_id))
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка сохранения сессии сценария {scenario_id}: {e}")
+            return False
+
+    @staticmethod
+    def load(scenario_id: int) -> Optional[Dict]:
+        """Настройки сессии или None, если сессии нет или она не читается"""
+        path = SessionStore._path(scenario_id)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return json.loads(cipher.decrypt(f.read()).decode())
+        except Exception as e:
+            logger.warning(f"Сессия сценария {scenario_id} повреждена: {e}")
+            return None
+
+    @staticmethod
+    def delete(scenario_id: int):
+        """Удаление сессии"""
+        try:
+            os.remove(SessionStore._path(scenario_id))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Ошибка удаления сессии сценария {scenario_id}: {e}")
+
+
+class RecoveryOrchestrator:
+    """Перезапуск сценариев со статусом running после рестарта"""
+
+    def __init__(self, wave_size: int = RECOVERY_WAVE_SIZE, wave_interval: float = RECOVERY_WAVE_INTERVAL,
+                 concurrency: int = RECOVERY_CONCURRENCY, per_proxy: int = RECOVERY_PER_PROXY,
+                 jitter: float = RECOVERY_JITTER):
+        self.wave_size = max(1, wave_size)
+        self.wave_interval = wave_interval
+        self.concurrency = max(1, concurrency)
+        self.per_proxy = max(1, per_proxy)
+        self.jitter = jitter
+
+        self._task: Optional[asyncio.Task] = None
+        self.stats = self._empty_stats()
+
+    @staticmethod
+    def _empty_stats() -> Dict:
+        return {
+            'total': 0, 'waves': 0, 'done_waves': 0,
+            'restored': 0, 'relogin': 0, 'failed': 0,
+            'started_at': None, 'finished_at': None
+        }
+
+    def start(self, bot) -> bool:
+        """Запуск восстановления в фоне; повторный вызов во время работы игнорируется"""
+        if self._task and not self._task.done():
+            return False
+        self._task = asyncio.create_task(self.restore_all(bot))
+        return True
+
+    def get_status(self) -> Dict:
+        """Ход восстановления для админ-панели"""
+        status = dict(self.stats)
+        status['in_progress'] = bool(self._task and not self._task.done())
+        return status
+
+    @staticmethod
+    def load_running_scenarios() -> List[Dict]:
+        """Сценарии со статусом running, для которых в процессе нет ни задачи, ни клиента"""
+        session = Session()
+        try:
+            scenarios = session.query(Scenario).filter(
+                Scenario.status == 'running',
+                Scenario.active_until > datetime.now()
+            ).order_by(Scenario.id.asc()).all()
+
+            return [
+                {
+                    'id': scenario.id,
+                    'proxy_id': scenario.proxy_id,
+                    'ig_username': scenario.ig_username,
+                    'chat_id': scenario.user.telegram_id
+                }
+                for scenario in scenarios
+                if scenario.id not in tasks and scenario.id not in instabots
+            ]
+        except Exception as e:
+            logger.error(f"Ошибка получения запущенных сценариев: {e}")
+            return []
+        finally:
+            session.close()
+
+    def plan_waves(self, scenarios: List[Dict]) -> List[List[Dict]]:
+        """Разбиение на волны с чередованием прокси
+
+        Прокси обходятся по кругу, из каждого в волну попадает не больше per_proxy
+        сценариев. Если прокси мало, волны получаются меньше wave_size - это
+        дешевле, чем несколько входов подряд с одного IP.
+        """
+        by_proxy: Dict[Optional[int], deque] = OrderedDict()
+        for scenario in scenarios:
+            by_proxy.setdefault(scenario['proxy_id'], deque()).append(scenario)
+
+        waves = []
+        while by_proxy:
+            wave = []
+            for proxy_id in list(by_proxy):
+                queue = by_proxy[proxy_id]
+                for _ in range(min(self.per_proxy, self.wave_size - len(wave))):
+                    if not queue:
+                        break
+                    wave.append(queue.popleft())
+                if not queue:
+                    del by_proxy[proxy_id]
+                if len(wave) >= self.wave_size:
+                    break
+
+            # Следующая волна начинается с прокси, не попавших в эту
+            for proxy_id in [p for p in by_proxy if any(s['proxy_id'] == p for s in wave)]:
+                by_proxy.move_to_end(proxy_id)
+            waves.append(wave)
+        return waves
+
+    async def restore_all(self, bot):
+        """Восстановление всех запущенных сценариев волнами"""
+        self.stats = self._empty_stats()
+        self.stats['started_at'] = datetime.now()
+        started = time.monotonic()
+
+        scenarios = await asyncio.to_thread(self.load_running_scenarios)
+        waves = self.plan_waves(scenarios)
+        self.stats['total'] = len(scenarios)
+        self.stats['waves'] = len(waves)
+
+        if not scenarios:
+            logger.info("Восстановление: нет запущенных сценариев")
+            self.stats['finished_at'] = datetime.now()
+            return
+
+        logger.info(f"Восстановление {len(scenarios)} сценариев в {len(waves)} волнах")
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def restore_limited(scenario: Dict):
+            async with semaphore:
+                await asyncio.sleep(random.uniform(0, self.jitter))
+                await self.restore_scenario(scenario, bot)
+
+        for index, wave in enumerate(waves):
+            if index:
+                await asyncio.sleep(self.wave_interval)
+            await asyncio.gather(*[restore_limited(scenario) for scenario in wave])
+            self.stats['done_waves'] += 1
+
+        self.stats['finished_at'] = datetime.now()
+        summary = (
+            f"♻️ <b>Сценарии восстановлены после перезапуска</b>\n\n"
+            f"Всего: {self.stats['total']} за {time.monotonic() - started:.0f} сек\n"
+            f"✅ Из сохраненной сессии: {self.stats['restored']}\n"
+            f"🔑 Повторный вход: {self.stats['relogin']}\n"
+            f"❌ Ошибки: {self.stats['failed']}"
+        )
+        logger.info(summary.replace('<b>', '').replace('</b>', ''))
+
+        try:
+            from services.broadcast import admin_broadcast
+            await admin_broadcast.alert(bot, summary)
+        except Exception as e:
+            logger.error(f"Не удалось отправить отчет о восстановлении: {e}")
+
+    async def restore_scenario(self, scenario: Dict, bot) -> str:
+        """Восстановление одного сценария: сохраненная сессия, иначе полный вход"""
+        scenario_id = scenario['id']
+        if scenario_id in tasks or scenario_id in instabots:
+            return 'skipped'
+
+        try:
+            ig_client = await asyncio.to_thread(self._resume_session, scenario_id)
+            if ig_client:
+                instabots[scenario_id] = ig_client
+                await asyncio.to_thread(self._schedule_first_check, scenario_id)
+                self.stats['restored'] += 1
+                logger.info(f"Сценарий {scenario_id} восстановлен из сохраненной сессии")
+                return 'restored'
+
+            # Сессии нет или она истекла - обычная авторизация с уведомлениями владельцу
+            from services.enhanced_auth import run_enhanced_instagram_scenario
+            from services.login_orchestrator import PRIORITY_BACKGROUND
+            tasks[scenario_id] = asyncio.create_task(
+                run_enhanced_instagram_scenario(scenario_id, scenario['chat_id'], bot, PRIORITY_BACKGROUND)
+            )
+            self.stats['relogin'] += 1
+            logger.info(f"Сценарий {scenario_id} запущен с повторной авторизацией")
+            return 'relogin'
+
+        except Exception as e:
+            self.stats['failed'] += 1
+            logger.error(f"Ошибка восстановления сценария {scenario_id}: {e}")
+            return 'failed'
+
+    @staticmethod
+    def _resume_session(scenario_id: int):
+        """Клиент из сохраненных настроек; None, если сессия недействительна"""
+        settings = SessionStore.load(scenario_id)
+        if not settings:
+            return None
+
+        from instagrapi import Client
+        from instagrapi.exceptions import LoginRequired, ChallengeRequired
+        from services.proxy_manager import ProxyManager
+        from services.metrics import instrument_instagram_client
+        from services.circuit_breaker import circuit_breakers
+
+        session = Session()
+        try:
+            scenario = session.query(Scenario).filter_by(id=scenario_id).first()
+            if not scenario:
+                return None
+
+            ig_client = Client()
+            ig_client.set_settings(settings)
+
+            if scenario.proxy_server:
+                proxy_dict = ProxyManager.get_proxy_dict(scenario.proxy_server)
+                if proxy_dict:
+                    ig_client.set_proxy(proxy_dict['http'])
+            instrument_instagram_client(ig_client, scenario.proxy_server is not None)
+            circuit_breakers.bind_client(ig_client, scenario.proxy_id)
+
+            # Один легкий запрос вместо входа: проверяет, что cookies еще действуют
+            ig_client.account_info()
+            return ig_client
+
+        except (LoginRequired, ChallengeRequired) as e:
+            logger.info(f"Сессия сценария {scenario_id} истекла: {e}")
+            SessionStore.delete(scenario_id)
+            return None
+        except Exception as e:
+            logger.warning(f"Не удалось восстановить сессию сценария {scenario_id}: {e}")
+            return None
+        finally:
+            session.close()
+
+    @staticmethod
+    def _schedule_first_check(scenario_id: int):
+        """Первая проверка со случайным сдвигом, чтобы восстановленные сценарии не опрашивались разом"""
+        session = Session()
+        try:
+            scenario = session.query(Scenario).filter_by(id=scenario_id).first()
+            if not scenario:
+                return
+            scenario.auth_status = 'success'
+            scenario.error_message = None
+            # Изменение через ORM, чтобы слушатель планировщика поставил проверку в очередь
+            scenario.next_check_time = datetime.now() + timedelta(seconds=random.uniform(0, POLL_MIN_INTERVAL))
+            session.commit()
+        except Exception as e:
+            logger.error(f"Ошибка планирования проверки сценария {scenario_id}: {e}")
+            session.rollback()
+        finally:
+            session.close()
+
+
+# Глобальный экземпляр восстановления
+recovery_orchestrator = RecoveryOrchestrator()
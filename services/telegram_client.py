@@ -0,0 +1,96 @@
+"""
+Общий клиент Telegram Bot API
+Один Bot и один пул HTTP соединений на токен вместо Application на каждый сценарий
+"""
+
+import asyncio
+import logging
+from typing import Dict, Optional
+
+import httpx
+from telegram import Bot
+from telegram.ext import ExtBot
+from telegram.request import HTTPXRequest
+
+from config import (
+    TELEGRAM_TOKEN, TELEGRAM_POOL_SIZE, TELEGRAM_POOL_TIMEOUT,
+    TELEGRAM_CONNECT_TIMEOUT, TELEGRAM_READ_TIMEOUT, TELEGRAM_KEEPALIVE_EXPIRY
+)
+
+logger = logging.getLogger(__name__)
+
+class KeepAliveHTTPXRequest(HTTPXRequest):
+    """HTTPXRequest с настраиваемым временем жизни keep-alive соединений
+
+    По умолчанию httpx закрывает простаивающее соединение через 5 секунд,
+    и редкие уведомления сценариев каждый раз открывают новое TLS соединение.
+    """
+
+    def __init__(self, keepalive_expiry: float = TELEGRAM_KEEPALIVE_EXPIRY, **kwargs):
+        self._keepalive_expiry = keepalive_expiry
+        super().__init__(**kwargs)
+
+    def _build_client(self) -> httpx.AsyncClient:
+        limits = self._client_kwargs.get('limits')
+        if limits is not None:
+            self._client_kwargs['limits'] = httpx.Limits(
+                max_connections=limits.max_connections,
+                max_keepalive_connections=limits.max_keepalive_connections,
+                keepalive_expiry=self._keepalive_expiry
+            )
+        return super()._build_client()
+
+def build_request(pool_size: int = TELEGRAM_POOL_SIZE, read_timeout: float = TELEGRAM_READ_TIMEOUT) -> HTTPXRequest:
+    """Запрос Bot API с настроенным пулом соединений"""
+    return KeepAliveHTTPXRequest(
+        connection_pool_size=pool_size,
+        pool_timeout=TELEGRAM_POOL_TIMEOUT,
+        connect_timeout=TELEGRAM_CONNECT_TIMEOUT,
+        read_timeout=read_timeout,
+        write_timeout=read_timeout
+    )
+
+class TelegramClientRegistry:
+    """Реестр общих экземпляров Bot по токену"""
+
+    def __init__(self):
+        self._bots: Dict[str, Bot] = {}
+        self._owned: Dict[str, Bot] = {}  # Созданные реестром, закрываются в shutdown()
+        self._lock: Optional[asyncio.Lock] = None
+
+    def register(self, bot: Bot):
+        """Регистрация уже инициализированного бота (например, application.bot)"""
+        self._bots[bot.token] = bot
+        logger.info(f"Зарегистрирован общий Telegram бот {bot.token.split(':')[0]}")
+
+    async def get_bot(self, token: str = TELEGRAM_TOKEN) -> Bot:
+        """Общий бот для токена; создается и инициализируется при первом обращении"""
+        bot = self._bots.get(token)
+        if bot is not None:
+            return bot
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            bot = self._bots.get(token)
+            if bot is None:
+                bot = ExtBot(token, request=build_request())
+                await bot.initialize()
+                self._bots[token] = bot
+                self._owned[token] = bot
+                logger.info(f"Создан общий Telegram бот @{bot.username}, пул {TELEGRAM_POOL_SIZE} соединений")
+            return bot
+
+    async def shutdown(self):
+        """Закрытие пулов соединений ботов, созданных реестром"""
+        for token, bot in list(self._owned.items()):
+            try:
+                await bot.shutdown()
+            except Exception as e:
+                logger.error(f"Ошибка закрытия Telegram бота: {e}")
+            self._bots.pop(token, None)
+        self._owned.clear()
+
+# Глобальный реестр
+telegram_clients = TelegramClientRegistry()
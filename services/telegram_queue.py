@@ -0,0 +1,196 @@
+"""
+Очередь исходящих сообщений Telegram
+Схлопывание правок одного сообщения, глобальный и поканальный лимиты,
+повтор при RetryAfter и сетевых ошибках
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import timedelta
+from typing import Deque, Dict, Optional, Tuple
+
+from telegram import Message
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+from config import TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_INTERVAL, TELEGRAM_SEND_RETRIES
+
+logger = logging.getLogger(__name__)
+
+class _Operation:
+    """Отложенный вызов Bot API"""
+
+    __slots__ = ('kind', 'bot', 'chat_id', 'message_id', 'kwargs', 'future')
+
+    def __init__(self, kind: str, bot, chat_id: int, message_id: Optional[int], kwargs: dict):
+        self.kind = kind
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.kwargs = kwargs
+        self.future = asyncio.get_running_loop().create_future()
+
+class TelegramOutbox:
+    """Очередь исходящих вызовов с отдельным обработчиком на каждый чат
+
+    Порядок сообщений внутри чата сохраняется. Правка сообщения, которая
+    еще не отправлена, заменяется более новой (побеждает последняя запись).
+    Ошибки отправки логируются и не пробрасываются вызывающему коду.
+    """
+
+    def __init__(self, global_rate: float = TELEGRAM_GLOBAL_RATE,
+                 chat_interval: float = TELEGRAM_CHAT_INTERVAL,
+                 max_retries: int = TELEGRAM_SEND_RETRIES):
+        self.global_interval = 1 / global_rate if global_rate > 0 else 0
+        self.chat_interval = chat_interval
+        self.max_retries = max_retries
+
+        self._queues: Dict[int, Deque[_Operation]] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+        self._pending_edits: Dict[Tuple[int, int], _Operation] = {}
+        self._chat_ready_at: Dict[int, float] = {}
+        self._global_next_slot = 0.0
+
+        self.stats = {
+            'sent': 0,
+            'edited': 0,
+            'coalesced': 0,
+            'retry_after': 0,
+            'failed': 0
+        }
+
+    # === ПУБЛИЧНЫЕ МЕТОДЫ ===
+
+    async def send_message(self, bot, chat_id: int, wait: bool = True, **kwargs) -> Optional[Message]:
+        """Отправка сообщения через очередь
+
+        При wait=True возвращает Message (или None при ошибке), иначе не ждет отправки
+        """
+        operation = _Operation('send', bot, chat_id, None, kwargs)
+        self._enqueue(operation)
+        return await operation.future if wait else None
+
+    async def edit_message_text(self, bot, chat_id: int, message_id: int,
+                                wait: bool = False, **kwargs) -> Optional[Message]:
+        """Правка текста сообщения; неотправленная правка того же сообщения заменяется"""
+        key = (chat_id, message_id)
+        pending = self._pending_edits.get(key)
+        if pending is not None:
+            pending.bot = bot
+            pending.kwargs = kwargs
+            self.stats['coalesced'] += 1
+            return await pending.future if wait else None
+
+        operation = _Operation('edit', bot, chat_id, message_id, kwargs)
+        self._pending_edits[key] = operation
+        self._enqueue(operation)
+        return await operation.future if wait else None
+
+    def pending_count(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def drain(self, timeout: float = 10):
+        """Ожидание отправки всех поставленных в очередь сообщений"""
+        workers = list(self._workers.values())
+        if workers:
+            await asyncio.wait(workers, timeout=timeout)
+
+    # === ВНУТРЕННИЕ МЕТОДЫ ===
+
+    def _enqueue(self, operation: _Operation):
+        queue = self._queues.setdefault(operation.chat_id, deque())
+        queue.append(operation)
+
+        if operation.chat_id not in self._workers:
+            self._workers[operation.chat_id] = asyncio.create_task(self._chat_worker(operation.chat_id))
+
+    async def _chat_worker(self, chat_id: int):
+        queue = self._queues[chat_id]
+        try:
+            while queue:
+                operation = queue.popleft()
+                if operation.kind == 'edit':
+                    # С этого момента новые правки встают в очередь отдельно
+                    self._pending_edits.pop((chat_id, operation.message_id), None)
+                await self._execute(operation)
+        except asyncio.CancelledError:
+            # Оставшиеся операции завершаются без отправки; их правки больше не принимают новые
+            for operation in queue:
+                if operation.kind == 'edit' and self._pending_edits.get((chat_id, operation.message_id)) is operation:
+                    del self._pending_edits[(chat_id, operation.message_id)]
+                if not operation.future.done():
+                    operation.future.set_result(None)
+            queue.clear()
+            raise
+        finally:
+            self._workers.pop(chat_id, None)
+            if not queue:
+                self._queues.pop(chat_id, None)
+                self._chat_ready_at.pop(chat_id, None)
+
+    async def _wait_for_slot(self, chat_id: int):
+        """Соблюдение поканального интервала и глобального лимита"""
+        now = time.monotonic()
+        chat_delay = self._chat_ready_at.get(chat_id, 0) - now
+        if chat_delay > 0:
+            await asyncio.sleep(chat_delay)
+            now = time.monotonic()
+
+        slot = max(now, self._global_next_slot)
+        self._global_next_slot = slot + self.global_interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+        self._chat_ready_at[chat_id] = time.monotonic() + self.chat_interval
+
+    async def _execute(self, operation: _Operation):
+        result = None
+
+        for attempt in range(1, self.max_retries + 1):
+            await self._wait_for_slot(operation.chat_id)
+            try:
+                if operation.kind == 'send':
+                    result = await operation.bot.send_message(chat_id=operation.chat_id, **operation.kwargs)
+                    self.stats['sent'] += 1
+                else:
+                    result = await operation.bot.edit_message_text(
+                        chat_id=operation.chat_id, message_id=operation.message_id, **operation.kwargs
+                    )
+                    self.stats['edited'] += 1
+                break
+
+            except RetryAfter as e:
+                retry_after = e.retry_after
+                if isinstance(retry_after, timedelta):
+                    retry_after = retry_after.total_seconds()
+                self.stats['retry_after'] += 1
+                self._chat_ready_at[operation.chat_id] = time.monotonic() + float(retry_after)
+                logger.warning(f"Flood control для чата {operation.chat_id}: повтор через {retry_after} сек")
+
+            except BadRequest as e:
+                if 'message is not modified' not in str(e).lower():
+                    self.stats['failed'] += 1
+                    logger.error(f"Ошибка {operation.kind} в чат {operation.chat_id}: {e}")
+                break
+
+            except NetworkError as e:
+                if attempt == self.max_retries:
+                    self.stats['failed'] += 1
+                    logger.error(f"Не удалось выполнить {operation.kind} в чат {operation.chat_id}: {e}")
+                    break
+                await asyncio.sleep(min(2 ** attempt, 30))
+
+            except Exception as e:
+                self.stats['failed'] += 1
+                logger.error(f"Ошибка {operation.kind} в чат {operation.chat_id}: {e}")
+                break
+        else:
+            self.stats['failed'] += 1
+            logger.error(f"Исчерпаны попытки {operation.kind} в чат {operation.chat_id}")
+
+        if not operation.future.done():
+            operation.future.set_result(result)
+
+# Глобальная очередь
+telegram_outbox = TelegramOutbox()
@@ -149,6 +149,7 @@ def proxy_bulk_operations_menu() -> InlineKeyboardMarkup:
         [InlineKeyboardButton("🔍 Проверить все прокси", callback_data='check_all_proxies')],
         [InlineKeyboardButton("🔄 Автоматическая ротация", callback_data='auto_rotate_proxies')],
         [InlineKeyboardButton("📊 Пакетная проверка", callback_data='bulk_check_proxies')],
+        [InlineKeyboardButton("📱 Проверить Instagram", callback_data='bulk_check_instagram')],
         [InlineKeyboardButton("🗑️ Очистить неработающие", callback_data='cleanup_failed_proxies')],
         [InlineKeyboardButton("🔙 Назад", callback_data='manage_proxies')]
     ]
@@ -161,6 +162,10 @@ def proxy_export_menu() -> InlineKeyboardMarkup:
         [InlineKeyboardButton("🔗 USER:PASS@IP:PORT", callback_data='export_format_2')],
         [InlineKeyboardButton("🌐 Только рабочие", callback_data='export_working_only')],
         [InlineKeyboardButton("📊 Статистика TXT", callback_data='export_stats')],
+        [
+            InlineKeyboardButton("📄 CSV", callback_data='export_csv'),
+            InlineKeyboardButton("🧾 JSON", callback_data='export_json')
+        ],
         [InlineKeyboardButton("🔙 Назад", callback_data='manage_proxies')]
     ]
     return InlineKeyboardMarkup(keyboard)
@@ -331,6 +336,50 @@ def pagination_menu(current_page: int, total_pages: int, base_callback: str) ->
     
     return InlineKeyboardMarkup(keyboard)
 
+def keyset_pagination_row(page: int, base_callback: str, prev_cursor: int = None, next_cursor: int = None) -> list:
+    """Кнопки навигации для keyset пагинации (курсор вместо номера страницы, page=None - без номера)"""
+    nav_buttons = []
+    if prev_cursor is not None:
+        nav_buttons.append(InlineKeyboardButton("⬅️", callback_data=f'{base_callback}_prev_{prev_cursor}'))
+
+    if page is not None:
+        nav_buttons.append(InlineKeyboardButton(f"стр. {page}", callback_data='noop'))
+
+    if next_cursor is not None:
+        nav_buttons.append(InlineKeyboardButton("➡️", callback_data=f'{base_callback}_next_{next_cursor}'))
+
+    return nav_buttons
+
+def proxy_browser_menu(proxies: list, filters: dict, page: int,
+                       prev_cursor: int = None, next_cursor: int = None) -> InlineKeyboardMarkup:
+    """Меню постраничного просмотра прокси с фильтрами"""
+    keyboard = []
+
+    for proxy in proxies:
+        keyboard.append([
+            InlineKeyboardButton(f"⚙️ {proxy.name[:10]}", callback_data=f'manage_proxy_{proxy.id}'),
+            InlineKeyboardButton("🔍", callback_data=f'check_proxy_{proxy.id}'),
+            InlineKeyboardButton("🗑️", callback_data=f'delete_proxy_{proxy.id}')
+        ])
+
+    keyboard.append(keyset_pagination_row(page, 'proxies', prev_cursor, next_cursor))
+
+    status_labels = {None: "Все", 'working': "🟢 Рабочие", 'failed': "🔴 Нерабочие"}
+    keyboard.append([
+        InlineKeyboardButton(f"Статус: {status_labels[filters.get('status')]}", callback_data='proxies_f_status'),
+        InlineKeyboardButton(f"Тип: {(filters.get('type') or 'все').upper()}", callback_data='proxies_f_type')
+    ])
+    keyboard.append([
+        InlineKeyboardButton(f"Провайдер: {filters.get('provider') or 'все'}", callback_data='proxies_f_provider'),
+        InlineKeyboardButton("🔎 Поиск по хосту", callback_data='proxies_search')
+    ])
+
+    if any(filters.get(key) for key in ('status', 'type', 'provider', 'search')):
+        keyboard.append([InlineKeyboardButton("✖️ Сбросить фильтры", callback_data='proxies_reset')])
+
+    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data='manage_proxies')])
+    return InlineKeyboardMarkup(keyboard)
+
 # === БЫСТРЫЕ ДЕЙСТВИЯ ===
 
 def quick_proxy_actions_menu(proxy_id: int) -> InlineKeyboardMarkup: